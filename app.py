@@ -2,112 +2,40 @@
 # 1. IMPORTACIÓN DE LIBRERÍAS
 # ==============================================================================
 # Se importan todas las herramientas necesarias para la aplicación.
-# Flask para el servidor web, OSMnx para los mapas, Folium para la interactividad, etc.
-
-from flask import Flask, render_template, request, jsonify
-import osmnx as ox
-import networkx as nx
-import folium
-import branca
-import matplotlib
-matplotlib.use('Agg') # Configuración para que Matplotlib funcione sin interfaz gráfica en el servidor.
-import matplotlib.pyplot as plt
+# Flask para el servidor web y los módulos del proyecto para el cálculo. Folium
+# (mapa interactivo) y Matplotlib (imágenes de ruta) tardan casi un segundo en
+# importarse; se importan la primera vez que se usan (ver `index` y mapa_ruta.py).
+
+from flask import Flask, Response, abort, render_template, request, jsonify, send_from_directory
+import concurrent.futures
+import functools
+import io
+import os
 import time
 import math
+import re
+
+import numpy as np
+
+from red_vial import cargar_perfiles, cargar_red, grafo_networkx
+from perfiles_velocidad import PERFIL_POR_DEFECTO, PERFILES
+from mapa_ruta import COLOR_RUTA, COLORES_ALTERNATIVAS, ColaRender
+from cache_rutas import CacheRutas, DIRECTORIO_CACHE_RUTAS
+from indice_espacial import IndiceEspacial, PuntoFueraDeArea
+from isocronas import UMBRALES_MINUTOS, leer_minutos
+from matriz import CalculadoraMatriz
+from metricas import LIMITES_KM, LIMITES_NODOS, Registro
+from trafico import RedEnVivo
+from servicio import ColaLlena, RUTA_JERARQUIA, ServicioRutas, cargar_jerarquias, crear_motores
 
 # ==============================================================================
 # 2. IMPLEMENTACIÓN DEL ALGORITMO DE DIJKSTRA
 # ==============================================================================
-# Esta función contiene la lógica principal para encontrar el camino más corto.
-# Se independiza de las librerías para un entendimiento más profundo del proceso.
-
-def dijkstra_personalizado(graph, start_node, end_node):
-    """
-    Implementación adaptada del algoritmo de Dijkstra.
+# La implementación original, `dijkstra_personalizado`, vive ahora en
+# motor_rutas.py junto a `MotorDijkstra`: así se puede usar (y comparar) sin
+# importar Flask ni cargar el grafo. Se reexporta aquí por compatibilidad.
 
-    Encuentra la ruta más corta (basada en el peso 'tiempo_viaje_seg') desde un
-    nodo de inicio a un nodo de fin en un grafo de NetworkX.
-
-    Args:
-        graph (networkx.Graph): El grafo de OSMnx/NetworkX que representa la red de calles.
-        start_node: El ID del nodo de inicio de la ruta.
-        end_node: El ID del nodo de destino de la ruta.
-
-    Returns:
-        tuple: Una tupla que contiene:
-               - La lista de nodos de la ruta óptima.
-               - El costo total (tiempo en segundos) de esa ruta.
-               Devuelve (None, math.inf) si no se encuentra una ruta.
-    """
-    # 2.1. Inicialización de estructuras de datos
-    # 'distancias' guarda el costo mínimo conocido para llegar a cada nodo desde el inicio.
-    distancias = {node: math.inf for node in graph.nodes}
-    distancias[start_node] = 0
-    # 'nodos_anteriores' permite reconstruir el camino guardando el "paso anterior" para cada nodo.
-    nodos_anteriores = {node: None for node in graph.nodes}
-    # 'nodos_no_visitados' es la lista de todos los nodos que aún no hemos procesado.
-    nodos_no_visitados = list(graph.nodes)
-
-    # 2.2. Bucle principal del algoritmo
-    # El bucle se ejecuta mientras queden nodos por visitar.
-    while nodos_no_visitados:
-        # Encuentra el nodo no visitado con la distancia más corta acumulada.
-        dis_min = math.inf
-        nodo_actual = None
-        for nodo in nodos_no_visitados:
-            if distancias[nodo] < dis_min:
-                dis_min = distancias[nodo]
-                nodo_actual = nodo
-        
-        # Si hemos llegado al nodo final, la ruta está encontrada.
-        if nodo_actual == end_node:
-            ruta = []
-            temp_nodo = end_node
-            # Reconstruimos la ruta hacia atrás, desde el final hasta el principio.
-            while temp_nodo is not None:
-                ruta.append(temp_nodo)
-                temp_nodo = nodos_anteriores[temp_nodo]
-            return ruta[::-1], distancias[end_node] # Devolvemos la ruta en orden y el costo final.
-
-        # Si el nodo más cercano es inalcanzable, no hay más caminos posibles.
-        if nodo_actual is None:
-            break
-
-        # 2.3. Exploración de vecinos
-        # Para el nodo actual, revisamos todos sus vecinos directos.
-        for vecino in graph.neighbors(nodo_actual):
-            # Obtenemos el "peso" de la calle entre el nodo actual y su vecino.
-            peso = graph.edges[nodo_actual, vecino, 0].get('tiempo_viaje_seg', math.inf)
-            # Calculamos la nueva distancia posible pasando por el nodo actual.
-            nueva_distancia = distancias[nodo_actual] + peso
-            
-            # Se actualiza si este nuevo camino es más corto que el que ya conocíamos.
-            if nueva_distancia < distancias[vecino]:
-                distancias[vecino] = nueva_distancia
-                nodos_anteriores[vecino] = nodo_actual
-        
-        # Marcamos el nodo actual como "visitado" para no procesarlo de nuevo.
-        nodos_no_visitados.remove(nodo_actual)
-            
-    # Si el bucle termina sin haber llegado al 'end_node', no existe una ruta.
-    return None, math.inf
-
-def obtener_direccion_giro(prev_bearing, next_bearing):
-    """
-    Calcula la dirección del giro (izquierda, derecha, etc.) basándose en dos ángulos.
-    """
-    # Calcula la diferencia de ángulo y la normaliza entre -180 y 180
-    diff = next_bearing - prev_bearing
-    angle = (diff + 180) % 360 - 180
-
-    if -25 <= angle <= 25:
-        return "Sigue derecho"
-    elif angle > 25:
-        return "Gira a la derecha"
-    elif angle < -25:
-        return "Gira a la izquierda"
-    # Podríamos añadir más casos como "vuelta en U" si quisiéramos
-    return "Continúa"
+from motor_rutas import dijkstra_personalizado  # noqa: F401
 
 # ==============================================================================
 # 3. CONFIGURACIÓN DE LA APLICACIÓN FLASK Y CARGA DE DATOS
@@ -117,33 +45,173 @@ def obtener_direccion_giro(prev_bearing, next_bearing):
 
 app = Flask(__name__)
 
-# --- Carga y pre-procesamiento del grafo ---
+# --- Carga del grafo ---
+# La descarga y el cálculo de pesos solo ocurren si no existe un snapshot en
+# disco para la configuración actual (ver red_vial.py y construir_snapshot.py).
 print("Cargando el grafo de la red vial...")
-places = ["Oaxaca de Juárez, Oaxaca, México",
-          "Santa Cruz Xoxocotlán, Oaxaca, México",
-          "San Raymundo Jalpan, Oaxaca, México", 
-          "San Antonio de la Cal, Oaxaca, México",
-          "San Agustín de las Juntas, Oaxaca, México",
-          "Santa Lucía del Camino, Oaxaca, México",
-          "Villa de Zaachila, Oaxaca, México"]
-G = ox.graph_from_place(places, network_type='drive', simplify=True)
-
-print("Calculando pesos de tiempo de viaje para cada calle...")
-VELOCIDAD_ESTANDAR_KMH = 15
-KMH_A_MS = 1000 / 3600
-for u, v, data in G.edges(data=True):
-    longitud_m = data.get('length', 0)
-    velocidad_ms = VELOCIDAD_ESTANDAR_KMH * KMH_A_MS
-    maxspeed_kmh = data.get('maxspeed')
-    if maxspeed_kmh:
-        try:
-            speed_val = float(maxspeed_kmh[0]) if isinstance(maxspeed_kmh, list) else float(maxspeed_kmh)
-            velocidad_ms = speed_val * KMH_A_MS
-        except (ValueError, TypeError): pass
-    # Se calcula y asigna el peso a cada calle (arista) del grafo.
-    data['tiempo_viaje_seg'] = longitud_m / velocidad_ms if velocidad_ms > 0 else float('inf')
+grafo_csr = cargar_red()
+# Índice espacial para ajustar los clics del usuario a la red sin recorrer todos los nodos.
+indice_espacial = IndiceEspacial(grafo_csr)
+# Un grafo por perfil de velocidad (`?perfil=` de /ruta). Todos comparten los
+# arreglos del snapshot; cada perfil solo agrega su arreglo de pesos.
+GRAFOS_PERFIL = cargar_perfiles(grafo_csr)
+# La huella de los arreglos de cada grafo identifica la versión de sus pesos.
+VERSIONES_PERFIL = {perfil: grafo.huella() for perfil, grafo in GRAFOS_PERFIL.items()}
+VERSION_GRAFO = VERSIONES_PERFIL[PERFIL_POR_DEFECTO]
+
+# Algoritmos que se pueden elegir con el parámetro `?algoritmo=` de /ruta.
+ALGORITMO_POR_DEFECTO = 'dijkstra'
+
+# Si existe una jerarquía de contracción (ver construir_jerarquia.py) construida
+# sobre los pesos de un perfil, se puede pedir con `?algoritmo=ch`. Solo la
+# jerarquía fija (con búsquedas testigo) pasa a ser la predeterminada: la
+# personalizable tiene unas cuatro veces más atajos y sus consultas no son más
+# rápidas que Dijkstra; su ventaja es que POST /trafico la re-personaliza.
+JERARQUIAS = cargar_jerarquias(GRAFOS_PERFIL, RUTA_JERARQUIA)
+if JERARQUIAS:
+    jerarquia = next(iter(JERARQUIAS.values()))
+    if not jerarquia.personalizable:
+        ALGORITMO_POR_DEFECTO = 'ch'
+    tipo = "personalizable" if jerarquia.personalizable else "fija"
+    print(f"Jerarquía de contracción {tipo} cargada ({jerarquia.num_atajos} atajos) para: {', '.join(JERARQUIAS)}; "
+          f"algoritmo predeterminado: {ALGORITMO_POR_DEFECTO}.")
+elif os.path.exists(RUTA_JERARQUIA):
+    print("La jerarquía de contracción no corresponde al grafo actual; se usará Dijkstra.")
+
+# Resultados de /ruta ya calculados, por par de nodos. La clave incluye el perfil
+# y la versión (huella) de sus pesos: si cambian los pesos, las entradas viejas
+# ya no coinciden, y las que quedaron en disco se borran aquí.
+# FORMATO_RESULTADO se incrementa cuando cambia la forma del resultado guardado
+# (por ejemplo, los segmentos), para no servir entradas con la forma anterior.
+FORMATO_RESULTADO = 2
+
+
+def version_cache(version):
+    """Versión que va en la clave de la caché: pesos del perfil y formato del resultado."""
+    return f'{version}-r{FORMATO_RESULTADO}'
+
+
+def _version_conocida(clave):
+    """
+    True si la entrada es de los pesos base actuales del perfil y del formato actual.
+
+    Incluye las versiones con anulaciones de tráfico ('<huella>~<anulaciones>',
+    ver trafico.py): siguen siendo válidas para los procesos que las tengan.
+    """
+    base = VERSIONES_PERFIL.get(clave[2])
+    return base is not None and (clave[3] == version_cache(base) or (
+        clave[3].startswith(f'{base}~') and clave[3].endswith(version_cache(''))))
+
+
+cache_rutas = CacheRutas(directorio=DIRECTORIO_CACHE_RUTAS)
+cache_rutas.invalidar(lambda clave, _: not _version_conocida(clave))
+# Isócronas de /isocrona, por nodo de origen ya ajustado y perfil. Solo en
+# memoria; la clave lleva la generación del tráfico en vivo, porque cualquier
+# cambio de pesos del perfil (también los que suben) altera las áreas.
+CAPACIDAD_ISOCRONAS = 256
+cache_isocronas = CacheRutas(capacidad=CAPACIDAD_ISOCRONAS)
+
+# Grafo, motores y versión vigentes de cada perfil. POST /trafico cierra calles o
+# cambia velocidades: se sustituye el estado del perfil, cuya versión (la de la
+# clave de la caché) resume las anulaciones vigentes (ver trafico.py).
+red_en_vivo = RedEnVivo(GRAFOS_PERFIL, crear_motores, JERARQUIAS, cache_rutas)
+# Motores con los pesos del snapshot (los usan /matriz y los benchmarks).
+ALGORITMOS = red_en_vivo.estado(PERFIL_POR_DEFECTO).motores
+motor_dijkstra = ALGORITMOS['dijkstra']
+calculadora_matriz = CalculadoraMatriz()
+# Las imágenes de ruta se dibujan en otros procesos sobre una capa base rasterizada una sola vez.
+cola_render = ColaRender(grafo_csr)
+# Cálculo de /ruta con contrapresión y coalescencia. Con `python app.py` se
+# calcula en el hilo de la petición; servidor.py lo reparte entre procesos.
+servicio_rutas = ServicioRutas()
+
+
+def configurar_servicio(procesos, **opciones):
+    """Reparte el cálculo de /ruta entre `procesos` procesos (ver `ServicioRutas`)."""
+    global servicio_rutas
+    servicio_rutas = ServicioRutas(procesos, ruta_jerarquia=RUTA_JERARQUIA, **opciones)
+
+
+def configurar_matriz(**opciones):
+    """Cupo y plazo de /matriz (ver `CalculadoraMatriz`)."""
+    global calculadora_matriz
+    calculadora_matriz = CalculadoraMatriz(**opciones)
+
+# --- Métricas (GET /metrics) ---
+# Con METRICAS=0 en el entorno (o `servidor.py --sin-metricas`) no se toma
+# ningún tiempo. Una petición a /ruta con el encabezado `X-Perfilar: 1` se mide
+# de todos modos y devuelve su desglose por etapa en el JSON.
+# Etapas de la petición: 'entrada', 'ajuste', 'cache', 'calculo' (incluye la
+# espera en el servicio) y 'total'. Dentro del cálculo: 'busqueda', 'aristas',
+# 'indicaciones', 'encolar_mapa' y 'guardar_cache'; 'dibujo' es el tiempo de
+# cada imagen en los procesos de dibujo.
+registro_metricas = Registro(activo=os.environ.get('METRICAS', '1') != '0')
+tiempo_etapas = registro_metricas.histograma(
+    'ruta_etapa_segundos', 'Tiempo de cada etapa de /ruta.', etiquetas=('etapa',))
+nodos_asentados = registro_metricas.histograma(
+    'ruta_nodos_asentados', 'Nodos asentados por búsqueda.', LIMITES_NODOS, ('algoritmo',))
+inserciones_monticulo = registro_metricas.histograma(
+    'ruta_inserciones_monticulo', 'Inserciones en el montículo por búsqueda.', LIMITES_NODOS, ('algoritmo',))
+distancia_rutas = registro_metricas.histograma(
+    'ruta_distancia_km', 'Longitud de las rutas calculadas.', LIMITES_KM)
+respuestas_ruta = registro_metricas.contador(
+    'ruta_respuestas_total', 'Respuestas de /ruta por resultado.', ('resultado',))
+errores_servidor = registro_metricas.contador(
+    'servidor_errores_total', 'Errores inesperados por endpoint.', ('endpoint',))
+
+
+def configurar_metricas(activo):
+    """Activa o desactiva la toma de tiempos (los errores, 503, 504 y rutas inexistentes se cuentan siempre)."""
+    registro_metricas.activo = activo
+
+
+def _observar_dibujo(segundos):
+    if registro_metricas.activo:
+        tiempo_etapas.observar(segundos, 'dibujo')
+
+
+cola_render.al_dibujar = _observar_dibujo
+
+
+@registro_metricas.recolector
+def _metricas_componentes():
+    """Contadores que ya llevan la caché de rutas, el servicio de cálculo y las matrices."""
+    cache = cache_rutas.estadisticas()
+    servicio = servicio_rutas.estadisticas()
+    matrices = calculadora_matriz.estadisticas()
+    return [
+        ('cache_rutas_aciertos_total', 'counter', 'Rutas servidas desde la caché en memoria.', cache['aciertos']),
+        ('cache_rutas_aciertos_disco_total', 'counter', 'Rutas servidas desde la caché en disco.', cache['aciertos_disco']),
+        ('cache_rutas_fallos_total', 'counter', 'Consultas a la caché sin resultado.', cache['fallos']),
+        ('cache_rutas_desalojos_total', 'counter', 'Entradas desalojadas por capacidad.', cache['desalojos']),
+        ('cache_rutas_tasa_aciertos', 'gauge', 'Fracción de consultas a la caché con acierto.', cache['tasa_aciertos']),
+        ('cache_rutas_entradas', 'gauge', 'Entradas en la caché en memoria.', cache['entradas']),
+        ('servicio_rutas_calculadas_total', 'counter', 'Cálculos de ruta iniciados.', servicio['calculadas']),
+        ('servicio_rutas_coalescidas_total', 'counter', 'Peticiones que esperaron un cálculo idéntico.', servicio['coalescidas']),
+        ('servicio_rutas_rechazadas_total', 'counter', 'Peticiones rechazadas con 503.', servicio['rechazadas']),
+        ('servicio_rutas_vencidas_total', 'counter', 'Peticiones que vencieron su plazo (504).', servicio['vencidas']),
+        ('servicio_rutas_en_curso', 'gauge', 'Cálculos de ruta en curso.', servicio['en_curso']),
+        ('matrices_calculadas_total', 'counter', 'Matrices de /matriz iniciadas.', matrices['calculadas']),
+        ('matrices_rechazadas_total', 'counter', 'Matrices rechazadas con 503.', matrices['rechazadas']),
+        ('matrices_vencidas_total', 'counter', 'Matrices que vencieron su plazo (504).', matrices['vencidas']),
+        ('matrices_en_curso', 'gauge', 'Matrices en curso.', matrices['en_curso']),
+    ]
+
+
 print("¡Grafo listo para recibir peticiones!")
 
+
+def __getattr__(nombre):
+    """
+    Carga perezosa de `app.G`.
+
+    El servidor ya no necesita el MultiDiGraph de NetworkX; solo se lee del
+    snapshot si alguien (un benchmark, una herramienta) lo pide.
+    """
+    if nombre == 'G':
+        return grafo_networkx()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
 # ==============================================================================
 # 4. RUTAS DE LA APLICACIÓN (ENDPOINTS)
 # ==============================================================================
@@ -152,16 +220,26 @@ print("¡Grafo listo para recibir peticiones!")
 # --- Ruta 1: Página principal ('/') ---
 @app.route('/')
 def index():
+    """Renderiza la página de inicio con el mapa interactivo."""
+    return render_template('index.html', mapa_html=_mapa_inicio())
+
+
+@functools.lru_cache(maxsize=None)
+def _mapa_inicio():
     """
-    Renderiza la página de inicio.
     Prepara el mapa interactivo de Folium con sus límites y el script de interactividad.
+
+    El mapa no cambia entre peticiones, así que se genera una sola vez. Folium
+    y branca se importan aquí, en la primera visita a '/', para que importar
+    la aplicación (o un proceso que solo calcula rutas) no los cargue.
     """
+    import branca
+    import folium
+
     mapa = folium.Map(location=[17.06, -96.72], zoom_start=13)
     
     # Dibuja el polígono que delimita el área de operación del mapa.
-    nodes = ox.graph_to_gdfs(G, edges=False)
-    convex_hull_polygon = nodes.unary_union.convex_hull
-    hull_points = [(lat, lon) for lon, lat in convex_hull_polygon.exterior.coords]
+    hull_points = [(lat, lon) for lon, lat in indice_espacial.casco]
     folium.Polygon(
         locations=hull_points,
         color="#ff7800",
@@ -230,101 +308,394 @@ def index():
     mapa.get_root().html.add_child(branca.element.Element(js_code))
     
     # Convierte el mapa de Folium a HTML para mostrarlo en la plantilla.
-    mapa_html = mapa._repr_html_()
-    
-    return render_template('index.html', mapa_html=mapa_html)
+    return mapa._repr_html_()
+
+# Cálculo compartido por /ruta: el resultado se guarda completo en la caché.
+def _encolar_mapa(resultado, aristas_rutas):
+    """Encola la imagen de la ruta y sus alternativas (índices de arista de cada una, la óptima primero)."""
+    colores = (COLOR_RUTA,) + COLORES_ALTERNATIVAS
+    # La óptima se dibuja al final, encima de las alternativas.
+    extremos = resultado.get('extremos')
+    return cola_render.encolar(list(zip(aristas_rutas, colores))[::-1],
+                               grafo_csr.indice[resultado['ruta'][0]], grafo_csr.indice[resultado['ruta'][-1]],
+                               tuple(extremos) if extremos else None)
+
+
+def _completar_resultado(resultado, algoritmo, perfil, estado, clave_cache):
+    """
+    Encola la imagen de una ruta recién calculada y la guarda en la caché.
+
+    Se llama una sola vez por cálculo, aunque varias peticiones idénticas
+    compartan el resultado (ver servicio.py).
+
+    Returns:
+        dict: Datos de la respuesta de /ruta (serializables a JSON, para la
+              caché), o None si no hay ruta entre los nodos. Si el cálculo se
+              midió, incluye además 'medicion' (que no se guarda en la caché).
+    """
+    if resultado is None:
+        return None
+    alternativas = resultado.get('alternativas', [])
+    aristas_rutas = [resultado.pop('aristas')] + [alternativa.pop('aristas') for alternativa in alternativas]
+    for alternativa, color in zip(alternativas, COLORES_ALTERNATIVAS):
+        alternativa['color'] = color
+    medicion = resultado.pop('medicion', None)
+    cronometro = registro_metricas.cronometro(forzar=bool(medicion))
+    # La imagen se dibuja en segundo plano; la URL responde cuando esté lista.
+    resultado['mapa'] = _encolar_mapa(resultado, aristas_rutas)
+    resultado['algoritmo'] = algoritmo
+    cronometro.marcar('encolar_mapa')
+    # Si los pesos cambiaron mientras se calculaba, la ruta ya puede no ser válida.
+    red_en_vivo.si_vigente(perfil, estado, lambda: cache_rutas.guardar(clave_cache, resultado))
+    if not medicion:
+        return resultado
+
+    cronometro.marcar('guardar_cache')
+    medicion['etapas'].update(cronometro.etapas)
+    if registro_metricas.activo:
+        for etapa, segundos in medicion['etapas'].items():
+            tiempo_etapas.observar(segundos, etapa)
+        nodos_asentados.observar(medicion['nodos_asentados'], algoritmo)
+        inserciones_monticulo.observar(medicion['inserciones_monticulo'], algoritmo)
+        distancia_rutas.observar(resultado['distancia_km'])
+    return dict(resultado, medicion=medicion)
+
+
+def _desglose(cronometro, resultado):
+    """Desglose por etapa (en ms) que devuelve /ruta con `X-Perfilar: 1`."""
+    desglose = {"etapas_ms": {etapa: round(seg * 1000, 3) for etapa, seg in cronometro.etapas.items()}}
+    medicion = resultado.get('medicion')
+    if medicion:
+        desglose["calculo_ms"] = {etapa: round(seg * 1000, 3) for etapa, seg in medicion['etapas'].items()}
+        desglose["nodos_asentados"] = medicion['nodos_asentados']
+        desglose["inserciones_monticulo"] = medicion['inserciones_monticulo']
+    return desglose
 
 # --- RUTA 2: API PARA CALCULAR LA RUTA (CORREGIDA) ---
+# Con `?alternativas=k` se devuelven además hasta k rutas alternativas (cada
+# una con sus totales, indicaciones y color), dibujadas en la misma imagen.
+# Con `?ajuste=arista` cada punto se proyecta sobre la calle más cercana y la
+# ruta empieza y termina en esos puntos, contando solo la parte recorrida de
+# esas calles (ver `MotorDijkstra.ruta_entre_puntos`); por eso solo se
+# calcula con Dijkstra y sin alternativas.
+MAXIMO_ALTERNATIVAS = len(COLORES_ALTERNATIVAS)
+
 @app.route('/ruta', methods=['POST'])
 def calcular_ruta_api():
+    perfilar = request.headers.get('X-Perfilar') == '1'
+    cronometro = registro_metricas.cronometro(forzar=perfilar)
     try:
         data = request.get_json()
+        perfil = request.args.get('perfil', PERFIL_POR_DEFECTO)
+        if perfil not in red_en_vivo.perfiles:
+            return jsonify({"success": False, "error": f"Perfil desconocido: '{perfil}'. Opciones: {', '.join(red_en_vivo.perfiles)}."})
+        # El estado se lee una sola vez: si llega un cambio de tráfico a media
+        # petición, esta termina con los pesos con los que empezó.
+        estado = red_en_vivo.estado(perfil)
+        algoritmos = estado.motores
+        # Sin `?algoritmo=` se usa el predeterminado si existe para el perfil (la
+        # jerarquía de contracción solo corresponde a los pesos de un perfil).
+        algoritmo = request.args.get('algoritmo') or (
+            ALGORITMO_POR_DEFECTO if ALGORITMO_POR_DEFECTO in algoritmos else 'dijkstra')
+        if algoritmo not in algoritmos:
+            return jsonify({"success": False, "error": f"Algoritmo desconocido para el perfil '{perfil}': '{algoritmo}'. Opciones: {', '.join(algoritmos)}."})
+        # Las alternativas salen de los árboles de búsqueda de Dijkstra (ver
+        # `MotorDijkstra.rutas_alternativas`): sin `?algoritmo=` se usa Dijkstra,
+        # y pedir otro algoritmo explícitamente es un error.
+        alternativas = request.args.get('alternativas', '0')
+        if not alternativas.isdigit() or int(alternativas) > MAXIMO_ALTERNATIVAS:
+            return jsonify({"success": False, "error": f"'alternativas' debe ser un entero entre 0 y {MAXIMO_ALTERNATIVAS}."})
+        alternativas = int(alternativas)
+        if alternativas:
+            if request.args.get('algoritmo', 'dijkstra') != 'dijkstra':
+                return jsonify({"success": False, "error": "'alternativas' solo se calcula con 'algoritmo=dijkstra'."})
+            algoritmo = 'dijkstra'
+
+        ajuste = request.args.get('ajuste', 'nodo')
+        if ajuste not in ('nodo', 'arista'):
+            return jsonify({"success": False, "error": f"Ajuste desconocido: '{ajuste}'. Opciones: nodo, arista."})
+        if ajuste == 'arista':
+            if alternativas:
+                return jsonify({"success": False, "error": "'ajuste=arista' no admite 'alternativas'."})
+            if request.args.get('algoritmo', 'dijkstra') != 'dijkstra':
+                return jsonify({"success": False, "error": "'ajuste=arista' solo se calcula con 'algoritmo=dijkstra'."})
+            algoritmo = 'dijkstra'
+
         origen_lat = float(data['origen_lat'])
         origen_lon = float(data['origen_lon'])
         destino_lat = float(data['destino_lat'])
         destino_lon = float(data['destino_lon'])
+        cronometro.marcar('entrada')
+        try:
+            if ajuste == 'arista':
+                # Pares (arista, fracción): la ruta empieza y termina a media calle.
+                origen, destino = indice_espacial.ajustar_a_calles([origen_lat, destino_lat], [origen_lon, destino_lon])
+            else:
+                origen_idx, destino_idx = indice_espacial.ajustar([origen_lat, destino_lat], [origen_lon, destino_lon])
+                origen, destino = int(grafo_csr.ids_nodos[origen_idx]), int(grafo_csr.ids_nodos[destino_idx])
+        except PuntoFueraDeArea as e:
+            puntos = " y ".join(("el origen", "el destino")[i] for i in e.posiciones)
+            verbo = "están" if len(e.posiciones) > 1 else "está"
+            return jsonify({"success": False, "error": f"Selecciona puntos dentro del área marcada en el mapa: {puntos} {verbo} fuera de la red vial."})
+        cronometro.marcar('ajuste')
+
+        clave_cache = CacheRutas.clave(origen, destino, perfil, version_cache(estado.version), alternativas)
+        resultado = cache_rutas.obtener(clave_cache)
+        desde_cache = resultado is not None
+        cronometro.marcar('cache')
+        if resultado is None:
+            try:
+                resultado = servicio_rutas.calcular(
+                    (clave_cache, algoritmo, estado.generacion), estado, perfil, algoritmo, origen, destino,
+                    lambda r: _completar_resultado(r, algoritmo, perfil, estado, clave_cache), medir=bool(cronometro),
+                    alternativas=alternativas)
+            except ColaLlena:
+                respuestas_ruta.incrementar('ocupado')
+                return jsonify({"success": False, "error": "El servidor está ocupado; intenta de nuevo en unos segundos."}), 503, {"Retry-After": "2"}
+            except concurrent.futures.TimeoutError:
+                respuestas_ruta.incrementar('vencida')
+                return jsonify({"success": False, "error": "La ruta tardó demasiado en calcularse."}), 504
+            cronometro.marcar('calculo')
+            if resultado is None:
+                respuestas_ruta.incrementar('sin_ruta')
+                return jsonify({"success": False, "error": "No se pudo encontrar una ruta entre los puntos seleccionados."})
+        elif not cola_render.disponible(resultado['mapa']):
+            # La imagen ya se borró de static/; se vuelve a dibujar con la ruta guardada.
+            # Con los pesos del perfil: entre aristas paralelas la más rápida depende de él.
+            aristas_rutas = [estado.grafo.aristas_de_ruta([estado.grafo.indice[n] for n in ruta['ruta']])
+                             for ruta in [resultado] + resultado.get('alternativas', [])]
+            resultado = dict(resultado, mapa=_encolar_mapa(resultado, aristas_rutas))
+            red_en_vivo.si_vigente(perfil, estado, lambda: cache_rutas.guardar(clave_cache, resultado))
+            cronometro.marcar('encolar_mapa')
+
+        respuesta = {
+            "success": True,
+            "distancia": f"{resultado['distancia_km']:.2f}",
+            "tiempo": f"{resultado['tiempo_seg'] / 60:.2f}",
+            "mapa_url": f"/mapa/{resultado['mapa']}",
+            "segmentos": resultado['segmentos'],
+            # La caché no distingue algoritmos (todos dan la ruta óptima): en un
+            # acierto se informa el pedido, y no hubo búsqueda que contar.
+            "algoritmo": algoritmo,
+            "perfil": perfil,
+            "nodos_asentados": None if desde_cache else resultado['nodos_asentados'],
+            "desde_cache": desde_cache
+        }
+        if alternativas:
+            respuesta["alternativas"] = [{
+                "distancia": f"{alternativa['distancia_km']:.2f}",
+                "tiempo": f"{alternativa['tiempo_seg'] / 60:.2f}",
+                "segmentos": alternativa['segmentos'],
+                "color": alternativa['color'],
+                "estiramiento": alternativa['estiramiento'],
+                "solapamiento": alternativa['solapamiento'],
+            } for alternativa in resultado['alternativas']]
+        if cronometro:
+            cronometro.etapas['total'] = sum(cronometro.etapas.values())
+            if registro_metricas.activo:
+                respuestas_ruta.incrementar('cache' if desde_cache else 'calculada')
+                for etapa, segundos in cronometro.etapas.items():
+                    tiempo_etapas.observar(segundos, etapa)
+            if perfilar:
+                respuesta["desglose"] = _desglose(cronometro, resultado)
+        return jsonify(respuesta)
+
+    except Exception:
+        errores_servidor.incrementar('/ruta')
+        app.logger.exception("Error al calcular la ruta")
+        return jsonify({"success": False, "error": f"Ocurrió un error inesperado en el servidor."})
+
+# --- RUTA 3: IMAGEN DE LA RUTA ---
+# La URL que devuelve /ruta existe desde el primer momento: si el dibujo aún no
+# termina, la petición espera (hasta ESPERA_MAXIMA_MAPA_SEG) a que termine.
+ESPERA_MAXIMA_MAPA_SEG = 30
 
-        origen_nodo = ox.nearest_nodes(G, Y=origen_lat, X=origen_lon)
-        destino_nodo = ox.nearest_nodes(G, Y=destino_lat, X=destino_lon)
-
-        ruta_optima_nodos, tiempo_total_seg = dijkstra_personalizado(G, origen_nodo, destino_nodo)
-
-        if ruta_optima_nodos is None:
-            return jsonify({"success": False, "error": "No se pudo encontrar una ruta entre los puntos seleccionados."})
-
-        tiempo_total_min = tiempo_total_seg / 60
-        distancia_total_km = sum(G.edges[u, v, 0]['length'] for u, v in zip(ruta_optima_nodos[:-1], ruta_optima_nodos[1:])) / 1000
-
-        # --- LÍNEA CORREGIDA AQUÍ ---
-        bearings = ox.bearing.add_edge_bearings(G.subgraph(ruta_optima_nodos))
-        
-        segmentos = []
-        for i in range(len(ruta_optima_nodos) - 1):
-            u = ruta_optima_nodos[i]
-            v = ruta_optima_nodos[i+1]
-            
-            edge_data = G.edges[u, v, 0]
-            
-            nombre_calle = edge_data.get('name', 'Calle sin nombre')
-            if isinstance(nombre_calle, list):
-                nombre_calle = nombre_calle[0]
-            
-            distancia_m = edge_data.get('length', 0)
-            tiempo_seg = edge_data.get('tiempo_viaje_seg', 0)
-            velocidad_kmh = (distancia_m / tiempo_seg) * 3.6 if tiempo_seg > 0 else 0
-            
-            direccion = "Inicia el recorrido"
-            if i > 0:
-                nodo_previo = ruta_optima_nodos[i-1]
-                bearing_anterior = bearings.edges[nodo_previo, u, 0]['bearing']
-                bearing_actual = bearings.edges[u, v, 0]['bearing']
-                direccion = obtener_direccion_giro(bearing_anterior, bearing_actual)
-
-            segmentos.append({
-                "direccion": direccion,
-                "calle": nombre_calle,
-                "distancia": f"{distancia_m:.0f} m",
-                "velocidad": f"{velocidad_kmh:.1f} km/h",
-                "tiempo": f"{tiempo_seg:.1f} s"
-            })
-        
-        fig, ax = ox.plot_graph_route(
-            G, 
-            ruta_optima_nodos,
-            route_color='lime', 
-            route_linewidth=6, 
-            node_size=0, 
-            bgcolor='#0B161D', 
-            edge_color='gray', 
-            edge_linewidth=0.5,
-            show=False,
-            close=False
-        )
-        origen_coords = (G.nodes[origen_nodo]['y'], G.nodes[origen_nodo]['x'])
-        destino_coords = (G.nodes[destino_nodo]['y'], G.nodes[destino_nodo]['x'])
-        ax.scatter(origen_coords[1], origen_coords[0], s=200, c='lime', marker='o', zorder=5, label='Origen')
-        ax.scatter(destino_coords[1], destino_coords[0], s=200, c='red', marker='X', zorder=5, label='Destino')
-        x = [G.nodes[n]['x'] for n in ruta_optima_nodos]
-        y = [G.nodes[n]['y'] for n in ruta_optima_nodos]
-        margen = 0.008
-        ax.set_xlim(min(x) - margen, max(x) + margen)
-        ax.set_ylim(min(y) - margen, max(y) + margen)
-        timestamp = int(time.time())
-        nombre_mapa = f'mapa_ruta_{timestamp}.png'
-        ruta_guardado = f'static/{nombre_mapa}'
-        fig.savefig(ruta_guardado, dpi=300, bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
+@app.route('/mapa/<nombre>')
+def obtener_mapa(nombre):
+    if not re.fullmatch(r'mapa_ruta_[0-9a-f]{32}\.png', nombre):
+        abort(404)
+    try:
+        listo = cola_render.esperar(nombre, timeout=ESPERA_MAXIMA_MAPA_SEG)
+    except concurrent.futures.TimeoutError:
+        return Response("La imagen aún se está generando.", status=503, headers={"Retry-After": "2"})
+    if not listo:
+        abort(404)
+    return send_from_directory(cola_render.directorio, nombre, mimetype='image/png')
+
+# --- RUTA 4: API PARA MATRICES DE TIEMPO Y DISTANCIA ---
+# Cuerpo: {"origenes": [[lat, lon], ...], "destinos": [[lat, lon], ...]}
+# Con `?formato=npz` la respuesta es un archivo .npz de NumPy (matrices float32)
+# en lugar de JSON. Como /ruta, responde 503 si ya hay demasiadas matrices en
+# curso y 504 si la matriz no termina a tiempo (ver matriz.py).
+MAXIMO_PUNTOS_MATRIZ = 1000
+
+def _matriz_a_json(matriz):
+    """Convierte una matriz float32 a listas de Python, con None donde no hay ruta."""
+    return [[None if math.isinf(valor) else round(valor, 1) for valor in fila] for fila in matriz.tolist()]
+
+@app.route('/matriz', methods=['POST'])
+def calcular_matriz_api():
+    try:
+        inicio = time.perf_counter()
+        data = request.get_json()
+        formato = request.args.get('formato', 'json')
+        if formato not in ('json', 'npz'):
+            return jsonify({"success": False, "error": f"Formato desconocido: '{formato}'. Opciones: json, npz."})
+
+        puntos = {}
+        for clave in ('origenes', 'destinos'):
+            lista = data[clave]
+            if not 0 < len(lista) <= MAXIMO_PUNTOS_MATRIZ:
+                return jsonify({"success": False, "error": f"'{clave}' debe tener entre 1 y {MAXIMO_PUNTOS_MATRIZ} puntos."})
+            try:
+                puntos[clave] = indice_espacial.ajustar([float(p[0]) for p in lista], [float(p[1]) for p in lista])
+            except PuntoFueraDeArea as e:
+                return jsonify({"success": False, "error": f"Puntos de '{clave}' fuera de la red vial (posiciones {e.posiciones})."})
+
+        try:
+            resultado = calculadora_matriz.calcular(puntos['origenes'], puntos['destinos'],
+                                                    red_en_vivo.estado(PERFIL_POR_DEFECTO), PERFIL_POR_DEFECTO)
+        except ColaLlena:
+            return jsonify({"success": False, "error": "El servidor está ocupado; intenta de nuevo en unos segundos."}), 503, {"Retry-After": "2"}
+        except concurrent.futures.TimeoutError:
+            return jsonify({"success": False, "error": "La matriz tardó demasiado en calcularse."}), 504
+        total_ms = (time.perf_counter() - inicio) * 1000
+
+        if formato == 'npz':
+            archivo = io.BytesIO()
+            np.savez(archivo, total_ms=np.float32(total_ms), **resultado)
+            return Response(archivo.getvalue(), mimetype='application/octet-stream',
+                            headers={"Content-Disposition": "attachment; filename=matriz.npz"})
+
+        return jsonify({
+            "success": True,
+            "tiempos_seg": _matriz_a_json(resultado['tiempos']),
+            "distancias_m": _matriz_a_json(resultado['distancias']),
+            "consultas": [{"ms": round(ms, 2), "nodos_asentados": asentados}
+                          for ms, asentados in zip(resultado['ms'].tolist(), resultado['nodos_asentados'].tolist())],
+            "total_ms": round(total_ms, 2)
+        })
+
+    except Exception:
+        errores_servidor.incrementar('/matriz')
+        app.logger.exception("Error al calcular la matriz")
+        return jsonify({"success": False, "error": f"Ocurrió un error inesperado en el servidor."})
+
+# --- RUTA 5: ESTADÍSTICAS DE LA CACHÉ DE RUTAS ---
+# Aciertos, fallos y desalojos, para dimensionar la caché.
+@app.route('/cache/estadisticas')
+def estadisticas_cache_api():
+    return jsonify(cache_rutas.estadisticas())
+
+# Cálculos en curso, peticiones coalescidas, rechazadas (503) y vencidas (504),
+# y lo mismo para las matrices de /matriz.
+@app.route('/servicio/estadisticas')
+def estadisticas_servicio_api():
+    return jsonify(dict(servicio_rutas.estadisticas(), matrices=calculadora_matriz.estadisticas()))
+
+# --- RUTA 6: PERFILES DE VELOCIDAD DISPONIBLES ---
+@app.route('/perfiles')
+def perfiles_api():
+    return jsonify({
+        "por_defecto": PERFIL_POR_DEFECTO,
+        "perfiles": [{"nombre": nombre, "descripcion": PERFILES[nombre].descripcion,
+                      "algoritmos": list(red_en_vivo.estado(nombre).motores)} for nombre in red_en_vivo.perfiles]
+    })
+
+# --- RUTA 7: TRÁFICO EN VIVO ---
+# POST cuerpo: {"cambios": [{"u": id_osm, "v": id_osm, "cerrada": true}, ...]}.
+# Cada cambio indica la arista con "u"/"v" (y "ambos_sentidos" opcional) o con
+# "calle" (todas las aristas con ese nombre), y la acción con "cerrada",
+# "velocidad_kmh" o "restaurar". El lote se aplica completo o no se aplica.
+# GET devuelve las anulaciones vigentes.
+@app.route('/trafico', methods=['GET', 'POST'])
+def trafico_api():
+    if request.method == 'GET':
+        return jsonify({"success": True, "anulaciones": red_en_vivo.anulaciones()})
+    try:
+        cambios = request.get_json()['cambios']
+        if not isinstance(cambios, list) or not cambios:
+            return jsonify({"success": False, "error": "'cambios' debe ser una lista no vacía."})
+        resumen = red_en_vivo.aplicar(cambios)
+        # Las claves de las isócronas llevan la generación anterior: ya no se usarán.
+        cache_isocronas.invalidar()
+        return jsonify(dict(resumen, success=True))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)})
+    except Exception:
+        errores_servidor.incrementar('/trafico')
+        app.logger.exception("Error al aplicar cambios de tráfico")
+        return jsonify({"success": False, "error": f"Ocurrió un error inesperado en el servidor."})
+
+# --- RUTA 8: MÉTRICAS EN FORMATO DE PROMETHEUS ---
+# Histogramas de tiempo por etapa, nodos asentados e inserciones por búsqueda,
+# longitud de las rutas, y contadores de la caché y del servicio de cálculo.
+@app.route('/metrics')
+def metricas_api():
+    return Response(registro_metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- RUTA 9: ISÓCRONAS ---
+# Cuerpo: {"lat": ..., "lon": ..., "minutos": [5, 10, 15]} ("minutos" es opcional).
+# Devuelve una FeatureCollection de GeoJSON con una Feature por umbral. Con
+# `?formato=poligonos` (predeterminado) cada Feature es el área alcanzable
+# dentro de su umbral; con `?formato=aristas`, las calles que se terminan de
+# recorrer entre el umbral anterior y el suyo. `?perfil=` y `?ajuste=` como en
+# /ruta, salvo que aquí `?ajuste=arista` parte del extremo de la calle más
+# próximo al punto proyectado: el tramo entre ambos no se descuenta.
+@app.route('/isocrona', methods=['POST'])
+def isocrona_api():
+    try:
+        inicio = time.perf_counter()
+        data = request.get_json()
+        perfil = request.args.get('perfil', PERFIL_POR_DEFECTO)
+        if perfil not in red_en_vivo.perfiles:
+            return jsonify({"success": False, "error": f"Perfil desconocido: '{perfil}'. Opciones: {', '.join(red_en_vivo.perfiles)}."})
+        formato = request.args.get('formato', 'poligonos')
+        if formato not in ('poligonos', 'aristas'):
+            return jsonify({"success": False, "error": f"Formato desconocido: '{formato}'. Opciones: poligonos, aristas."})
+        try:
+            minutos = leer_minutos(data.get('minutos', UMBRALES_MINUTOS))
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)})
+        ajuste = request.args.get('ajuste', 'nodo')
+        if ajuste not in ('nodo', 'arista'):
+            return jsonify({"success": False, "error": f"Ajuste desconocido: '{ajuste}'. Opciones: nodo, arista."})
+        try:
+            (origen_idx,) = indice_espacial.ajustar([float(data['lat'])], [float(data['lon'])], a_arista=(ajuste == 'arista'))
+        except PuntoFueraDeArea:
+            return jsonify({"success": False, "error": "Selecciona un punto dentro del área marcada en el mapa: está fuera de la red vial."})
+        origen_idx = int(origen_idx)
+        estado = red_en_vivo.estado(perfil)
+
+        clave_cache = (origen_idx, perfil, version_cache(estado.version), estado.generacion, tuple(minutos), formato)
+        resultado = cache_isocronas.obtener(clave_cache)
+        desde_cache = resultado is not None
+        if resultado is None:
+            def completar(isocronas):
+                if red_en_vivo.estado(perfil) is estado:
+                    cache_isocronas.guardar(clave_cache, isocronas)
+                return isocronas
+
+            try:
+                resultado = servicio_rutas.calcular_isocrona(
+                    ('isocrona',) + clave_cache, estado, perfil, origen_idx, [m * 60 for m in minutos], formato, completar)
+            except ColaLlena:
+                return jsonify({"success": False, "error": "El servidor está ocupado; intenta de nuevo en unos segundos."}), 503, {"Retry-After": "2"}
+            except concurrent.futures.TimeoutError:
+                return jsonify({"success": False, "error": "La isócrona tardó demasiado en calcularse."}), 504
 
         return jsonify({
             "success": True,
-            "distancia": f"{distancia_total_km:.2f}",
-            "tiempo": f"{tiempo_total_min:.2f}",
-            "mapa_url": f"/static/{nombre_mapa}",
-            "segmentos": segmentos
+            "perfil": perfil,
+            "origen": [float(grafo_csr.y[origen_idx]), float(grafo_csr.x[origen_idx])],
+            "isocronas": resultado,
+            "desde_cache": desde_cache,
+            "total_ms": round((time.perf_counter() - inicio) * 1000, 2)
         })
 
-    except Exception as e:
-        print(f"Error en el servidor: {e}")
+    except Exception:
+        errores_servidor.incrementar('/isocrona')
+        app.logger.exception("Error al calcular la isócrona")
         return jsonify({"success": False, "error": f"Ocurrió un error inesperado en el servidor."})
 
 # ==============================================================================
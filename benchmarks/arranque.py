@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: TIEMPO DE IMPORTACIÓN Y DE PRIMERA RUTA
+Descripción:
+Arranca procesos nuevos de Python (sin nada en caché de importaciones) y mide,
+para la aplicación web y para el núcleo de rutas:
+    - cuánto tarda la importación (app.py carga además el grafo, los perfiles
+      y la jerarquía al importarse);
+    - cuánto pasa desde que se lanza el proceso hasta tener la primera ruta:
+      una petición a /ruta con el cliente de pruebas de Flask, una llamada a
+      `NucleoRutas.ruta`, o la primera fila que rutas_lote.py escribe en su
+      salida estándar (el CSV se le pasa por una tubería que sigue abierta);
+    - qué bibliotecas pesadas quedaron importadas en ese momento.
+Para la aplicación también se mide cuánto tarda la imagen de esa primera
+ruta (los procesos de dibujo importan Matplotlib al arrancar) y la primera
+visita a '/', que es la que importa Folium. La aplicación se mide sin su
+caché de rutas en disco, para que no responda por el cálculo.
+
+Uso:
+    python benchmarks/arranque.py --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+
+from grafo_compacto import GrafoCSR  # noqa: E402
+from nucleo_rutas import localizar_snapshot  # noqa: E402
+
+PESADAS = ('flask', 'osmnx', 'networkx', 'folium', 'branca', 'matplotlib', 'pandas', 'geopandas', 'shapely')
+
+# Cada fragmento recibe las coordenadas en argv e imprime, en su última línea,
+# un JSON con las marcas de tiempo (time.time, comparables entre procesos).
+PRELUDIO = '''
+import json, sys, time
+inicio = time.time()
+o_lat, o_lon, d_lat, d_lon = map(float, sys.argv[1:5])
+def pesadas():
+    return sorted({m.split('.')[0] for m in sys.modules} & set(%r))
+''' % (PESADAS,)
+
+CODIGO_APP = PRELUDIO + '''
+import app
+importado = time.time()
+# Solo caché en memoria: una ruta guardada en disco por una corrida anterior no cuenta como primera ruta.
+from cache_rutas import CacheRutas
+app.cache_rutas = CacheRutas()
+cliente = app.app.test_client()
+respuesta = cliente.post('/ruta?algoritmo=dijkstra', json={
+    'origen_lat': o_lat, 'origen_lon': o_lon, 'destino_lat': d_lat, 'destino_lon': d_lon}).get_json()
+assert respuesta['success'] and not respuesta['desde_cache'], respuesta
+primera = time.time()
+cargadas = pesadas()
+assert app.cola_render.esperar(respuesta['mapa_url'].rsplit('/', 1)[-1])
+imagen = time.time()
+cliente.get('/')
+print(json.dumps({'inicio': inicio, 'importado': importado, 'primera': primera, 'pesadas': cargadas,
+                  'imagen': imagen - primera, 'pagina': time.time() - imagen}))
+'''
+
+CODIGO_NUCLEO = PRELUDIO + '''
+from nucleo_rutas import NucleoRutas
+importado = time.time()
+assert NucleoRutas.desde_snapshot().ruta(o_lat, o_lon, d_lat, d_lon)
+primera = time.time()
+print(json.dumps({'inicio': inicio, 'importado': importado, 'primera': primera, 'pesadas': pesadas()}))
+'''
+
+CODIGO_CLI = PRELUDIO + '''
+import rutas_lote
+print(json.dumps({'inicio': inicio, 'importado': time.time(), 'pesadas': pesadas()}))
+'''
+
+
+def ejecutar(codigo, coordenadas):
+    """Corre `codigo` en un proceso nuevo y devuelve su JSON con tiempos relativos al lanzamiento (ms)."""
+    lanzado = time.time()
+    salida = subprocess.run([sys.executable, '-c', codigo, *map(str, coordenadas)], cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stdout
+    datos = json.loads(salida.strip().splitlines()[-1])
+    for marca in ('importado', 'primera'):
+        if marca in datos:
+            datos[marca] = (datos[marca] - datos['inicio']) * 1000
+    datos['arranque'] = (datos['inicio'] - lanzado) * 1000
+    return datos
+
+
+def primera_fila_cli(coordenadas):
+    """Milisegundos desde que se lanza rutas_lote.py hasta que escribe la primera fila de resultados."""
+    lanzado = time.time()
+    proceso = subprocess.Popen([sys.executable, 'rutas_lote.py', '-'], cwd=RAIZ, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    proceso.stdin.write('origen_lat,origen_lon,destino_lat,destino_lon\n' + ','.join(map(str, coordenadas)) + '\n')
+    proceso.stdin.flush()
+    proceso.stdout.readline()  # Encabezado.
+    fila = proceso.stdout.readline()
+    transcurrido = (time.time() - lanzado) * 1000
+    proceso.stdin.close()
+    proceso.wait()
+    assert fila.split(',')[1] == 'ok', fila
+    return transcurrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5, help='Procesos nuevos por medición.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los puntos sean reproducibles.')
+    args = parser.parse_args()
+
+    grafo = GrafoCSR.cargar(localizar_snapshot())
+    rnd = random.Random(args.semilla)
+
+    def punto():
+        nodo = rnd.randrange(grafo.num_nodos)
+        return float(grafo.y[nodo]), float(grafo.x[nodo])
+
+    mediciones = {'app': [], 'nucleo': [], 'cli': []}
+    for i in range(args.repeticiones):
+        coordenadas = punto() + punto()
+        mediciones['app'].append(ejecutar(CODIGO_APP, coordenadas))
+        mediciones['nucleo'].append(ejecutar(CODIGO_NUCLEO, coordenadas))
+        cli = ejecutar(CODIGO_CLI, coordenadas)
+        cli['primera'] = primera_fila_cli(coordenadas) - cli['arranque']
+        mediciones['cli'].append(cli)
+        print(f"  repetición {i + 1}/{args.repeticiones}")
+
+    mediana = lambda nombre, campo: statistics.median(d[campo] for d in mediciones[nombre])
+    print("=" * 92)
+    print(f"Medianas de {args.repeticiones} procesos nuevos (ms); 'primera ruta' cuenta desde el lanzamiento.")
+    print("=" * 92)
+    print(f"{'proceso':<24} {'intérprete':>10} {'importación':>12} {'primera ruta':>13}  bibliotecas pesadas")
+    for nombre, titulo in (('app', 'app.py (Flask)'), ('nucleo', 'nucleo_rutas (API)'), ('cli', 'rutas_lote.py (CLI)')):
+        primera = mediana(nombre, 'arranque') + mediana(nombre, 'primera')
+        pesadas = ', '.join(mediciones[nombre][-1]['pesadas']) or '-'
+        print(f"{titulo:<24} {mediana(nombre, 'arranque'):>10.0f} {mediana(nombre, 'importado'):>12.0f} "
+              f"{primera:>13.0f}  {pesadas}")
+    print(f"Aplicación: imagen de la primera ruta lista {mediana('app', 'imagen') * 1000:.0f} ms después; "
+          f"primera visita a '/' (importa Folium) {mediana('app', 'pagina') * 1000:.0f} ms.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: PRUEBA DE CARGA DE /ruta
+Descripción:
+Envía peticiones POST /ruta a un servidor ya levantado (por ejemplo con
+`python servidor.py --procesos 4`) con concurrencia creciente, y reporta por
+nivel la latencia p50/p95/p99, el rendimiento (peticiones por segundo) y
+cuántas respuestas fueron 503 (cola llena) o 504 (plazo vencido).
+
+Los puntos son nodos aleatorios del snapshot, distintos en cada petición
+para no medir la caché; con --pares-distintos N se reparten entre solo N
+pares, para medir la coalescencia de peticiones idénticas y la caché.
+
+Uso:
+    python benchmarks/carga_ruta.py --url http://127.0.0.1:5000 --niveles 1,2,4,8,16,32 --peticiones 200
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import red_vial  # noqa: E402
+
+
+def enviar(url, cuerpo, timeout):
+    """Hace una petición; devuelve (código HTTP o 'error', milisegundos)."""
+    peticion = urllib.request.Request(url, data=json.dumps(cuerpo).encode('utf-8'),
+                                      headers={'Content-Type': 'application/json'})
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            codigo = respuesta.status if json.load(respuesta).get('success') else 'sin ruta'
+    except urllib.error.HTTPError as e:
+        codigo = e.code
+    except (urllib.error.URLError, TimeoutError):
+        codigo = 'error'
+    return codigo, (time.perf_counter() - inicio) * 1000
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))] if ordenados else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Dirección del servidor.')
+    parser.add_argument('--niveles', default='1,2,4,8,16,32', help='Concurrencias a probar, separadas por comas.')
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por nivel.')
+    parser.add_argument('--pares-distintos', type=int, default=0,
+                        help='Repartir las peticiones entre solo N pares (0 = todas distintas).')
+    parser.add_argument('--timeout', type=float, default=60, help='Tiempo máximo de cada petición (s).')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los puntos sean reproducibles.')
+    args = parser.parse_args()
+
+    grafo = red_vial.cargar_red()
+    rnd = random.Random(args.semilla)
+    n = grafo.num_nodos
+
+    def par_aleatorio():
+        o, d = rnd.randrange(n), rnd.randrange(n)
+        return {"origen_lat": float(grafo.y[o]), "origen_lon": float(grafo.x[o]),
+                "destino_lat": float(grafo.y[d]), "destino_lon": float(grafo.x[d])}
+
+    fijos = [par_aleatorio() for _ in range(args.pares_distintos)]
+    url = args.url.rstrip('/') + '/ruta'
+
+    print(f"{'concurrencia':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'pet/s':>8}  respuestas")
+    for concurrencia in [int(c) for c in args.niveles.split(',')]:
+        cuerpos = [rnd.choice(fijos) if fijos else par_aleatorio() for _ in range(args.peticiones)]
+        inicio = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            resultados = list(pool.map(lambda c: enviar(url, c, args.timeout), cuerpos))
+        total_seg = time.perf_counter() - inicio
+
+        codigos = collections.Counter(codigo for codigo, _ in resultados)
+        exitosas = [ms for codigo, ms in resultados if codigo in (200, 'sin ruta')]
+        resumen = ", ".join(f"{codigo}: {cantidad}" for codigo, cantidad in sorted(codigos.items(), key=str))
+        print(f"{concurrencia:>12} {percentil(exitosas, 50):9.1f} {percentil(exitosas, 95):9.1f} "
+              f"{percentil(exitosas, 99):9.1f} {len(resultados) / total_seg:8.1f}  {resumen}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: DIJKSTRA VS. A* BIDIRECCIONAL
+Descripción:
+Ejecuta las mismas consultas con `MotorDijkstra` y `MotorAStarBidireccional`
+y reporta, para cada una, el tiempo y los nodos asentados por cada motor. Las
+consultas son los pares emblemáticos de version_preliminar/dijkstra_oaxaca.py
+más pares de nodos aleatorios.
+
+Uso:
+    python benchmarks/comparar_astar.py --pares 50 --semilla 42
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+from lugares import PARES_EMBLEMATICOS  # noqa: E402
+
+
+def ejecutar(motor, origen, destino):
+    """Devuelve (costo, milisegundos, nodos asentados) de una consulta."""
+    inicio = time.perf_counter()
+    _, costo = motor.ruta_mas_corta(origen, destino)
+    return costo, (time.perf_counter() - inicio) * 1000, motor.ultimas_estadisticas['nodos_asentados']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=50, help='Número de pares aleatorios además de los emblemáticos.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los pares sean reproducibles.')
+    args = parser.parse_args()
+
+    consultas = []
+    ids = app.grafo_csr.ids_nodos
+    for descripcion, (lat_o, lon_o), (lat_d, lon_d) in PARES_EMBLEMATICOS:
+        origen, destino = app.indice_espacial.nodos_mas_cercanos([lat_o, lat_d], [lon_o, lon_d])[0]
+        consultas.append((descripcion, int(ids[origen]), int(ids[destino])))
+    rnd = random.Random(args.semilla)
+    nodos = ids.tolist()
+    for i in range(args.pares):
+        consultas.append((f"aleatorio #{i + 1}", rnd.choice(nodos), rnd.choice(nodos)))
+
+    motor_astar = app.ALGORITMOS['astar_bidireccional']
+    totales = {'dijkstra': [0.0, 0], 'astar': [0.0, 0]}
+    print(f"{'Consulta':<52} {'Dijkstra ms':>11} {'asentados':>9} {'A* ms':>9} {'asentados':>9}")
+    for descripcion, origen, destino in consultas:
+        costo_d, ms_d, asentados_d = ejecutar(app.motor_dijkstra, origen, destino)
+        costo_a, ms_a, asentados_a = ejecutar(motor_astar, origen, destino)
+        if not math.isclose(costo_d, costo_a, abs_tol=1e-6):
+            print(f"¡AVISO! Costos distintos en '{descripcion}': {costo_d:.3f} vs {costo_a:.3f}")
+        totales['dijkstra'][0] += ms_d
+        totales['dijkstra'][1] += asentados_d
+        totales['astar'][0] += ms_a
+        totales['astar'][1] += asentados_a
+        print(f"{descripcion[:52]:<52} {ms_d:11.2f} {asentados_d:9d} {ms_a:9.2f} {asentados_a:9d}")
+
+    print("=" * 94)
+    print(f"{'TOTAL':<52} {totales['dijkstra'][0]:11.2f} {totales['dijkstra'][1]:9d}"
+          f" {totales['astar'][0]:9.2f} {totales['astar'][1]:9d}")
+    print(f"Reducción de nodos asentados: {totales['dijkstra'][1] / max(1, totales['astar'][1]):.2f}x")
+
+
+if __name__ == '__main__':
+    main()
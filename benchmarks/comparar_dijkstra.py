@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: DIJKSTRA ORIGINAL VS. MOTOR CON MONTÍCULO
+Descripción:
+Compara `dijkstra_personalizado` (búsqueda lineal del mínimo) con
+`MotorDijkstra` (montículo + terminación temprana sobre el grafo CSR) en pares
+de nodos aleatorios del grafo de Oaxaca. Además del tiempo, verifica que ambos
+devuelvan el mismo costo.
+
+Uso:
+    python benchmarks/comparar_dijkstra.py --pares 20 --semilla 42
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402  (carga el grafo y construye el motor al importarse)
+
+
+def medir(funcion, *args):
+    """Ejecuta `funcion(*args)` y devuelve (resultado, segundos)."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=20, help='Número de pares origen/destino aleatorios.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los pares sean reproducibles.')
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semilla)
+    nodos = list(app.G.nodes)
+    pares = [(rnd.choice(nodos), rnd.choice(nodos)) for _ in range(args.pares)]
+
+    tiempos_original, tiempos_motor = [], []
+    diferencias = 0
+    for origen, destino in pares:
+        (_, costo_original), t_original = medir(app.dijkstra_personalizado, app.G, origen, destino)
+        (_, costo_motor), t_motor = medir(app.motor_dijkstra.ruta_mas_corta, origen, destino)
+        tiempos_original.append(t_original)
+        tiempos_motor.append(t_motor)
+        if not math.isclose(costo_original, costo_motor, abs_tol=1e-6):
+            diferencias += 1
+
+    print("=" * 60)
+    print(f"Grafo: {app.grafo_csr.num_nodos} nodos, {app.grafo_csr.num_aristas} aristas | {len(pares)} pares")
+    print("=" * 60)
+    for nombre, tiempos in (("dijkstra_personalizado", tiempos_original), ("MotorDijkstra", tiempos_motor)):
+        print(f"{nombre:<24} media {statistics.mean(tiempos) * 1000:10.2f} ms"
+              f" | mediana {statistics.median(tiempos) * 1000:10.2f} ms"
+              f" | máx {max(tiempos) * 1000:10.2f} ms")
+    print(f"Aceleración (media): {statistics.mean(tiempos_original) / statistics.mean(tiempos_motor):.1f}x")
+    print(f"Pares con costo distinto: {diferencias}")
+
+
+if __name__ == '__main__':
+    main()
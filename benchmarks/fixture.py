@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+FIXTURE: GRAFO FIJO PARA LA SUITE DE BENCHMARKS
+Descripción:
+Empaqueta el grafo compacto de un snapshot (ver red_vial.py) en un solo
+archivo .npz comprimido que se sube al repositorio, junto con su jerarquía de
+contracción. Así benchmarks/suite.py mide siempre sobre el mismo grafo, sin
+descargar nada y sin depender de la versión de OSMnx instalada.
+
+El snapshot debe existir (se crea al arrancar app.py o con
+construir_snapshot.py); este script no descarga el mapa.
+
+Uso:
+    python benchmarks/fixture.py [--snapshot datos/snapshots/<clave>] [--salida benchmarks/fixtures/oaxaca.npz]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np  # noqa: E402
+
+from grafo_compacto import ARREGLOS, GrafoCSR  # noqa: E402
+from jerarquia_contraccion import LIMITE_TESTIGO, construir_jerarquia  # noqa: E402
+from red_vial import DIRECTORIO_SNAPSHOTS, clave_snapshot  # noqa: E402
+
+RUTA_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'oaxaca.npz')
+
+
+def ruta_jerarquia(ruta_fixture):
+    """Archivo de la jerarquía de contracción que acompaña a un fixture."""
+    return f'{os.path.splitext(ruta_fixture)[0]}_ch.npz'
+
+
+def guardar_fixture(grafo, ruta_archivo, meta):
+    """
+    Escribe el grafo y sus metadatos en un .npz comprimido.
+
+    Los nombres de calle, las clases de vía y los metadatos van como texto
+    JSON, para que el archivo se lea sin `allow_pickle`.
+    """
+    os.makedirs(os.path.dirname(ruta_archivo) or '.', exist_ok=True)
+    np.savez_compressed(
+        ruta_archivo,
+        nombres=np.array(json.dumps(grafo.nombres, ensure_ascii=False)),
+        clases_via=np.array(json.dumps(grafo.clases_via, ensure_ascii=False)),
+        meta=np.array(json.dumps(meta, ensure_ascii=False)),
+        **{nombre: np.ascontiguousarray(getattr(grafo, nombre)) for nombre in ARREGLOS},
+    )
+
+
+def cargar_fixture(ruta_archivo=RUTA_FIXTURE):
+    """
+    Lee un fixture escrito con `guardar_fixture`.
+
+    Returns:
+        tuple: (GrafoCSR, dict de metadatos).
+
+    Raises:
+        FileNotFoundError: Si el fixture no existe.
+    """
+    with np.load(ruta_archivo) as datos:
+        arreglos = {nombre: datos[nombre] for nombre in ARREGLOS}
+        nombres = json.loads(str(datos['nombres']))
+        clases_via = json.loads(str(datos['clases_via']))
+        meta = json.loads(str(datos['meta']))
+    return GrafoCSR(nombres=nombres, clases_via=clases_via, **arreglos), meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--snapshot', default=os.path.join(DIRECTORIO_SNAPSHOTS, clave_snapshot()),
+                        help='Carpeta del snapshot de origen (por defecto, el de la configuración actual).')
+    parser.add_argument('--salida', default=RUTA_FIXTURE, help='Archivo .npz del fixture.')
+    parser.add_argument('--limite-testigo', type=int, default=LIMITE_TESTIGO,
+                        help='Límite de las búsquedas testigo de la jerarquía de contracción.')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.snapshot):
+        sys.exit(f"No existe el snapshot {args.snapshot}. Arranca app.py o ejecuta construir_snapshot.py primero.")
+    grafo = GrafoCSR.cargar(args.snapshot, mmap=False)
+    meta = {'huella': grafo.huella(), 'nodos': grafo.num_nodos, 'aristas': grafo.num_aristas,
+            'creado': time.strftime('%Y-%m-%d %H:%M:%S')}
+    ruta_meta = os.path.join(args.snapshot, 'meta.json')
+    if os.path.exists(ruta_meta):
+        with open(ruta_meta, encoding='utf-8') as archivo:
+            meta['snapshot'] = json.load(archivo)
+
+    guardar_fixture(grafo, args.salida, meta)
+    print(f"Fixture escrito en {args.salida} ({os.path.getsize(args.salida) / 2**20:.2f} MiB, "
+          f"{grafo.num_nodos} nodos, {grafo.num_aristas} aristas).")
+
+    print("Contrayendo el grafo para la jerarquía del fixture...")
+    inicio = time.perf_counter()
+    jerarquia = construir_jerarquia(grafo, limite_testigo=args.limite_testigo)
+    jerarquia.guardar(ruta_jerarquia(args.salida))
+    print(f"Jerarquía escrita en {ruta_jerarquia(args.salida)} ({jerarquia.num_atajos} atajos, "
+          f"{time.perf_counter() - inicio:.1f} s).")
+
+
+if __name__ == '__main__':
+    main()
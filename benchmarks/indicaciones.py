@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: INDICACIONES PASO A PASO
+Descripción:
+Para un conjunto fijo de rutas (los pares emblemáticos más pares aleatorios
+con semilla), compara la generación de indicaciones anterior (un rumbo
+calculado y un segmento por arista) con `indicaciones.generar_indicaciones`
+(rumbos precalculados y una maniobra por tramo de la misma calle). Reporta el
+tiempo de CPU, el número de segmentos y el tamaño en bytes del JSON de
+segmentos que se envía al navegador.
+
+Uso:
+    python benchmarks/indicaciones.py --pares 50 --semilla 42 --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+from indicaciones import generar_indicaciones, obtener_direccion_giro  # noqa: E402
+from lugares import PARES_EMBLEMATICOS  # noqa: E402
+from motor_rutas import calcular_rumbo  # noqa: E402
+
+
+def indicaciones_por_arista(grafo, aristas):
+    """Generación anterior: un segmento por arista y el rumbo calculado en cada consulta."""
+    segmentos = []
+    bearing_anterior = None
+    for i, arista in enumerate(aristas):
+        u, v = grafo.origenes[arista], grafo.destinos[arista]
+        distancia_m = float(grafo.longitudes[arista])
+        tiempo_seg = float(grafo.pesos[arista])
+        velocidad_kmh = (distancia_m / tiempo_seg) * 3.6 if tiempo_seg > 0 else 0
+
+        bearing_actual = calcular_rumbo(grafo.y[u], grafo.x[u], grafo.y[v], grafo.x[v])
+        direccion = "Inicia el recorrido"
+        if i > 0:
+            direccion = obtener_direccion_giro(bearing_anterior, bearing_actual)
+        bearing_anterior = bearing_actual
+
+        segmentos.append({
+            "direccion": direccion,
+            "calle": grafo.nombres[grafo.nombres_id[arista]],
+            "distancia": f"{distancia_m:.0f} m",
+            "velocidad": f"{velocidad_kmh:.1f} km/h",
+            "tiempo": f"{tiempo_seg:.1f} s"
+        })
+    return segmentos
+
+
+def cronometrar(funcion, rutas, repeticiones):
+    """Devuelve (segmentos de cada ruta, mediana en ms del conjunto completo)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultados = [funcion(app.grafo_csr, aristas) for aristas in rutas]
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return resultados, statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=50, help='Número de pares aleatorios además de los emblemáticos.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los pares sean reproducibles.')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por medición (se reporta la mediana).')
+    args = parser.parse_args()
+
+    grafo = app.grafo_csr
+    ids = grafo.ids_nodos
+    pares = []
+    for _, (lat_o, lon_o), (lat_d, lon_d) in PARES_EMBLEMATICOS:
+        origen, destino = app.indice_espacial.nodos_mas_cercanos([lat_o, lat_d], [lon_o, lon_d])[0]
+        pares.append((int(ids[origen]), int(ids[destino])))
+    rnd = random.Random(args.semilla)
+    nodos = ids.tolist()
+    pares += [(rnd.choice(nodos), rnd.choice(nodos)) for _ in range(args.pares)]
+
+    rutas = []
+    for origen, destino in pares:
+        ruta, _ = app.motor_dijkstra.ruta_mas_corta(origen, destino)
+        if ruta is not None and len(ruta) > 1:
+            rutas.append(grafo.aristas_de_ruta([grafo.indice[n] for n in ruta]))
+
+    anteriores, ms_anterior = cronometrar(indicaciones_por_arista, rutas, args.repeticiones)
+    nuevas, ms_nuevo = cronometrar(generar_indicaciones, rutas, args.repeticiones)
+    bytes_anterior = sum(len(json.dumps(s).encode('utf-8')) for s in anteriores)
+    bytes_nuevo = sum(len(json.dumps(s).encode('utf-8')) for s in nuevas)
+
+    print("=" * 72)
+    print(f"Indicaciones de {len(rutas)} rutas ({sum(map(len, rutas))} aristas en total)")
+    print("=" * 72)
+    print(f"{'':<26} {'CPU ms':>10} {'segmentos':>10} {'bytes JSON':>12}")
+    print(f"{'Un segmento por arista':<26} {ms_anterior:10.2f} {sum(map(len, anteriores)):10d} {bytes_anterior:12d}")
+    print(f"{'Maniobras (precalculado)':<26} {ms_nuevo:10.2f} {sum(map(len, nuevas)):10d} {bytes_nuevo:12d}")
+    print(f"Reducción: {ms_anterior / ms_nuevo:.1f}x en CPU, {bytes_anterior / bytes_nuevo:.1f}x en bytes")
+
+
+if __name__ == '__main__':
+    main()
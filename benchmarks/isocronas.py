@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: ISÓCRONAS CON REJILLA VS. GEOPANDAS
+Descripción:
+Para orígenes aleatorios, mide `calcular_isocronas` (una búsqueda cortada en
+el umbral mayor, rasterización y contorno) y lo compara con la forma directa
+de obtener el mismo polígono: una búsqueda completa por umbral y, con las
+calles alcanzadas, un GeoSeries al que se aplica buffer y unión. Se reporta
+la mediana de cada parte y cuánto difieren las áreas.
+
+Uso:
+    python benchmarks/isocronas.py --origenes 20 --minutos 5,10,15
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import geopandas as gpd  # noqa: E402
+import numpy as np  # noqa: E402
+from shapely.geometry import LineString, shape  # noqa: E402
+from shapely.ops import unary_union  # noqa: E402
+
+import app  # noqa: E402
+from isocronas import TAMANO_CELDA_M, calcular_isocronas  # noqa: E402
+
+
+def isocronas_geopandas(motor, origen, umbrales_seg):
+    """Polígonos por umbral con una búsqueda completa y buffer + unión de GeoPandas (en EPSG:32614)."""
+    grafo = motor.grafo
+    poligonos = []
+    for umbral in umbrales_seg:
+        nodos, tiempos = motor.alcanzables(origen, math.inf)
+        tiempo_nodo = np.full(grafo.num_nodos, np.inf)
+        tiempo_nodo[nodos] = tiempos
+        aristas = np.flatnonzero(tiempo_nodo[grafo.origenes] + grafo.pesos <= umbral)
+        lineas = gpd.GeoSeries([LineString(np.column_stack(grafo.trazo_arista(a))) for a in aristas], crs='EPSG:4326')
+        poligonos.append(unary_union(lineas.to_crs('EPSG:32614').buffer(TAMANO_CELDA_M).tolist()))
+    return poligonos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--origenes', type=int, default=20, help='Número de orígenes aleatorios.')
+    parser.add_argument('--minutos', default='5,10,15', help='Umbrales en minutos, separados por comas.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los orígenes sean reproducibles.')
+    args = parser.parse_args()
+
+    umbrales = [float(m) * 60 for m in args.minutos.split(',')]
+    motor = app.motor_dijkstra
+    rnd = random.Random(args.semilla)
+    origenes = [rnd.randrange(motor.grafo.num_nodos) for _ in range(args.origenes)]
+
+    tiempos = {'rejilla': [], 'geopandas': []}
+    diferencias = []
+    for i, origen in enumerate(origenes, 1):
+        inicio = time.perf_counter()
+        rejilla = calcular_isocronas(motor, origen, umbrales)
+        tiempos['rejilla'].append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        referencia = isocronas_geopandas(motor, origen, umbrales)
+        tiempos['geopandas'].append((time.perf_counter() - inicio) * 1000)
+
+        for caracteristica, poligono in zip(rejilla['features'], referencia):
+            area_referencia = poligono.area / 1e6
+            if area_referencia > 0:
+                diferencias.append(abs(caracteristica['properties']['area_km2'] / area_referencia - 1) * 100)
+        print(f"  origen {i}/{len(origenes)}")
+
+    # Validez de los polígonos de la rejilla (shapely) en el último origen.
+    validos = all(shape(c['geometry']).is_valid for c in rejilla['features'])
+    base = statistics.median(tiempos['geopandas'])
+    print("=" * 60)
+    print(f"Isócronas de {args.minutos} min, {len(origenes)} orígenes")
+    print("=" * 60)
+    print(f"{'método':<12} {'ms (mediana)':>14} {'aceleración':>12}")
+    for metodo, valores in tiempos.items():
+        mediana = statistics.median(valores)
+        print(f"{metodo:<12} {mediana:14.2f} {base / mediana:11.1f}x")
+    print(f"Diferencia de área con buffer de {TAMANO_CELDA_M} m: mediana {statistics.median(diferencias):.1f}%")
+    print(f"Polígonos válidos: {'sí' if validos else 'no'}")
+
+
+if __name__ == '__main__':
+    main()
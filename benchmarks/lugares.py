@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Pares origen/destino tomados de los ejemplos de version_preliminar/dijkstra_oaxaca.py.
+Sirven como consultas fijas y reconocibles para los benchmarks.
+"""
+
+# (descripción, (lat_origen, lon_origen), (lat_destino, lon_destino))
+PARES_EMBLEMATICOS = [
+    ("Santo Domingo de Guzmán → Aeropuerto de Oaxaca", (17.0654, -96.7218), (17.0013, -96.7183)),
+    ("Casa Xoxo → Universidad", (17.0347, -96.7350), (16.9969, -96.7524)),
+    ("Coordenadas Mario", (17.0676206026916, -96.72343737910167), (17.001345610243103, -96.7181714289195)),
+    ("Palacio de Gobierno → Catedral", (17.0594, -96.7262), (17.0611, -96.7248)),
+    ("Fuente de las 8 Regiones → Auditorio Guelaguetza", (17.0722, -96.7317), (17.0673, -96.7339)),
+    ("Parque Central de Xoxocotlán → Macroplaza Oaxaca", (17.0305, -96.7369), (17.068710, -96.694694)),
+]
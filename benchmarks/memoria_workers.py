@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+MEDICIÓN: MEMORIA POR PROCESO CON VARIOS WORKERS
+Descripción:
+Simula un servidor pre-fork (como gunicorn con --preload): el proceso padre
+carga el grafo, crea N procesos hijos y cada uno atiende consultas de ruta.
+Después reporta el RSS y el PSS de cada hijo (Linux, /proc/<pid>/smaps_rollup).
+El PSS reparte las páginas compartidas entre los procesos que las usan, así
+que es la medida que muestra cuánta memoria cuesta realmente cada worker.
+
+Modos:
+    networkx  Antes: cada worker recorre el MultiDiGraph de NetworkX. Los
+              cambios en los contadores de referencias copian las páginas
+              (copy-on-write) y el grafo termina duplicado en cada proceso.
+    snapshot  Después: cada worker usa los arreglos del snapshot mapeados en
+              memoria de solo lectura, que permanecen compartidos.
+
+Uso:
+    python benchmarks/memoria_workers.py --workers 4 --consultas 50
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import red_vial  # noqa: E402
+from motor_rutas import MotorDijkstra  # noqa: E402
+
+
+def memoria_proceso():
+    """
+    Devuelve (RSS, PSS, privada) del proceso actual en MiB.
+
+    La memoria privada (USS) son las páginas que solo tiene este proceso: lo
+    que se libera si el worker termina. PSS y privada son None fuera de Linux.
+    """
+    valores = {}
+    try:
+        with open('/proc/self/smaps_rollup') as archivo:
+            for linea in archivo:
+                partes = linea.split()
+                if partes and partes[0].endswith(':') and partes[-1] == 'kB':
+                    valores[partes[0][:-1]] = int(partes[1]) / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, None, None
+    privada = valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)
+    return valores.get('Rss'), valores.get('Pss'), privada
+
+
+def consultas_networkx(G, pares):
+    import networkx as nx
+
+    for origen, destino in pares:
+        try:
+            ruta = nx.shortest_path(G, origen, destino, weight='tiempo_viaje_seg')
+        except nx.NetworkXNoPath:
+            continue
+        # Igual que el armado de segmentos original: se leen los datos de cada arista.
+        sum(G.edges[u, v, 0]['length'] for u, v in zip(ruta[:-1], ruta[1:]))
+
+
+def consultas_snapshot(grafo, pares):
+    motor = MotorDijkstra(grafo)
+    for origen, destino in pares:
+        ruta, _ = motor.ruta_mas_corta(origen, destino)
+        if ruta:
+            aristas = grafo.aristas_de_ruta([grafo.indice[n] for n in ruta])
+            float(grafo.longitudes[aristas].sum())
+
+
+def worker(modo, grafo, pares, barrera, resultados):
+    if modo == 'networkx':
+        consultas_networkx(grafo, pares)
+    else:
+        consultas_snapshot(grafo, pares)
+    # Se mide cuando todos los workers ya trabajaron, para que el PSS refleje
+    # cuántas páginas siguen compartidas entre ellos.
+    barrera.wait()
+    resultados.put((os.getpid(),) + memoria_proceso())
+    barrera.wait()
+
+
+def medir(modo, workers, consultas, semilla):
+    """Carga el grafo en este proceso, crea los workers y reporta su memoria."""
+    contexto = multiprocessing.get_context('fork')
+    grafo = red_vial.grafo_networkx() if modo == 'networkx' else red_vial.cargar_red()
+    nodos = list(grafo.nodes) if modo == 'networkx' else grafo.ids_nodos.tolist()
+    rnd = random.Random(semilla)
+    pares = [(rnd.choice(nodos), rnd.choice(nodos)) for _ in range(consultas)]
+    rss_padre, pss_padre, _ = memoria_proceso()
+
+    barrera = contexto.Barrier(workers)
+    resultados = contexto.Queue()
+    procesos = [contexto.Process(target=worker, args=(modo, grafo, pares, barrera, resultados))
+                for _ in range(workers)]
+    for proceso in procesos:
+        proceso.start()
+    medidas = [resultados.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+
+    print("=" * 72)
+    print(f"Modo: {modo} | {workers} workers | {consultas} consultas c/u")
+    print(f"Proceso padre: RSS {rss_padre:8.1f} MiB | PSS {pss_padre or 0:8.1f} MiB")
+    print("=" * 72)
+    for pid, rss, pss, privada in sorted(medidas):
+        print(f"  worker {pid:>7}: RSS {rss:8.1f} MiB | PSS {pss or 0:8.1f} MiB | privada {privada or 0:8.1f} MiB")
+    print(f"  PSS total de los workers:      {sum(m[2] or 0 for m in medidas):8.1f} MiB")
+    print(f"  Memoria privada de los workers: {sum(m[3] or 0 for m in medidas):8.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='Número de procesos hijos.')
+    parser.add_argument('--consultas', type=int, default=50, help='Consultas por worker.')
+    parser.add_argument('--modos', nargs='+', default=['networkx', 'snapshot'], choices=['networkx', 'snapshot'])
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    if len(args.modos) == 1:
+        medir(args.modos[0], args.workers, args.consultas, args.semilla)
+        return
+    # Cada modo se mide en un intérprete nuevo para que uno no contamine al otro.
+    for modo in args.modos:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--modos', modo,
+                        '--workers', str(args.workers), '--consultas', str(args.consultas),
+                        '--semilla', str(args.semilla)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: COSTO DE LAS MÉTRICAS EN /ruta
+Descripción:
+Atiende las mismas peticiones a /ruta (cliente de pruebas de Flask, sin red)
+en tres modos: métricas desactivadas, activadas, y activadas con el
+encabezado `X-Perfilar: 1`. Los modos se alternan en cada ronda y se reporta
+la mediana del tiempo por petición y el costo relativo a las métricas
+desactivadas. Como esa diferencia suele quedar dentro del ruido entre rondas,
+también se mide aparte lo que la instrumentación hace en una petición (marcas
+del cronómetro y observaciones en los histogramas).
+
+Cada ronda empieza con una caché de rutas vacía (solo en memoria), para que
+todas las peticiones calculen su ruta. Las imágenes no se dibujan: el dibujo
+corre en otros procesos y aquí solo agregaría ruido al tiempo de la petición.
+
+Uso:
+    python benchmarks/metricas.py --pares 200 --rondas 5 --algoritmo dijkstra
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+from cache_rutas import CacheRutas  # noqa: E402
+from metricas import LIMITES_KM, LIMITES_NODOS, Registro  # noqa: E402
+
+MODOS = {
+    'desactivadas': (False, {}),
+    'activadas': (True, {}),
+    'activadas + X-Perfilar': (True, {'X-Perfilar': '1'}),
+}
+
+
+def costo_instrumentacion(repeticiones=20000):
+    """Microsegundos de las marcas y observaciones que hace una petición que calcula su ruta."""
+    registro = Registro()
+    etapas = registro.histograma('etapas', '', etiquetas=('etapa',))
+    nodos = registro.histograma('nodos', '', LIMITES_NODOS, ('algoritmo',))
+    km = registro.histograma('km', '', LIMITES_KM)
+    respuestas = registro.contador('respuestas', '', ('resultado',))
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        peticion, calculo = registro.cronometro(), registro.cronometro()
+        for etapa in ('entrada', 'ajuste', 'cache'):
+            peticion.marcar(etapa)
+        for etapa in ('busqueda', 'aristas', 'indicaciones', 'encolar_mapa', 'guardar_cache'):
+            calculo.marcar(etapa)
+        peticion.marcar('calculo')
+        peticion.etapas['total'] = sum(peticion.etapas.values())
+        for cronometro in (calculo, peticion):
+            for etapa, segundos in cronometro.etapas.items():
+                etapas.observar(segundos, etapa)
+        nodos.observar(1500, 'dijkstra')
+        nodos.observar(1800, 'dijkstra')
+        km.observar(3.2)
+        respuestas.incrementar('calculada')
+    return (time.perf_counter() - inicio) * 1e6 / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=200, help='Peticiones por modo y ronda.')
+    parser.add_argument('--rondas', type=int, default=5, help='Rondas (se reporta la mediana).')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los pares sean reproducibles.')
+    parser.add_argument('--algoritmo', default='dijkstra', help='Motor que se pide en ?algoritmo=.')
+    args = parser.parse_args()
+
+    app.cola_render.encolar = lambda rutas, origen, destino: 'mapa_ruta_benchmark.png'
+    grafo = app.grafo_csr
+    rnd = random.Random(args.semilla)
+    cuerpos = []
+    for _ in range(args.pares):
+        o, d = rnd.randrange(grafo.num_nodos), rnd.randrange(grafo.num_nodos)
+        cuerpos.append({'origen_lat': float(grafo.y[o]), 'origen_lon': float(grafo.x[o]),
+                        'destino_lat': float(grafo.y[d]), 'destino_lon': float(grafo.x[d])})
+
+    cliente = app.app.test_client()
+    url = f'/ruta?algoritmo={args.algoritmo}'
+    tiempos = {modo: [] for modo in MODOS}
+    for ronda in range(args.rondas):
+        orden = list(MODOS)
+        rnd.shuffle(orden)
+        for modo in orden:
+            activo, encabezados = MODOS[modo]
+            app.configurar_metricas(activo)
+            app.cache_rutas = CacheRutas()
+            inicio = time.perf_counter()
+            for cuerpo in cuerpos:
+                cliente.post(url, json=cuerpo, headers=encabezados)
+            tiempos[modo].append((time.perf_counter() - inicio) * 1000 / len(cuerpos))
+        print(f"  ronda {ronda + 1}/{args.rondas}")
+
+    base = statistics.median(tiempos['desactivadas'])
+    print("=" * 60)
+    print(f"/ruta con {args.algoritmo}, {len(cuerpos)} peticiones por modo")
+    print("=" * 60)
+    print(f"{'modo':<26} {'ms/petición':>12} {'costo':>10}")
+    for modo, valores in tiempos.items():
+        mediana = statistics.median(valores)
+        print(f"{modo:<26} {mediana:12.3f} {(mediana / base - 1) * 100:9.1f}%")
+    costo_us = costo_instrumentacion()
+    print(f"Instrumentación por petición: {costo_us:.1f} µs ({costo_us / 10 / base:.2f}% de {base:.3f} ms)")
+
+
+if __name__ == '__main__':
+    main()
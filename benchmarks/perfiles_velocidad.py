@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: CÁLCULO DE PESOS Y PERFILES DE VELOCIDAD
+Descripción:
+1. Compara la asignación de 'tiempo_viaje_seg' sobre el grafo de NetworkX
+   (un ciclo de Python con try/except por arista) con el cálculo vectorizado
+   del perfil por defecto sobre los arreglos del grafo compacto, y verifica
+   que den exactamente los mismos pesos.
+2. Para cada perfil de `perfiles_velocidad.PERFILES`, mide el tiempo de
+   construir su arreglo de pesos sobre el grafo compacto y la memoria que
+   ocupa, y lo compara con el perfil por defecto.
+
+Uso:
+    python benchmarks/perfiles_velocidad.py --repeticiones 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np  # noqa: E402
+
+import red_vial  # noqa: E402
+from perfiles_velocidad import PERFIL_POR_DEFECTO, PERFILES  # noqa: E402
+
+
+def cronometrar(funcion, repeticiones):
+    """Devuelve (último resultado, mediana en ms) de `repeticiones` ejecuciones."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return resultado, statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por medición (se reporta la mediana).')
+    args = parser.parse_args()
+
+    G = red_vial.grafo_networkx()
+    grafo = red_vial.cargar_red()
+    _, ms_ciclo = cronometrar(lambda: red_vial.asignar_tiempos_viaje(G), args.repeticiones)
+    pesos, ms_vectorizado = cronometrar(lambda: PERFILES[PERFIL_POR_DEFECTO].pesos_grafo(grafo), args.repeticiones)
+    # El grafo compacto usa la arista más rápida de cada par (u, v).
+    ids = grafo.ids_nodos
+    referencia = np.array([min(d['tiempo_viaje_seg'] for d in G[ids[u]][ids[v]].values())
+                           for u, v in zip(grafo.origenes.tolist(), grafo.destinos.tolist())])
+    iguales = np.array_equal(pesos, referencia)
+
+    print("=" * 72)
+    print("Cálculo de 'tiempo_viaje_seg'")
+    print("=" * 72)
+    print(f"  Ciclo sobre NetworkX ({G.number_of_edges()} aristas):  {ms_ciclo:9.2f} ms")
+    print(f"  Vectorizado sobre arreglos ({grafo.num_aristas} aristas): {ms_vectorizado:9.2f} ms  "
+          f"({ms_ciclo / ms_vectorizado:.0f}x)")
+    print(f"  Pesos idénticos: {'sí' if iguales else 'NO'}")
+
+    base = np.asarray(grafo.pesos)
+    positivos = np.isfinite(base) & (base > 0)
+    print("=" * 72)
+    print(f"Perfiles de velocidad sobre el grafo compacto ({grafo.num_aristas} aristas)")
+    print("=" * 72)
+    print(f"{'perfil':<12} {'construcción':>13} {'memoria':>10} {'tiempo vs. ' + PERFIL_POR_DEFECTO:>18}")
+    for nombre, perfil in PERFILES.items():
+        pesos, ms = cronometrar(lambda: perfil.pesos_grafo(grafo), args.repeticiones)
+        relacion = float(np.median(pesos[positivos] / base[positivos]))
+        print(f"{nombre:<12} {ms:10.2f} ms {pesos.nbytes / 2**20:7.2f} MiB {relacion:17.2f}x")
+        if nombre == PERFIL_POR_DEFECTO and not np.array_equal(pesos, base):
+            print(f"  AVISO: el perfil '{nombre}' no coincide con los pesos del snapshot.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: MEMORIA Y LATENCIA DE LA RED POR REGIONES SEGÚN LA COBERTURA
+Descripción:
+Parte el grafo del snapshot en una rejilla de regiones (en una carpeta
+temporal) y simula que la cobertura crece: con las primeras k regiones, se
+piden rutas cuyos extremos caen en ellas. Para cada k se reporta la memoria
+estimada de las regiones cargadas, la latencia de la primera pasada (que
+carga las regiones) y la de la segunda (ya cargadas), junto con la memoria y
+la latencia del grafo completo en una sola pieza. También se comprueba que
+los tiempos de ruta coinciden con los del grafo completo.
+
+Al final se repite la cobertura completa con un presupuesto de memoria de
+dos regiones, para ver el costo de cargar y descartar regiones.
+
+Uso:
+    python benchmarks/regiones.py --rejilla 3x3 --consultas 100
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np  # noqa: E402
+
+import red_vial  # noqa: E402
+from grafo_compacto import ARREGLOS  # noqa: E402
+from motor_rutas import MotorDijkstra  # noqa: E402
+from regiones import (RedRegional, construir_superposicion, fragmentar, guardar_regiones,  # noqa: E402
+                      regiones_por_rejilla)
+
+
+def medir(red, pares, posiciones):
+    """Milisegundos (mediana) por ruta con la red regional y sus tiempos."""
+    tiempos_ms, costos = [], []
+    for o, d in pares:
+        inicio = time.perf_counter()
+        resultado = red.ruta_mas_corta(red.ajustar(*posiciones[o]), red.ajustar(*posiciones[d]))
+        tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+        costos.append(resultado['tiempo_seg'] if resultado else float('inf'))
+    return statistics.median(tiempos_ms), costos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rejilla', default='3x3', help='Columnas x filas de la rejilla de regiones.')
+    parser.add_argument('--consultas', type=int, default=100, help='Rutas por nivel de cobertura.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que las rutas sean reproducibles.')
+    args = parser.parse_args()
+
+    grafo = red_vial.cargar_red()
+    columnas, filas = (int(n) for n in args.rejilla.lower().split('x'))
+    region_nodo, nombres = regiones_por_rejilla(grafo, columnas, filas)
+    inicio = time.perf_counter()
+    fragmentos = fragmentar(grafo, region_nodo)
+    superposicion = construir_superposicion(fragmentos)
+    print(f"{len(fragmentos)} regiones, {len(superposicion['ids_frontera'])} nodos frontera, "
+          f"construidas en {time.perf_counter() - inicio:.1f} s")
+
+    motor = MotorDijkstra(grafo)
+    mb_completo = sum(getattr(grafo, arreglo).nbytes for arreglo in ARREGLOS) / 2**20
+    posiciones = list(zip(np.asarray(grafo.y).tolist(), np.asarray(grafo.x).tolist()))
+    ids = grafo.ids_nodos
+    rnd = random.Random(args.semilla)
+    orden = sorted(fragmentos)
+
+    with tempfile.TemporaryDirectory() as temporal:
+        directorio = os.path.join(temporal, 'regiones')
+        guardar_regiones(directorio, fragmentos, nombres, superposicion)
+
+        print("=" * 86)
+        print(f"{'regiones':>8} {'nodos':>8} {'MB cargados':>12} {'MB completo':>12} "
+              f"{'ms 1a pasada':>13} {'ms 2a pasada':>13} {'ms completo':>12} {'difieren':>8}")
+        for k in range(1, len(orden) + 1):
+            cubiertos = np.flatnonzero(np.isin(region_nodo, orden[:k]))
+            pares = [(int(rnd.choice(cubiertos)), int(rnd.choice(cubiertos))) for _ in range(args.consultas)]
+            red = RedRegional(directorio, presupuesto_mb=float('inf'))
+            fria_ms, costos = medir(red, pares, posiciones)
+            caliente_ms, _ = medir(red, pares, posiciones)
+
+            completo_ms, referencia = [], []
+            for o, d in pares:
+                inicio = time.perf_counter()
+                referencia.append(motor.ruta_mas_corta(int(ids[o]), int(ids[d]))[1])
+                completo_ms.append((time.perf_counter() - inicio) * 1000)
+            difieren = sum(abs(a - b) > 1e-6 for a, b in zip(costos, referencia) if b < float('inf'))
+            print(f"{k:>8} {len(cubiertos):>8} {red.estadisticas()['mb_cargados']:>12.2f} {mb_completo:>12.2f} "
+                  f"{fria_ms:>13.2f} {caliente_ms:>13.2f} {statistics.median(completo_ms):>12.2f} {difieren:>8}")
+
+        mb_region = max(r['bytes'] for r in red.manifiesto['regiones']) / 2**20
+        red = RedRegional(directorio, presupuesto_mb=2 * mb_region)
+        ms, _ = medir(red, pares, posiciones)
+        estadisticas = red.estadisticas()
+        print(f"Presupuesto de {2 * mb_region:.2f} MB (dos regiones): {ms:.2f} ms por ruta, "
+              f"{estadisticas['cargas']} cargas, {estadisticas['desalojos']} desalojos, "
+              f"{estadisticas['segundos_carga'] * 1000 / max(estadisticas['cargas'], 1):.2f} ms por carga.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: SUITE REPRODUCIBLE DE RUTEO
+Descripción:
+Mide el ruteo sobre el grafo fijo de benchmarks/fixtures (ver fixture.py), sin
+red ni snapshot, con consultas que dependen solo de la semilla:
+
+  - emblematicos: los pares de lugares.py que caen dentro del fixture.
+  - aleatorios por estrato: pares de nodos al azar agrupados por la longitud
+    de su ruta más rápida (ver ESTRATOS_KM), --por-estrato en cada grupo.
+
+Para cada conjunto se ejecutan el ajuste de coordenadas (a nodo y a arista),
+cada motor de rutas y el dibujo de la imagen, y se reportan los percentiles
+de latencia, los nodos asentados y las inserciones en el montículo por
+búsqueda, y el pico de memoria de Python por consulta (tracemalloc, en una
+pasada aparte para no alterar los tiempos). Los resultados se escriben en
+JSON (--salida).
+
+Con --comparar se contrastan con una base guardada (--guardar-base) y se
+marcan como regresión los aumentos mayores que --tolerancia en p50/p90 y en
+memoria, y cualquier aumento en nodos asentados; en ese caso el script
+termina con código 1 (2 si el fixture o las consultas no coinciden). Los
+tiempos se corrigen con una calibración (un trabajo fijo de Python puro
+medido antes de cada consulta), porque en una máquina compartida la
+velocidad cambia por periodos de varios segundos.
+
+Uso:
+    python benchmarks/suite.py --semilla 42 --por-estrato 40 --guardar-base
+    python benchmarks/suite.py --comparar benchmarks/fixtures/base.json
+"""
+
+import argparse
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np  # noqa: E402
+
+from fixture import RUTA_FIXTURE, cargar_fixture, ruta_jerarquia  # noqa: E402
+from indice_espacial import IndiceEspacial, PuntoFueraDeArea  # noqa: E402
+from jerarquia_contraccion import JerarquiaContraccion  # noqa: E402
+from lugares import PARES_EMBLEMATICOS  # noqa: E402
+from mapa_ruta import COLOR_RUTA, cargar_capa_base, construir_capa_base, renderizar, trazos_ruta  # noqa: E402
+from motor_rutas import RADIO_TIERRA_M  # noqa: E402
+from servicio import crear_motores  # noqa: E402
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_BASE = os.path.join(DIRECTORIO, 'fixtures', 'base.json')
+RUTA_SALIDA = os.path.join(DIRECTORIO, 'resultados', 'ultimo.json')
+# Se incrementa cuando cambia la forma del JSON de resultados.
+FORMATO_RESULTADOS = 1
+
+# Límites (km) entre estratos de longitud de ruta.
+ESTRATOS_KM = (1, 3, 6, 10)
+# Desviación (m) con la que se alejan de su nodo las coordenadas que se ajustan.
+DESVIACION_AJUSTE_M = 15
+# Destinos candidatos por búsqueda al generar los pares aleatorios.
+CANDIDATOS_POR_ORIGEN = 64
+# Aumento relativo tolerado en latencia y memoria. En una máquina compartida
+# las consultas de menos de un milisegundo varían hasta ~25% entre corridas.
+TOLERANCIA = 0.30
+
+
+def nombres_estratos():
+    limites = (0,) + ESTRATOS_KM
+    nombres = [f'{a}-{b} km' for a, b in zip(limites[:-1], limites[1:])]
+    return nombres + [f'>{ESTRATOS_KM[-1]} km']
+
+
+# ==============================================================================
+# CONSULTAS
+# ==============================================================================
+
+def generar_consultas(grafo, indice, motor, por_estrato, semilla):
+    """
+    Conjuntos de consultas reproducibles: emblemáticos y aleatorios por estrato.
+
+    Los pares aleatorios se clasifican por la distancia de su ruta más rápida,
+    que da una búsqueda uno-a-muchos por origen (no se cronometra). Si el
+    grafo no tiene rutas tan largas, el estrato queda con menos pares.
+
+    Returns:
+        dict: Conjunto -> lista de consultas (lat_o, lon_o, lat_d, lon_d,
+              nodo_o, nodo_d), con los nodos como índices del grafo.
+    """
+    rnd = random.Random(semilla)
+    grados_m = 1 / (np.radians(1) * RADIO_TIERRA_M)
+
+    def consulta(origen, destino):
+        # Las coordenadas se desplazan un poco del nodo para que el ajuste tenga trabajo.
+        coordenadas = []
+        for nodo in (origen, destino):
+            lat, lon = float(grafo.y[nodo]), float(grafo.x[nodo])
+            coordenadas += [lat + rnd.gauss(0, DESVIACION_AJUSTE_M) * grados_m,
+                            lon + rnd.gauss(0, DESVIACION_AJUSTE_M) * grados_m / math.cos(math.radians(lat))]
+        return (*coordenadas, origen, destino)
+
+    conjuntos = {'emblematicos': []}
+    for _, (lat_o, lon_o), (lat_d, lon_d) in PARES_EMBLEMATICOS:
+        try:
+            origen, destino = indice.ajustar([lat_o, lat_d], [lon_o, lon_d])
+        except PuntoFueraDeArea:
+            continue
+        conjuntos['emblematicos'].append((lat_o, lon_o, lat_d, lon_d, int(origen), int(destino)))
+
+    estratos = {nombre: [] for nombre in nombres_estratos()}
+    maximo_origenes = 50 * por_estrato
+    for _ in range(maximo_origenes):
+        if all(len(pares) >= por_estrato for pares in estratos.values()):
+            break
+        origen = rnd.randrange(grafo.num_nodos)
+        destinos = [rnd.randrange(grafo.num_nodos) for _ in range(CANDIDATOS_POR_ORIGEN)]
+        _, metros = motor.uno_a_muchos(origen, destinos)
+        for destino, distancia_m in zip(destinos, metros):
+            if destino == origen or math.isinf(distancia_m):
+                continue
+            pares = estratos[nombres_estratos()[bisect.bisect_right(ESTRATOS_KM, distancia_m / 1000)]]
+            if len(pares) < por_estrato:
+                pares.append(consulta(origen, destino))
+    conjuntos.update(estratos)
+    return {nombre: consultas for nombre, consultas in conjuntos.items() if consultas}
+
+
+def huella_consultas(conjuntos):
+    """Resumen de los nodos de todas las consultas, para saber si dos corridas son comparables."""
+    resumen = hashlib.sha1()
+    for nombre in sorted(conjuntos):
+        resumen.update(nombre.encode('utf-8'))
+        resumen.update(np.array([c[4:] for c in conjuntos[nombre]], dtype=np.int64).tobytes())
+    return resumen.hexdigest()
+
+
+# ==============================================================================
+# MEDICIÓN
+# ==============================================================================
+
+def resumen(milisegundos, **extras):
+    """Percentiles de latencia de una serie de mediciones."""
+    valores = np.asarray(milisegundos)
+    datos = {
+        'n': int(len(valores)),
+        'p50_ms': float(np.percentile(valores, 50)),
+        'p90_ms': float(np.percentile(valores, 90)),
+        'p99_ms': float(np.percentile(valores, 99)),
+        'media_ms': float(valores.mean()),
+        'max_ms': float(valores.max()),
+    }
+    datos.update(extras)
+    return datos
+
+
+def calibracion():
+    """Trabajo fijo de Python puro (montículo y aritmética), para estimar la velocidad de la máquina."""
+    monticulo = []
+    for i in range(200):
+        heapq.heappush(monticulo, ((i * 7919) % 211 + 0.5, i))
+    while monticulo:
+        heapq.heappop(monticulo)
+
+
+def cronometrar(funcion, entradas, repeticiones):
+    """
+    Tiempo (ms) de `funcion(entrada)` para cada entrada, descontando la carga de la máquina.
+
+    Cada repetición recorre todas las entradas, así que las muestras de una
+    misma consulta quedan separadas en el tiempo. Antes y después de cada
+    consulta se mide `calibracion`; en una máquina compartida la velocidad
+    cambia por periodos, así que cada muestra se reescala a la velocidad de la
+    mejor calibración y se toma la menor (la carga de otros procesos solo
+    puede alargar una medición).
+
+    Returns:
+        tuple: (tiempos por entrada, mejor tiempo de `calibracion`).
+    """
+    muestras = [[] for _ in entradas]
+    calibraciones = []
+    for _ in range(repeticiones):
+        for i, entrada in enumerate(entradas):
+            inicio = time.perf_counter()
+            calibracion()
+            medio = time.perf_counter()
+            funcion(entrada)
+            fin = time.perf_counter()
+            calibraciones.append((medio - inicio) * 1000)
+            muestras[i].append(((fin - medio) * 1000, calibraciones[-1]))
+    mejor = min(calibraciones)
+    return [min(ms * mejor / cal for ms, cal in serie) for serie in muestras], mejor
+
+
+def pico_memoria_kib(funcion, entradas):
+    """Mayor pico de memoria de Python (KiB) de `funcion(entrada)` entre las entradas."""
+    tracemalloc.start()
+    try:
+        pico = 0
+        for entrada in entradas:
+            tracemalloc.reset_peak()
+            actual = tracemalloc.get_traced_memory()[0]
+            funcion(entrada)
+            pico = max(pico, tracemalloc.get_traced_memory()[1] - actual)
+    finally:
+        tracemalloc.stop()
+    return round(pico / 1024, 1)
+
+
+def medir(funcion, entradas, repeticiones, consultas_memoria, **extras):
+    """Calentamiento, tiempos y pico de memoria de una etapa sobre un conjunto de consultas."""
+    for entrada in entradas[:3]:
+        funcion(entrada)
+    tiempos, calibracion_ms = cronometrar(funcion, entradas, repeticiones)
+    pico = pico_memoria_kib(funcion, entradas[:consultas_memoria])
+    return resumen(tiempos, calibracion_ms=calibracion_ms, memoria_pico_kib=pico, **extras)
+
+
+def medir_motor(motor, grafo, consultas, repeticiones, consultas_memoria):
+    """Etapa de un motor: latencia, nodos asentados e inserciones en el montículo."""
+    ids = grafo.ids_nodos
+    pares = [(int(ids[c[4]]), int(ids[c[5]])) for c in consultas]
+    asentados, inserciones = [], []
+    for origen, destino in pares:
+        motor.ruta_mas_corta(origen, destino)
+        asentados.append(motor.ultimas_estadisticas['nodos_asentados'])
+        inserciones.append(motor.ultimas_estadisticas['inserciones_monticulo'])
+    return medir(lambda par: motor.ruta_mas_corta(*par), pares, repeticiones, consultas_memoria,
+                 nodos_asentados_media=float(np.mean(asentados)),
+                 nodos_asentados_p50=float(np.median(asentados)),
+                 inserciones_media=float(np.mean(inserciones)))
+
+
+def ejecutar_suite(args):
+    """Carga el fixture, genera las consultas y mide todas las etapas."""
+    inicio = time.perf_counter()
+    grafo, meta = cargar_fixture(args.fixture)
+    jerarquia = None
+    if os.path.exists(ruta_jerarquia(args.fixture)):
+        jerarquia = JerarquiaContraccion.cargar(ruta_jerarquia(args.fixture))
+        if jerarquia.huella != grafo.huella():
+            print("La jerarquía del fixture no corresponde al grafo; se omite 'ch'.")
+            jerarquia = None
+    motores = crear_motores(grafo, jerarquia)
+    indice = IndiceEspacial(grafo)
+    carga_ms = (time.perf_counter() - inicio) * 1000
+    print(f"Fixture: {grafo.num_nodos} nodos, {grafo.num_aristas} aristas (carga en {carga_ms:.0f} ms).")
+
+    conjuntos = generar_consultas(grafo, indice, motores['dijkstra'], args.por_estrato, args.semilla)
+    for nombre, consultas in conjuntos.items():
+        print(f"  {nombre:<14} {len(consultas):4d} consultas")
+    todas = [c for consultas in conjuntos.values() for c in consultas]
+
+    mediciones = {}
+    for a_arista, etapa in ((False, 'ajuste_nodo'), (True, 'ajuste_arista')):
+        print(f"Midiendo {etapa}...")
+        puntos = []
+        for c in todas:
+            try:
+                indice.ajustar([c[0], c[2]], [c[1], c[3]], a_arista=a_arista)
+            except PuntoFueraDeArea:
+                continue
+            puntos.append(([c[0], c[2]], [c[1], c[3]]))
+        mediciones[etapa] = {'todas': medir(lambda p: indice.ajustar(*p, a_arista=a_arista), puntos,
+                                            args.repeticiones, args.consultas_memoria)}
+
+    for algoritmo, motor in motores.items():
+        print(f"Midiendo {algoritmo}...")
+        mediciones[algoritmo] = {nombre: medir_motor(motor, grafo, consultas, args.repeticiones,
+                                                     args.consultas_memoria)
+                                 for nombre, consultas in conjuntos.items()}
+
+    if args.dibujos:
+        print("Midiendo dibujo...")
+        motor = motores['dijkstra']
+        rutas = []
+        for c in todas[::max(1, len(todas) // args.dibujos)][:args.dibujos]:
+            ruta, _ = motor.ruta_mas_corta(int(grafo.ids_nodos[c[4]]), int(grafo.ids_nodos[c[5]]))
+            if ruta is not None and len(ruta) > 1:
+                aristas = grafo.aristas_de_ruta([grafo.indice[n] for n in ruta])
+                rutas.append(([(trazos_ruta(grafo, aristas), COLOR_RUTA)],
+                              (float(grafo.x[c[4]]), float(grafo.y[c[4]])),
+                              (float(grafo.x[c[5]]), float(grafo.y[c[5]]))))
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta_capa = os.path.join(directorio, 'capa.npy')
+            inicio = time.perf_counter()
+            construir_capa_base(grafo, ruta_capa)
+            capa_ms = (time.perf_counter() - inicio) * 1000
+            capa = cargar_capa_base(ruta_capa)
+            imagen = os.path.join(directorio, 'ruta.png')
+            mediciones['dibujo'] = {'todas': medir(lambda r: renderizar(capa, *r, imagen), rutas, 1,
+                                                   min(3, args.consultas_memoria), capa_base_ms=capa_ms)}
+
+    return {
+        'formato': FORMATO_RESULTADOS,
+        'creado': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'fixture': {'huella': grafo.huella(), 'nodos': grafo.num_nodos, 'aristas': grafo.num_aristas,
+                    'creado': meta.get('creado'), 'carga_ms': carga_ms},
+        'parametros': {'semilla': args.semilla, 'por_estrato': args.por_estrato, 'estratos_km': ESTRATOS_KM,
+                       'repeticiones': args.repeticiones, 'dibujos': args.dibujos},
+        'consultas': {nombre: len(consultas) for nombre, consultas in conjuntos.items()},
+        'huella_consultas': huella_consultas(conjuntos),
+        'entorno': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'mediciones': mediciones,
+        # ru_maxrss está en KiB en Linux.
+        'rss_max_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+# ==============================================================================
+# REPORTE Y COMPARACIÓN
+# ==============================================================================
+
+def imprimir(resultados):
+    print("=" * 96)
+    print(f"{'etapa':<20} {'conjunto':<14} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'asentados':>10} {'inserciones':>11} {'pico KiB':>9}")
+    print("=" * 96)
+    for etapa, conjuntos in resultados['mediciones'].items():
+        for nombre, datos in conjuntos.items():
+            asentados = datos.get('nodos_asentados_media')
+            inserciones = datos.get('inserciones_media')
+            print(f"{etapa:<20} {nombre:<14} {datos['n']:5d} {datos['p50_ms']:9.3f} {datos['p90_ms']:9.3f} "
+                  f"{datos['p99_ms']:9.3f} {'-' if asentados is None else f'{asentados:.0f}':>10} "
+                  f"{'-' if inserciones is None else f'{inserciones:.0f}':>11} {datos['memoria_pico_kib']:9.1f}")
+    print(f"RSS máximo del proceso: {resultados['rss_max_mib']:.1f} MiB")
+
+
+def comparar(actual, base, tolerancia):
+    """
+    Compara dos corridas e imprime las regresiones.
+
+    Returns:
+        int: 0 sin regresiones, 1 si hay alguna, 2 si las corridas no son comparables.
+    """
+    if actual['fixture']['huella'] != base['fixture']['huella'] or \
+            actual['huella_consultas'] != base['huella_consultas']:
+        print("El fixture o las consultas no coinciden con la base (¿otra semilla o --por-estrato?); "
+              "no se puede comparar.")
+        return 2
+
+    # (métrica, tolerancia relativa): los conteos de la búsqueda son deterministas.
+    criterios = (('p50_ms', tolerancia), ('p90_ms', tolerancia), ('memoria_pico_kib', tolerancia),
+                 ('nodos_asentados_media', 0.0), ('inserciones_media', 0.0))
+    regresiones = 0
+    print("=" * 72)
+    print(f"Comparación con la base del {base['creado']} (tolerancia {tolerancia:.0%}; "
+          f"el porcentaje descuenta la calibración)")
+    print("=" * 72)
+    for etapa, conjuntos in actual['mediciones'].items():
+        for nombre, datos in conjuntos.items():
+            anterior = base['mediciones'].get(etapa, {}).get(nombre)
+            if anterior is None:
+                print(f"{etapa:<20} {nombre:<14} nuevo (sin base)")
+                continue
+            # Los tiempos se comparan en unidades de la calibración medida junto con ellos.
+            escala = anterior['calibracion_ms'] / datos['calibracion_ms']
+            for metrica, margen in criterios:
+                if metrica not in datos or metrica not in anterior or not anterior[metrica]:
+                    continue
+                razon = datos[metrica] / anterior[metrica] * (escala if metrica.endswith('_ms') else 1)
+                if razon > 1 + margen + 1e-9:
+                    regresiones += 1
+                    print(f"REGRESIÓN {etapa:<20} {nombre:<14} {metrica:<22} "
+                          f"{anterior[metrica]:10.3f} -> {datos[metrica]:10.3f} ({razon - 1:+.1%})")
+                elif metrica == 'p50_ms' and razon < 1 - margen:
+                    print(f"mejora    {etapa:<20} {nombre:<14} {metrica:<22} "
+                          f"{anterior[metrica]:10.3f} -> {datos[metrica]:10.3f} ({razon - 1:+.1%})")
+    print(f"{regresiones} regresiones." if regresiones else "Sin regresiones.")
+    return 1 if regresiones else 0
+
+
+def escribir_json(datos, ruta):
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixture', default=RUTA_FIXTURE, help='Archivo .npz escrito por fixture.py.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla de las consultas aleatorias.')
+    parser.add_argument('--por-estrato', type=int, default=40, help='Pares aleatorios por estrato de longitud.')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por consulta (se toma la mejor).')
+    parser.add_argument('--consultas-memoria', type=int, default=20,
+                        help='Consultas por conjunto en la pasada de memoria (tracemalloc).')
+    parser.add_argument('--dibujos', type=int, default=10, help='Imágenes que se dibujan (0 para omitir).')
+    parser.add_argument('--salida', default=RUTA_SALIDA, help='Archivo JSON con los resultados.')
+    parser.add_argument('--guardar-base', action='store_true', help=f'Guardar también los resultados en {RUTA_BASE}.')
+    parser.add_argument('--comparar', metavar='BASE', help='JSON de una corrida anterior contra el cual comparar.')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help='Aumento relativo permitido en latencia y memoria antes de marcar regresión.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.fixture):
+        sys.exit(f"No existe el fixture {args.fixture}. Créalo con: python benchmarks/fixture.py")
+
+    resultados = ejecutar_suite(args)
+    imprimir(resultados)
+    escribir_json(resultados, args.salida)
+    print(f"Resultados en {args.salida}")
+    if args.guardar_base:
+        escribir_json(resultados, RUTA_BASE)
+        print(f"Base guardada en {RUTA_BASE}")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            sys.exit(comparar(resultados, json.load(archivo), args.tolerancia))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK: ACTUALIZACIONES DE TRÁFICO EN VIVO
+Descripción:
+1. Mide cuánto tarda `RedEnVivo.aplicar` en cerrar (y después reabrir) lotes
+   de 1, 10, 100 y 1000 aristas aleatorias en todos los perfiles.
+2. Si la jerarquía de contracción cargada es personalizable, compara su
+   personalización con unos pesos nuevos contra reconstruirla desde cero
+   (la reconstrucción solo se mide con --reconstruir, porque tarda).
+3. Mide la latencia de consultas (p50/p95) con la red quieta y mientras otro
+   hilo aplica lotes de cambios sin pausa, y verifica que cada respuesta
+   tenga el costo correcto para los pesos con los que se calculó.
+
+Usa una `RedEnVivo` propia, sin caché: no toca la caché de rutas en disco.
+
+Uso:
+    python benchmarks/trafico_en_vivo.py --consultas 300 --semilla 42 [--reconstruir]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np  # noqa: E402
+
+import app  # noqa: E402
+from jerarquia_contraccion import construir_jerarquia  # noqa: E402
+from perfiles_velocidad import PERFIL_POR_DEFECTO  # noqa: E402
+from trafico import RedEnVivo  # noqa: E402
+
+TAMANOS_LOTE = (1, 10, 100, 1000)
+
+
+def cambios_aleatorios(grafo, rnd, cantidad, accion):
+    """Lote de `cantidad` aristas aleatorias con la misma acción."""
+    ids = grafo.ids_nodos
+    aristas = rnd.sample(range(grafo.num_aristas), min(cantidad, grafo.num_aristas))
+    return [dict({"u": int(ids[grafo.origenes[a]]), "v": int(ids[grafo.destinos[a]])}, **accion) for a in aristas]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def consultar(red, pares, algoritmo):
+    """Ejecuta los pares; devuelve (ms por consulta, respuestas con costo incorrecto)."""
+    tiempos, incorrectas = [], 0
+    for origen, destino in pares:
+        inicio = time.perf_counter()
+        estado = red.estado(PERFIL_POR_DEFECTO)
+        ruta, costo = estado.motores[algoritmo].ruta_mas_corta(origen, destino)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        # La referencia es Dijkstra con exactamente los pesos de ese estado.
+        _, referencia = estado.motores['dijkstra'].ruta_mas_corta(origen, destino)
+        if not (costo == referencia or math.isclose(costo, referencia, rel_tol=1e-9)):
+            incorrectas += 1
+    return tiempos, incorrectas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--consultas', type=int, default=300, help='Consultas aleatorias por escenario.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los cambios sean reproducibles.')
+    parser.add_argument('--reconstruir', action='store_true',
+                        help='Medir también la reconstrucción completa de la jerarquía.')
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semilla)
+    red = RedEnVivo(app.GRAFOS_PERFIL, app.crear_motores, app.JERARQUIAS)
+    grafo = app.GRAFOS_PERFIL[PERFIL_POR_DEFECTO]
+
+    print("=" * 72)
+    print(f"Aplicar lotes de cambios ({len(red.perfiles)} perfiles, {grafo.num_aristas} aristas)")
+    print("=" * 72)
+    print(f"{'aristas':>8} {'cerrar ms':>11} {'reabrir ms':>11}")
+    # El primer lote incluye preparar la topología de la jerarquía (una sola vez).
+    calentamiento = cambios_aleatorios(grafo, rnd, 1, {"cerrada": True})
+    red.aplicar(calentamiento)
+    red.aplicar([dict(c, cerrada=False, restaurar=True) for c in calentamiento])
+    for tamano in TAMANOS_LOTE:
+        cierre = cambios_aleatorios(grafo, rnd, tamano, {"cerrada": True})
+        reapertura = [dict(c, cerrada=False, restaurar=True) for c in cierre]
+        ms_cerrar = red.aplicar(cierre)['ms']
+        ms_reabrir = red.aplicar(reapertura)['ms']
+        print(f"{tamano:>8} {ms_cerrar:11.2f} {ms_reabrir:11.2f}")
+
+    jerarquia = app.JERARQUIAS.get(PERFIL_POR_DEFECTO)
+    if jerarquia is not None and jerarquia.personalizable:
+        pesos = np.array(grafo.pesos, copy=True)
+        pesos *= np.random.default_rng(args.semilla).uniform(0.5, 2.0, len(pesos))
+        nuevo = grafo.con_pesos(pesos)
+        inicio = time.perf_counter()
+        jerarquia.personalizar(nuevo)
+        ms_personalizar = (time.perf_counter() - inicio) * 1000
+        print("=" * 72)
+        print(f"Jerarquía con todos los pesos cambiados ({jerarquia.num_atajos} atajos)")
+        print("=" * 72)
+        print(f"  Personalizar:  {ms_personalizar:10.1f} ms")
+        if args.reconstruir:
+            inicio = time.perf_counter()
+            construir_jerarquia(nuevo, limite_testigo=0)
+            ms_reconstruir = (time.perf_counter() - inicio) * 1000
+            print(f"  Reconstruir:   {ms_reconstruir:10.1f} ms  ({ms_reconstruir / ms_personalizar:.0f}x)")
+    elif jerarquia is not None:
+        print("La jerarquía cargada no es personalizable: con cambios activos el perfil usa Dijkstra.")
+
+    algoritmo = app.ALGORITMO_POR_DEFECTO
+    nodos = grafo.ids_nodos.tolist()
+    pares = [(rnd.choice(nodos), rnd.choice(nodos)) for _ in range(args.consultas)]
+    print("=" * 72)
+    print(f"Latencia de consultas '{algoritmo}' ({args.consultas} pares)")
+    print("=" * 72)
+    tiempos, incorrectas = consultar(red, pares, algoritmo)
+    print(f"  Sin cambios:         p50 {percentil(tiempos, 50):7.2f} ms  p95 {percentil(tiempos, 95):7.2f} ms  "
+          f"incorrectas: {incorrectas}")
+
+    detener = threading.Event()
+    lotes = []
+
+    def actualizar():
+        rnd_hilo = random.Random(args.semilla + 1)
+        while not detener.is_set():
+            cierre = cambios_aleatorios(grafo, rnd_hilo, 10, {"cerrada": True})
+            red.aplicar(cierre)
+            red.aplicar([dict(c, cerrada=False, restaurar=True) for c in cierre])
+            lotes.append(2)
+
+    hilo = threading.Thread(target=actualizar, daemon=True)
+    hilo.start()
+    tiempos, incorrectas = consultar(red, pares, algoritmo)
+    detener.set()
+    hilo.join()
+    print(f"  Con actualizaciones: p50 {percentil(tiempos, 50):7.2f} ms  p95 {percentil(tiempos, 95):7.2f} ms  "
+          f"incorrectas: {incorrectas}  ({sum(lotes)} lotes aplicados)")
+
+
+if __name__ == '__main__':
+    main()
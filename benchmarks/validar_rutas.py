@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+VALIDACIÓN: RUTAS DE LOS MOTORES VS. NETWORKX
+Descripción:
+Compara, en miles de pares de nodos aleatorios, el costo de las rutas de cada
+motor de app.py (Dijkstra, A* bidireccional y la jerarquía de contracción si
+está cargada) con `nx.shortest_path(..., weight='tiempo_viaje_seg')` sobre el
+MultiDiGraph original, que entre aristas paralelas toma la más rápida. Para
+cada ruta verifica además que el costo reportado sea la suma de los pesos de
+sus aristas en el grafo compacto, y que ambos coincidan en los pares sin ruta.
+
+También cuenta los pares (u, v) con aristas paralelas en los que una arista
+de clave distinta de 0 es más rápida: ahí es donde usar siempre la clave 0
+daba rutas peores.
+
+Uso:
+    python benchmarks/validar_rutas.py --pares 2000 --semilla 42
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import networkx as nx  # noqa: E402
+
+import app  # noqa: E402
+from perfiles_velocidad import PERFIL_POR_DEFECTO  # noqa: E402
+
+PESO = 'tiempo_viaje_seg'
+
+
+def costo_networkx(G, origen, destino):
+    """Costo de `nx.shortest_path` (inf si no hay ruta)."""
+    try:
+        ruta = nx.shortest_path(G, origen, destino, weight=PESO)
+    except nx.NetworkXNoPath:
+        return math.inf
+    return nx.path_weight(G, ruta, PESO)
+
+
+def costo_aristas(grafo, ruta):
+    """Suma de los pesos del grafo compacto a lo largo de una ruta de IDs de OSM."""
+    return float(grafo.pesos[grafo.aristas_de_ruta([grafo.indice[n] for n in ruta])].sum())
+
+
+def iguales(a, b):
+    return a == b or math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=2000, help='Número de pares origen/destino aleatorios.')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla para que los pares sean reproducibles.')
+    args = parser.parse_args()
+
+    G = app.G
+    grafo = app.grafo_csr
+    motores = app.red_en_vivo.estado(PERFIL_POR_DEFECTO).motores
+
+    paralelas = sum(1 for u, v in {(u, v) for u, v, k in G.edges(keys=True) if k != 0}
+                    if min(d.get(PESO, math.inf) for d in G[u][v].values()) < G.edges[u, v, 0].get(PESO, math.inf))
+    print(f"Pares (u, v) donde una arista paralela es más rápida que la de clave 0: {paralelas}")
+
+    rnd = random.Random(args.semilla)
+    nodos = grafo.ids_nodos.tolist()
+    pares = [(rnd.choice(nodos), rnd.choice(nodos)) for _ in range(args.pares)]
+
+    errores = {nombre: 0 for nombre in motores}
+    tiempos = {nombre: 0.0 for nombre in ['networkx', *motores]}
+    for i, (origen, destino) in enumerate(pares):
+        inicio = time.perf_counter()
+        referencia = costo_networkx(G, origen, destino)
+        tiempos['networkx'] += time.perf_counter() - inicio
+        for nombre, motor in motores.items():
+            inicio = time.perf_counter()
+            ruta, costo = motor.ruta_mas_corta(origen, destino)
+            tiempos[nombre] += time.perf_counter() - inicio
+            correcto = iguales(costo, referencia) and (ruta is None) == math.isinf(referencia)
+            if correcto and ruta is not None:
+                correcto = iguales(costo_aristas(grafo, ruta), costo)
+            if not correcto:
+                errores[nombre] += 1
+                if errores[nombre] <= 5:
+                    print(f"  {nombre}: {origen} -> {destino}: {costo:.3f} s vs. NetworkX {referencia:.3f} s")
+        if (i + 1) % 500 == 0:
+            print(f"  {i + 1}/{len(pares)} pares revisados")
+
+    print("=" * 60)
+    print(f"{'motor':<22} {'errores':>8} {'ms promedio':>12}")
+    for nombre in tiempos:
+        fallidos = '-' if nombre == 'networkx' else errores[nombre]
+        print(f"{nombre:<22} {fallidos:>8} {tiempos[nombre] * 1000 / len(pares):12.3f}")
+    if any(errores.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
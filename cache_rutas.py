@@ -0,0 +1,194 @@
+# ==============================================================================
+# CACHÉ DE RESULTADOS DE RUTA
+# ==============================================================================
+# Muchas consultas repiten los mismos corredores (lugares emblemáticos, clics
+# populares). Una vez ajustados a la red, dos clics cercanos caen en el mismo
+# par de nodos, así que el resultado completo de /ruta (ruta, totales,
+# segmentos e imagen) se guarda bajo la clave
+#     (origen_nodo, destino_nodo, perfil de pesos, versión del grafo)
+# en una caché LRU con caducidad en memoria y, opcionalmente, en una carpeta
+# compartida por todos los procesos del servidor.
+#
+# El algoritmo no forma parte de la clave: todos devuelven una ruta óptima,
+# así que una ruta calculada con uno sirve para los demás.
+#
+# La versión del grafo forma parte de la clave: cuando cambian los pesos de
+# las aristas cambia la versión y las entradas viejas dejan de coincidir;
+# `invalidar()` además las borra para liberar espacio.
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CAPACIDAD_RUTAS = 2048
+TTL_RUTAS_SEG = 6 * 3600
+DIRECTORIO_CACHE_RUTAS = os.path.join('datos', 'cache_rutas')
+# Cada cuántas escrituras se revisa la carpeta para borrar entradas de más.
+ESCRITURAS_ENTRE_LIMPIEZAS = 100
+
+
+class CacheRutas:
+    """
+    Caché LRU con caducidad para resultados de ruta.
+
+    Args:
+        capacidad (int): Entradas que se conservan en memoria como máximo.
+        ttl_seg (float): Segundos que una entrada sigue siendo válida.
+        directorio (str): Carpeta para compartir entradas entre procesos
+                          (un JSON por clave). None para usar solo memoria.
+        capacidad_disco (int): Archivos que se conservan en la carpeta.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_RUTAS, ttl_seg=TTL_RUTAS_SEG, directorio=None,
+                 capacidad_disco=None):
+        self.capacidad = capacidad
+        self.ttl_seg = ttl_seg
+        self.directorio = directorio
+        self.capacidad_disco = capacidad_disco or capacidad * 4
+        self._entradas = collections.OrderedDict()
+        self._candado = threading.Lock()
+        self._escrituras = 0
+        self.contadores = {'aciertos': 0, 'aciertos_disco': 0, 'fallos': 0,
+                           'desalojos': 0, 'caducadas': 0, 'invalidaciones': 0}
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(origen_nodo, destino_nodo, perfil, version, alternativas=0):
+        # Con alternativas se agrega cuántas se pidieron; sin ellas la clave
+        # conserva su forma, para no perder las entradas que ya están en disco.
+        # Un punto a media calle, (arista, fracción), se guarda como 'arista@fracción'.
+        punto = lambda p: f'{int(p[0])}@{p[1]:.4f}' if isinstance(p, tuple) else int(p)
+        clave = (punto(origen_nodo), punto(destino_nodo), str(perfil), str(version))
+        return clave + (int(alternativas),) if alternativas else clave
+
+    def _archivo(self, clave):
+        resumen = hashlib.sha1(json.dumps(clave).encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, f'{resumen}.json')
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado para `clave` o None si no existe o caducó."""
+        ahora = time.time()
+        with self._candado:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                expira, valor = entrada
+                if expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.contadores['aciertos'] += 1
+                    return valor
+                del self._entradas[clave]
+                self.contadores['caducadas'] += 1
+
+        valor = self._leer_disco(clave, ahora)
+        with self._candado:
+            if valor is None:
+                self.contadores['fallos'] += 1
+                return None
+            self.contadores['aciertos_disco'] += 1
+            self._insertar(clave, valor, ahora)
+        return valor
+
+    def guardar(self, clave, valor):
+        """Guarda `valor` (serializable a JSON si hay carpeta) bajo `clave`."""
+        ahora = time.time()
+        with self._candado:
+            self._insertar(clave, valor, ahora)
+            self._escrituras += 1
+            limpiar_disco = self.directorio and self._escrituras % ESCRITURAS_ENTRE_LIMPIEZAS == 0
+        if self.directorio:
+            self._escribir_disco(clave, valor)
+            if limpiar_disco:
+                self._limpiar_disco()
+
+    def _insertar(self, clave, valor, ahora):
+        self._entradas[clave] = (ahora + self.ttl_seg, valor)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+            self.contadores['desalojos'] += 1
+
+    def _leer_disco(self, clave, ahora):
+        if not self.directorio:
+            return None
+        archivo = self._archivo(clave)
+        try:
+            if os.path.getmtime(archivo) + self.ttl_seg <= ahora:
+                os.remove(archivo)
+                return None
+            with open(archivo, encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # El nombre del archivo es un resumen; se confirma que la clave coincide.
+        return datos['valor'] if tuple(datos['clave']) == clave else None
+
+    def _escribir_disco(self, clave, valor):
+        archivo = self._archivo(clave)
+        temporal = f'{archivo}.tmp-{os.getpid()}-{threading.get_ident()}'
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'clave': list(clave), 'valor': valor}, f, ensure_ascii=False)
+            os.replace(temporal, archivo)
+        except OSError as e:
+            logger.warning("No se pudo escribir la caché de rutas en disco: %s", e)
+
+    def _limpiar_disco(self):
+        """Borra archivos caducados y los más antiguos que excedan `capacidad_disco`."""
+        try:
+            entradas = [e for e in os.scandir(self.directorio) if e.name.endswith('.json')]
+        except OSError:
+            return
+        entradas.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        limite = time.time() - self.ttl_seg
+        for posicion, entrada in enumerate(entradas):
+            if posicion >= self.capacidad_disco or entrada.stat().st_mtime < limite:
+                try:
+                    os.remove(entrada.path)
+                except OSError:
+                    pass
+
+    def invalidar(self, predicado=None):
+        """
+        Elimina las entradas para las que `predicado(clave, valor)` es verdadero
+        (todas si es None).
+
+        Se llama cuando cambian los pesos del grafo.
+
+        Returns:
+            int: Entradas eliminadas de memoria.
+        """
+        with self._candado:
+            claves = [c for c, (_, valor) in self._entradas.items() if predicado is None or predicado(c, valor)]
+            for clave in claves:
+                del self._entradas[clave]
+            self.contadores['invalidaciones'] += len(claves)
+        if self.directorio:
+            for entrada in os.scandir(self.directorio):
+                if not entrada.name.endswith('.json'):
+                    continue
+                try:
+                    if predicado is not None:
+                        with open(entrada.path, encoding='utf-8') as f:
+                            datos = json.load(f)
+                        if not predicado(tuple(datos['clave']), datos['valor']):
+                            continue
+                    os.remove(entrada.path)
+                except (OSError, ValueError):
+                    pass
+        return len(claves)
+
+    def estadisticas(self):
+        """Contadores de uso y ocupación, para dimensionar la caché."""
+        with self._candado:
+            consultas = self.contadores['aciertos'] + self.contadores['aciertos_disco'] + self.contadores['fallos']
+            aciertos = self.contadores['aciertos'] + self.contadores['aciertos_disco']
+            return dict(self.contadores, entradas=len(self._entradas), capacidad=self.capacidad,
+                        ttl_seg=self.ttl_seg, en_disco=bool(self.directorio),
+                        tasa_aciertos=round(aciertos / consultas, 4) if consultas else None)
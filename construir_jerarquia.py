@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+PREPROCESAMIENTO: JERARQUÍA DE CONTRACCIÓN
+Descripción:
+Construye la jerarquía de contracción del grafo que usa app.py y la guarda en
+datos/jerarquia_ch.npz. Al arrancar, el servidor la carga si existe y coincide
+con el grafo; en otro caso sigue usando Dijkstra.
+
+Con --personalizable se contrae sin búsquedas testigo: la jerarquía tiene más
+atajos, pero sirve para cualquier peso, y POST /trafico la re-personaliza en
+milisegundos en lugar de desactivarla hasta reconstruirla. Sus consultas, en
+cambio, no son más rápidas que Dijkstra, así que app.py solo usa por defecto
+la jerarquía fija (sin --personalizable); la personalizable queda disponible
+con `?algoritmo=ch`.
+
+Uso:
+    python construir_jerarquia.py [--limite-testigo 200] [--personalizable]
+"""
+
+import argparse
+import os
+import time
+
+import app
+from jerarquia_contraccion import LIMITE_TESTIGO, construir_jerarquia
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limite-testigo', type=int, default=LIMITE_TESTIGO,
+                        help='Máximo de nodos asentados en cada búsqueda testigo.')
+    parser.add_argument('--personalizable', action='store_true',
+                        help='Contraer sin búsquedas testigo (equivale a --limite-testigo 0).')
+    parser.add_argument('--salida', default=app.RUTA_JERARQUIA, help='Archivo .npz de destino.')
+    args = parser.parse_args()
+
+    print(f"Contrayendo {app.grafo_csr.num_nodos} nodos...")
+    inicio = time.perf_counter()
+    jerarquia = construir_jerarquia(
+        app.grafo_csr,
+        limite_testigo=0 if args.personalizable else args.limite_testigo,
+        progreso=lambda hechos, total: print(f"  {hechos}/{total} nodos contraídos"),
+    )
+    print(f"Jerarquía lista en {time.perf_counter() - inicio:.1f} s: "
+          f"{app.grafo_csr.num_aristas} aristas originales, {jerarquia.num_atajos} atajos.")
+
+    os.makedirs(os.path.dirname(args.salida) or '.', exist_ok=True)
+    jerarquia.guardar(args.salida)
+    print(f"Guardada en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+PREPROCESAMIENTO: RED VIAL POR REGIONES
+Descripción:
+Parte el grafo del snapshot actual en regiones, guarda un snapshot por región
+y calcula el grafo de superposición de los nodos frontera (ver regiones.py).
+Las regiones pueden ser una rejilla sobre la red (--rejilla 3x3) o un
+municipio por cada lugar de `red_vial.places` (--por-lugar, que geocodifica
+los polígonos con OSMnx). Los fragmentos llevan los pesos del perfil
+predeterminado; rutas_lote.py --regiones los usa en lugar del snapshot.
+
+Uso:
+    python construir_regiones.py --rejilla 3x3 [--salida datos/regiones]
+    python construir_regiones.py --por-lugar
+"""
+
+import argparse
+import time
+
+import red_vial
+from perfiles_velocidad import PERFIL_POR_DEFECTO
+from regiones import (DIRECTORIO_REGIONES, construir_superposicion, fragmentar, guardar_regiones,
+                      regiones_por_lugar, regiones_por_rejilla)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument('--rejilla', help='Columnas x filas de la rejilla, por ejemplo 3x3.')
+    grupo.add_argument('--por-lugar', action='store_true', help='Una región por cada lugar de red_vial.places.')
+    parser.add_argument('--salida', default=DIRECTORIO_REGIONES, help='Carpeta de destino.')
+    args = parser.parse_args()
+
+    grafo = red_vial.cargar_red()
+    if args.por_lugar:
+        region_nodo, nombres = regiones_por_lugar(grafo, red_vial.places)
+    else:
+        columnas, filas = (int(n) for n in args.rejilla.lower().split('x'))
+        region_nodo, nombres = regiones_por_rejilla(grafo, columnas, filas)
+
+    inicio = time.perf_counter()
+    fragmentos = fragmentar(grafo, region_nodo)
+    print(f"{len(fragmentos)} regiones a partir de {grafo.num_nodos} nodos ({time.perf_counter() - inicio:.1f} s).")
+    inicio = time.perf_counter()
+    superposicion = construir_superposicion(
+        fragmentos, progreso=lambda hechas, total: print(f"  superposición: {hechas}/{total} regiones"))
+    print(f"Superposición lista en {time.perf_counter() - inicio:.1f} s: {len(superposicion['ids_frontera'])} "
+          f"nodos frontera, {len(superposicion['destinos'])} aristas.")
+
+    guardar_regiones(args.salida, fragmentos, nombres, superposicion,
+                     meta={'snapshot': red_vial.clave_snapshot(), 'huella': grafo.huella(),
+                           'perfil': PERFIL_POR_DEFECTO})
+    for region, fragmento in fragmentos.items():
+        print(f"  {nombres[region]}: {fragmento.num_nodos} nodos, {fragmento.num_aristas} aristas")
+    print(f"Regiones guardadas en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+PREPROCESAMIENTO: SNAPSHOT DEL GRAFO
+Descripción:
+Descarga la red vial, calcula los tiempos de viaje y guarda el resultado en
+datos/snapshots/<clave>. app.py lo mapea en memoria al arrancar, sin volver a
+llamar a `ox.graph_from_place`. Conviene ejecutarlo antes de levantar varios
+procesos del servidor para que ninguno tenga que construirlo.
+
+Uso:
+    python construir_snapshot.py [--forzar]
+"""
+
+import argparse
+import os
+import shutil
+import time
+
+import red_vial
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forzar', action='store_true', help='Reconstruye aunque ya exista el snapshot.')
+    args = parser.parse_args()
+
+    ruta = os.path.join(red_vial.DIRECTORIO_SNAPSHOTS, red_vial.clave_snapshot())
+    if os.path.isdir(ruta):
+        if not args.forzar:
+            print(f"El snapshot {ruta} ya existe (use --forzar para reconstruirlo).")
+            return
+        shutil.rmtree(ruta)
+
+    inicio = time.perf_counter()
+    ruta, _ = red_vial.construir_snapshot()
+    print(f"Snapshot escrito en {ruta} en {time.perf_counter() - inicio:.1f} s.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+# ==============================================================================
+# REPRESENTACIÓN COMPACTA (CSR) DE LA RED VIAL
+# ==============================================================================
+# El grafo de OSMnx/NetworkX guarda cada calle dentro de varios diccionarios
+# anidados, lo que hace muy lento recorrerlo miles de veces por consulta.
+# Aquí se "aplana" una sola vez, al arrancar, en arreglos contiguos de NumPy
+# con el formato CSR (Compressed Sparse Row): los vecinos del nodo `i` son
+# `destinos[offsets[i]:offsets[i + 1]]` y el peso de cada arista está en la
+# misma posición de `pesos`.
+
+import copy
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from motor_rutas import RADIO_TIERRA_M
+from perfiles_velocidad import codificar_clases, parsear_maxspeed
+
+NOMBRE_CALLE_DEFECTO = 'Calle sin nombre'
+
+# Arreglos que se escriben en disco, uno por archivo .npy para poder
+# mapearlos en memoria al cargarlos.
+ARREGLOS = ('ids_nodos', 'x', 'y', 'offsets', 'origenes', 'destinos', 'pesos',
+            'longitudes', 'nombres_id', 'geometria_offsets', 'geometria_x', 'geometria_y',
+            'offsets_inv', 'aristas_inv', 'maxspeed_kmh', 'clase_via_id', 'rumbos')
+
+
+def normalizar_nombre_calle(nombre):
+    """
+    Convierte el atributo 'name' de OSM en un único texto.
+
+    OSM puede devolver una lista de nombres o no traer el dato; en esos casos
+    se toma el primero o el nombre por defecto.
+    """
+    if isinstance(nombre, list):
+        nombre = nombre[0] if nombre else None
+    return nombre if nombre else NOMBRE_CALLE_DEFECTO
+
+
+def calcular_rumbos(lat1, lon1, lat2, lon2):
+    """Versión vectorizada de `motor_rutas.calcular_rumbo` (grados 0-360, 0 = norte)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    y = np.sin(dlambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def distancias_haversine(lat1, lon1, lat2, lon2):
+    """Versión vectorizada de `motor_rutas.distancia_haversine` (metros)."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def fracciones_recorridas(cantidad, extremos=None):
+    """
+    Fracción que una ruta recorre de cada una de sus aristas.
+
+    Args:
+        cantidad (int): Número de aristas de la ruta.
+        extremos (tuple): (fracción de la primera arista en la que empieza la
+            ruta, fracción de la última en la que termina), como los devuelve
+            `MotorDijkstra.ruta_entre_puntos`; None si va de nodo a nodo.
+
+    Returns:
+        np.ndarray: Un valor en [0, 1] por arista (unos si `extremos` es None).
+    """
+    fracciones = np.ones(cantidad)
+    if extremos is not None and cantidad:
+        inicio, fin = extremos
+        if cantidad == 1:
+            fracciones[0] = fin - inicio
+        else:
+            fracciones[0] = 1.0 - inicio
+            fracciones[-1] = fin
+    return fracciones
+
+
+class GrafoCSR:
+    """
+    Grafo dirigido de solo lectura respaldado por arreglos de NumPy.
+
+    Los nodos se renumeran de forma densa (0..n-1); `ids_nodos` guarda el ID
+    original de OSM de cada índice e `indice` hace la traducción inversa.
+
+    Atributos:
+        ids_nodos (np.ndarray): ID de OSM de cada nodo (int64, n).
+        x, y (np.ndarray): Longitud y latitud de cada nodo (float64, n).
+        offsets (np.ndarray): Inicio de las aristas de cada nodo (int64, n + 1).
+        origenes (np.ndarray): Nodo de salida de cada arista (int64, m).
+        destinos (np.ndarray): Nodo de llegada de cada arista (int64, m).
+        pesos (np.ndarray): 'tiempo_viaje_seg' de cada arista (float64, m).
+        longitudes (np.ndarray): 'length' en metros de cada arista (float64, m).
+        nombres_id (np.ndarray): Índice en `nombres` de la calle (int32, m).
+        nombres (list): Nombres de calle distintos.
+        geometria_offsets (np.ndarray): Inicio de los puntos de cada arista (int64, m + 1).
+        geometria_x, geometria_y (np.ndarray): Puntos del trazo de las aristas, extremos
+            incluidos (float64). Las calles sin 'geometry' en OSM son una recta.
+        offsets_inv (np.ndarray): Inicio de las aristas que llegan a cada nodo (int64, n + 1).
+        aristas_inv (np.ndarray): Índices de arista ordenados por nodo de llegada (int64, m).
+            Es la adyacencia inversa que usan las búsquedas hacia atrás.
+        maxspeed_kmh (np.ndarray): 'maxspeed' de OSM en km/h, NaN si no lo tiene (float64, m).
+        clase_via_id (np.ndarray): Índice en `clases_via` del 'highway' de OSM (int16, m).
+        clases_via (list): Valores distintos de 'highway' ('' = sin dato).
+        rumbos (np.ndarray): Rumbo de `u` a `v` de cada arista, en grados (float64, m).
+    """
+
+    def __init__(self, ids_nodos, x, y, offsets, destinos, pesos, longitudes,
+                 nombres_id, nombres, geometria_offsets, geometria_x, geometria_y,
+                 origenes=None, offsets_inv=None, aristas_inv=None,
+                 maxspeed_kmh=None, clase_via_id=None, clases_via=None, rumbos=None):
+        self.ids_nodos = ids_nodos
+        self.x = x
+        self.y = y
+        self.offsets = offsets
+        self.destinos = destinos
+        self.pesos = pesos
+        self.longitudes = longitudes
+        self.nombres_id = nombres_id
+        self.nombres = nombres
+        self.geometria_offsets = geometria_offsets
+        self.geometria_x = geometria_x
+        self.geometria_y = geometria_y
+        self.indice = {nodo: i for i, nodo in enumerate(ids_nodos.tolist())}
+
+        # Los arreglos derivados se calculan aquí salvo que vengan de un archivo.
+        n = len(ids_nodos)
+        if origenes is None:
+            origenes = np.repeat(np.arange(n, dtype=np.int64), np.diff(offsets))
+        self.origenes = origenes
+        # Adyacencia inversa: se guardan índices de arista (no copias de los pesos)
+        # para que ambas direcciones lean siempre el mismo arreglo `pesos`.
+        if aristas_inv is None:
+            aristas_inv = np.argsort(destinos, kind='stable').astype(np.int64)
+            offsets_inv = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(destinos, minlength=n), out=offsets_inv[1:])
+        self.aristas_inv = aristas_inv
+        self.offsets_inv = offsets_inv
+        # Rumbo de cada arista para las indicaciones de giro (ver indicaciones.py).
+        if rumbos is None:
+            rumbos = calcular_rumbos(y[origenes], x[origenes], y[destinos], x[destinos])
+        self.rumbos = rumbos
+
+        # Atributos de OSM con los que se calculan los pesos de cada perfil de velocidad.
+        m = len(destinos)
+        self.maxspeed_kmh = maxspeed_kmh if maxspeed_kmh is not None else np.full(m, np.nan)
+        self.clase_via_id = clase_via_id if clase_via_id is not None else np.zeros(m, dtype=np.int16)
+        self.clases_via = clases_via if clases_via is not None else ['']
+
+    @property
+    def num_nodos(self):
+        return len(self.ids_nodos)
+
+    @property
+    def num_aristas(self):
+        return len(self.destinos)
+
+    def con_pesos(self, pesos):
+        """
+        Copia ligera del grafo con otro arreglo de pesos.
+
+        Todos los demás arreglos (y el diccionario `indice`) se comparten; así
+        cada perfil de velocidad cuesta solo su arreglo de pesos.
+        """
+        grafo = copy.copy(self)
+        grafo.pesos = pesos
+        return grafo
+
+    def subgrafo(self, aristas):
+        """
+        Grafo con solo las aristas indicadas y los nodos en sus extremos.
+
+        Conserva los atributos de cada arista (trazo, nombre, velocidad, clase
+        de vía); los nodos se renumeran en el mismo orden relativo.
+
+        Args:
+            aristas (array-like): Índices de arista de este grafo.
+
+        Returns:
+            GrafoCSR: El subgrafo (con arreglos propios, no vistas).
+        """
+        aristas = np.unique(np.asarray(aristas, dtype=np.int64))
+        origenes, destinos = np.asarray(self.origenes)[aristas], np.asarray(self.destinos)[aristas]
+        nodos = np.unique(np.concatenate((origenes, destinos)))
+        nuevo_indice = np.full(self.num_nodos, -1, dtype=np.int64)
+        nuevo_indice[nodos] = np.arange(len(nodos))
+        # Las aristas ya van ordenadas por nodo de salida, y la renumeración lo respeta.
+        offsets = np.zeros(len(nodos) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nuevo_indice[origenes], minlength=len(nodos)), out=offsets[1:])
+
+        geometria_offsets = np.asarray(self.geometria_offsets)
+        puntos_por_arista = geometria_offsets[aristas + 1] - geometria_offsets[aristas]
+        saltos = np.repeat(np.cumsum(puntos_por_arista) - puntos_por_arista, puntos_por_arista)
+        puntos = np.repeat(geometria_offsets[aristas], puntos_por_arista) + np.arange(puntos_por_arista.sum()) - saltos
+        return GrafoCSR(
+            ids_nodos=np.asarray(self.ids_nodos)[nodos],
+            x=np.asarray(self.x)[nodos],
+            y=np.asarray(self.y)[nodos],
+            offsets=offsets,
+            destinos=nuevo_indice[destinos],
+            pesos=np.asarray(self.pesos)[aristas],
+            longitudes=np.asarray(self.longitudes)[aristas],
+            nombres_id=np.asarray(self.nombres_id)[aristas],
+            nombres=self.nombres,
+            geometria_offsets=np.concatenate(([0], np.cumsum(puntos_por_arista))).astype(np.int64),
+            geometria_x=np.asarray(self.geometria_x)[puntos],
+            geometria_y=np.asarray(self.geometria_y)[puntos],
+            maxspeed_kmh=np.asarray(self.maxspeed_kmh)[aristas],
+            clase_via_id=np.asarray(self.clase_via_id)[aristas],
+            clases_via=self.clases_via,
+        )
+
+    def aristas_de_ruta(self, nodos):
+        """
+        Índices de las aristas que recorre una ruta.
+
+        Args:
+            nodos (list): Índices de nodo consecutivos de la ruta.
+
+        Returns:
+            list: Para cada par (u, v) de la ruta, el índice de la arista u -> v;
+                  entre aristas paralelas, la de menor peso (la primera si empatan).
+        """
+        offsets, destinos, pesos = memoryview(self.offsets), memoryview(self.destinos), memoryview(self.pesos)
+        aristas = []
+        for u, v in zip(nodos[:-1], nodos[1:]):
+            elegida = -1
+            for arista in range(offsets[u], offsets[u + 1]):
+                if destinos[arista] == v and (elegida < 0 or pesos[arista] < pesos[elegida]):
+                    elegida = arista
+            if elegida < 0:
+                raise KeyError((u, v))
+            aristas.append(elegida)
+        return aristas
+
+    def gemela(self, arista):
+        """
+        Arista que recorre la misma calle en sentido contrario.
+
+        Returns:
+            int: Índice de la arista v -> u de la misma longitud (con un margen
+                 por redondeo) que la arista u -> v, o -1 si la calle es de un
+                 solo sentido.
+        """
+        u, v = int(self.origenes[arista]), int(self.destinos[arista])
+        longitud = float(self.longitudes[arista])
+        for candidata in range(int(self.offsets[v]), int(self.offsets[v + 1])):
+            if self.destinos[candidata] == u and abs(self.longitudes[candidata] - longitud) <= max(1.0, 0.02 * longitud):
+                return candidata
+        return -1
+
+    def trazo_arista(self, arista, desde=0.0, hasta=1.0):
+        """
+        Coordenadas (x, y) de los puntos que dibujan la arista.
+
+        Con `desde`/`hasta` se devuelve solo el tramo entre esas fracciones de
+        su longitud (por ejemplo, desde un punto ajustado a la calle).
+        """
+        inicio, fin = self.geometria_offsets[arista], self.geometria_offsets[arista + 1]
+        x, y = self.geometria_x[inicio:fin], self.geometria_y[inicio:fin]
+        if desde <= 0.0 and hasta >= 1.0:
+            return x, y
+        # Longitud acumulada en una proyección local, como la del índice espacial.
+        escala_x = np.cos(np.radians(np.mean(y)))
+        acumulado = np.r_[0.0, np.cumsum(np.hypot(np.diff(x) * escala_x, np.diff(y)))]
+        if acumulado[-1] <= 0:
+            return x[:1], y[:1]
+        cortes = np.array([desde, hasta]) * acumulado[-1]
+        interiores = (acumulado > cortes[0]) & (acumulado < cortes[1])
+        return (np.r_[np.interp(cortes[0], acumulado, x), x[interiores], np.interp(cortes[1], acumulado, x)],
+                np.r_[np.interp(cortes[0], acumulado, y), y[interiores], np.interp(cortes[1], acumulado, y)])
+
+    def huella(self):
+        """
+        Resumen SHA-1 de la topología y los pesos del grafo.
+
+        Permite comprobar que un archivo derivado (por ejemplo, una jerarquía
+        de contracción) se calculó sobre exactamente este mismo grafo.
+        """
+        resumen = hashlib.sha1()
+        for arreglo in (self.ids_nodos, self.offsets, self.destinos, self.pesos):
+            resumen.update(np.ascontiguousarray(arreglo).tobytes())
+        return resumen.hexdigest()
+
+    def velocidad_maxima_ms(self):
+        """
+        Velocidad más alta (m/s) implícita en los pesos del grafo.
+
+        Se obtiene de `longitudes / pesos` y no del atributo 'maxspeed', de modo
+        que también cubre la velocidad estándar usada en calles sin ese dato.
+        Si una arista mide menos que la distancia en línea recta entre sus
+        nodos (datos de OSM inconsistentes), se usa la distancia en línea
+        recta, para que la heurística de A* siga sin sobreestimar.
+        """
+        validas = (self.pesos > 0) & np.isfinite(self.pesos)
+        if not validas.any():
+            return 0.0
+        u, v = self.origenes[validas], self.destinos[validas]
+        recta = distancias_haversine(self.y[u], self.x[u], self.y[v], self.x[v])
+        return float(np.max(np.maximum(self.longitudes[validas], recta) / self.pesos[validas]))
+
+    def guardar(self, directorio):
+        """
+        Escribe el grafo en `directorio`: un .npy por arreglo y los nombres en JSON.
+
+        Args:
+            directorio (str): Carpeta de destino; se crea si no existe.
+        """
+        os.makedirs(directorio, exist_ok=True)
+        for nombre in ARREGLOS:
+            np.save(os.path.join(directorio, f'{nombre}.npy'), np.ascontiguousarray(getattr(self, nombre)))
+        with open(os.path.join(directorio, 'nombres.json'), 'w', encoding='utf-8') as archivo:
+            json.dump(self.nombres, archivo, ensure_ascii=False)
+        with open(os.path.join(directorio, 'clases_via.json'), 'w', encoding='utf-8') as archivo:
+            json.dump(self.clases_via, archivo, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, directorio, mmap=True):
+        """
+        Lee un grafo escrito con `guardar`.
+
+        Args:
+            directorio (str): Carpeta con los archivos .npy.
+            mmap (bool): Si es True, los arreglos se mapean en memoria (solo
+                lectura) en lugar de copiarse, así que cargar es casi instantáneo
+                y las páginas se comparten entre procesos.
+
+        Returns:
+            GrafoCSR: El grafo compacto.
+        """
+        arreglos = {nombre: np.load(os.path.join(directorio, f'{nombre}.npy'), mmap_mode='r' if mmap else None)
+                    for nombre in ARREGLOS}
+        with open(os.path.join(directorio, 'nombres.json'), encoding='utf-8') as archivo:
+            nombres = json.load(archivo)
+        with open(os.path.join(directorio, 'clases_via.json'), encoding='utf-8') as archivo:
+            clases_via = json.load(archivo)
+        return cls(nombres=nombres, clases_via=clases_via, **arreglos)
+
+    @classmethod
+    def desde_networkx(cls, graph, peso='tiempo_viaje_seg'):
+        """
+        Construye el grafo compacto a partir de un MultiDiGraph de OSMnx.
+
+        Se conservan todas las aristas paralelas u -> v (mismo par de nodos,
+        distinta clave), cada una con su longitud, 'maxspeed' y tipo de vía:
+        la más rápida puede ser otra en cada perfil de velocidad. Los motores
+        relajan todas, así que cada búsqueda usa la de menor peso del perfil.
+
+        Args:
+            graph (networkx.MultiDiGraph): Grafo con el atributo de peso ya calculado.
+            peso (str): Nombre del atributo de la arista que se usará como costo.
+
+        Returns:
+            GrafoCSR: La representación compacta del grafo.
+        """
+        ids = list(graph.nodes)
+        indice = {nodo: i for i, nodo in enumerate(ids)}
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        destinos, pesos, longitudes, nombres_id = [], [], [], []
+        maxspeed, highway = [], []
+        nombres, nombre_a_id = [], {}
+        geometria_offsets, geometria_x, geometria_y = [0], [], []
+
+        for i, u in enumerate(ids):
+            for _, v, datos in graph.edges(u, data=True):
+                nombre = normalizar_nombre_calle(datos.get('name'))
+                if nombre not in nombre_a_id:
+                    nombre_a_id[nombre] = len(nombres)
+                    nombres.append(nombre)
+
+                destinos.append(indice[v])
+                pesos.append(datos.get(peso, np.inf))
+                longitudes.append(datos.get('length', 0.0))
+                nombres_id.append(nombre_a_id[nombre])
+                maxspeed.append(datos.get('maxspeed'))
+                highway.append(datos.get('highway'))
+
+                geometria = datos.get('geometry')
+                if geometria is not None:
+                    puntos = list(geometria.coords)
+                else:
+                    puntos = [(graph.nodes[u]['x'], graph.nodes[u]['y']), (graph.nodes[v]['x'], graph.nodes[v]['y'])]
+                geometria_x.extend(p[0] for p in puntos)
+                geometria_y.extend(p[1] for p in puntos)
+                geometria_offsets.append(len(geometria_x))
+            offsets[i + 1] = len(destinos)
+
+        clase_via_id, clases_via = codificar_clases(highway)
+        return cls(
+            ids_nodos=np.array(ids, dtype=np.int64),
+            x=np.array([graph.nodes[n]['x'] for n in ids], dtype=np.float64),
+            y=np.array([graph.nodes[n]['y'] for n in ids], dtype=np.float64),
+            offsets=offsets,
+            destinos=np.array(destinos, dtype=np.int64),
+            pesos=np.array(pesos, dtype=np.float64),
+            longitudes=np.array(longitudes, dtype=np.float64),
+            nombres_id=np.array(nombres_id, dtype=np.int32),
+            nombres=nombres,
+            geometria_offsets=np.array(geometria_offsets, dtype=np.int64),
+            geometria_x=np.array(geometria_x, dtype=np.float64),
+            geometria_y=np.array(geometria_y, dtype=np.float64),
+            maxspeed_kmh=parsear_maxspeed(maxspeed),
+            clase_via_id=clase_via_id,
+            clases_via=clases_via,
+        )
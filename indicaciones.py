@@ -0,0 +1,81 @@
+# ==============================================================================
+# INDICACIONES PASO A PASO
+# ==============================================================================
+# Una ruta larga recorre cientos de aristas, pero casi todas siguen por la
+# misma calle. En lugar de una indicación por arista ("Sigue derecho" una y
+# otra vez), las aristas consecutivas de una misma calle se juntan en una sola
+# maniobra. Los rumbos y los nombres de calle ya están precalculados en los
+# arreglos del grafo compacto, así que todo se resuelve con NumPy sobre los
+# índices de arista de la ruta, sin recorrer el grafo de NetworkX.
+
+import numpy as np
+
+# Diferencia de rumbo (grados) hasta la que se considera que se sigue derecho,
+# y desde la que se considera una vuelta en U.
+UMBRAL_RECTO_GRADOS = 25
+UMBRAL_VUELTA_U_GRADOS = 160
+
+
+def obtener_direccion_giro(prev_bearing, next_bearing):
+    """
+    Calcula la dirección del giro (izquierda, derecha, etc.) basándose en dos ángulos.
+    """
+    # Calcula la diferencia de ángulo y la normaliza entre -180 y 180
+    diff = next_bearing - prev_bearing
+    angle = (diff + 180) % 360 - 180
+
+    if abs(angle) >= UMBRAL_VUELTA_U_GRADOS:
+        return "Da vuelta en U"
+    elif -UMBRAL_RECTO_GRADOS <= angle <= UMBRAL_RECTO_GRADOS:
+        return "Sigue derecho"
+    elif angle > UMBRAL_RECTO_GRADOS:
+        return "Gira a la derecha"
+    return "Gira a la izquierda"
+
+
+def generar_indicaciones(grafo, aristas, fracciones=None):
+    """
+    Indicaciones de una ruta, con una maniobra por tramo de la misma calle.
+
+    Se empieza una maniobra nueva cuando cambia el nombre de la calle o
+    cuando hay una vuelta en U aunque se siga en la misma calle.
+
+    Args:
+        grafo (GrafoCSR): Grafo con los pesos del perfil de la ruta.
+        aristas (list): Índices de arista de la ruta, en orden.
+        fracciones (array-like): Fracción recorrida de cada arista (ver
+            `grafo_compacto.fracciones_recorridas`); por defecto, todas completas.
+
+    Returns:
+        list: Diccionarios con 'direccion', 'calle', 'distancia', 'velocidad'
+              y 'tiempo' (textos listos para mostrar) por maniobra.
+    """
+    if not aristas:
+        return []
+    aristas = np.asarray(aristas, dtype=np.int64)
+    rumbos = np.asarray(grafo.rumbos, dtype=np.float64)[aristas]
+    nombres_id = np.asarray(grafo.nombres_id)[aristas]
+
+    angulos = (np.diff(rumbos) + 180) % 360 - 180
+    cortes = np.flatnonzero((nombres_id[1:] != nombres_id[:-1]) | (np.abs(angulos) >= UMBRAL_VUELTA_U_GRADOS)) + 1
+    inicios = np.r_[0, cortes]
+    longitudes, pesos = np.asarray(grafo.longitudes)[aristas], np.asarray(grafo.pesos)[aristas]
+    if fracciones is not None:
+        longitudes, pesos = longitudes * fracciones, pesos * fracciones
+    distancias = np.add.reduceat(longitudes, inicios)
+    tiempos = np.add.reduceat(pesos, inicios)
+
+    segmentos = []
+    for inicio, distancia_m, tiempo_seg in zip(inicios.tolist(), distancias.tolist(), tiempos.tolist()):
+        velocidad_kmh = (distancia_m / tiempo_seg) * 3.6 if tiempo_seg > 0 else 0
+        direccion = "Inicia el recorrido"
+        if inicio > 0:
+            direccion = obtener_direccion_giro(rumbos[inicio - 1], rumbos[inicio])
+        segmentos.append({
+            "direccion": direccion,
+            "calle": grafo.nombres[nombres_id[inicio]],
+            "distancia": f"{distancia_m:.0f} m",
+            "velocidad": f"{velocidad_kmh:.1f} km/h",
+            "tiempo": f"{tiempo_seg:.1f} s"
+        })
+    return segmentos
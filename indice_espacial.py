@@ -0,0 +1,311 @@
+# ==============================================================================
+# ÍNDICE ESPACIAL PARA AJUSTAR COORDENADAS A LA RED
+# ==============================================================================
+# Cada ruta empieza por "ajustar" (snap) las coordenadas del usuario al nodo o
+# a la calle más cercana. En lugar de pedírselo a OSMnx en cada petición, se
+# construye una sola vez una rejilla uniforme en metros sobre los nodos y los
+# tramos de calle. Una consulta solo revisa las celdas vecinas, anillo por
+# anillo, hasta que ningún elemento fuera de ellas pueda estar más cerca; y
+# todas las consultas de un lote avanzan juntas con operaciones de NumPy.
+
+import numpy as np
+
+from motor_rutas import RADIO_TIERRA_M
+
+TAMANO_CELDA_M = 150.0
+# Más allá de esta distancia a la red se considera que el punto está fuera del mapa.
+DISTANCIA_MAXIMA_AJUSTE_M = 1000.0
+
+
+class PuntoFueraDeArea(ValueError):
+    """Uno o más puntos están fuera del área de operación o demasiado lejos de la red."""
+
+    def __init__(self, posiciones, mensaje):
+        super().__init__(mensaje)
+        self.posiciones = posiciones
+
+
+def casco_convexo(x, y):
+    """
+    Envolvente convexa (algoritmo de cadena monótona) de un conjunto de puntos.
+
+    Returns:
+        np.ndarray: Índices de los vértices en sentido antihorario.
+    """
+    orden = np.lexsort((y, x))
+
+    def media_cadena(indices):
+        cadena = []
+        for i in indices:
+            while len(cadena) >= 2:
+                a, b = cadena[-2], cadena[-1]
+                if (x[b] - x[a]) * (y[i] - y[a]) - (y[b] - y[a]) * (x[i] - x[a]) > 0:
+                    break
+                cadena.pop()
+            cadena.append(i)
+        return cadena
+
+    inferior = media_cadena(orden.tolist())
+    superior = media_cadena(orden[::-1].tolist())
+    return np.array(inferior[:-1] + superior[:-1], dtype=np.int64)
+
+
+class _Rejilla:
+    """
+    Rejilla uniforme sobre elementos con caja envolvente (puntos o segmentos).
+
+    Cada elemento se registra en todas las celdas que toca su caja, de modo
+    que tras revisar los anillos 0..k alrededor de un punto, cualquier elemento
+    no visto está a más de k * tamaño de celda.
+    """
+
+    def __init__(self, xmin, xmax, ymin, ymax, tamano):
+        self.tamano = tamano
+        self.x0, self.y0 = float(xmin.min()), float(ymin.min())
+        self.nx = int((xmax.max() - self.x0) // tamano) + 1
+        self.ny = int((ymax.max() - self.y0) // tamano) + 1
+
+        cx0, cx1 = self._celda_x(xmin), self._celda_x(xmax)
+        cy0, cy1 = self._celda_y(ymin), self._celda_y(ymax)
+        ancho = cx1 - cx0 + 1
+        cantidad = ancho * (cy1 - cy0 + 1)
+        elementos = np.repeat(np.arange(len(xmin), dtype=np.int64), cantidad)
+        local = np.arange(cantidad.sum()) - np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+        celdas = ((np.repeat(cy0, cantidad) + local // np.repeat(ancho, cantidad)) * self.nx
+                  + np.repeat(cx0, cantidad) + local % np.repeat(ancho, cantidad))
+
+        orden = np.argsort(celdas, kind='stable')
+        self.elementos = elementos[orden]
+        self.offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(celdas, minlength=self.nx * self.ny), out=self.offsets[1:])
+
+    def _celda_x(self, x):
+        return np.clip(((x - self.x0) // self.tamano).astype(np.int64), 0, self.nx - 1)
+
+    def _celda_y(self, y):
+        return np.clip(((y - self.y0) // self.tamano).astype(np.int64), 0, self.ny - 1)
+
+    def anillo(self, cx, cy, k):
+        """
+        Pares (consulta, elemento) de las celdas del anillo `k` alrededor de cada consulta.
+
+        Args:
+            cx, cy (np.ndarray): Celda de cada consulta.
+            k (int): Distancia de Chebyshev (en celdas) del anillo.
+        """
+        if k == 0:
+            desplazamientos = [(0, 0)]
+        else:
+            lado = range(-k, k + 1)
+            desplazamientos = ([(dx, -k) for dx in lado] + [(dx, k) for dx in lado]
+                               + [(-k, dy) for dy in lado[1:-1]] + [(k, dy) for dy in lado[1:-1]])
+        consultas_total, elementos_total = [], []
+        for dx, dy in desplazamientos:
+            x, y = cx + dx, cy + dy
+            validas = np.flatnonzero((x >= 0) & (x < self.nx) & (y >= 0) & (y < self.ny))
+            if not validas.size:
+                continue
+            celda = y[validas] * self.nx + x[validas]
+            inicio = self.offsets[celda]
+            cantidad = self.offsets[celda + 1] - inicio
+            if not cantidad.any():
+                continue
+            local = np.arange(cantidad.sum()) - np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+            consultas_total.append(np.repeat(validas, cantidad))
+            elementos_total.append(self.elementos[np.repeat(inicio, cantidad) + local])
+        if not consultas_total:
+            vacio = np.zeros(0, dtype=np.int64)
+            return vacio, vacio
+        return np.concatenate(consultas_total), np.concatenate(elementos_total)
+
+    def mas_cercanos(self, qx, qy, distancias):
+        """
+        Elemento más cercano a cada consulta.
+
+        Args:
+            qx, qy (np.ndarray): Coordenadas proyectadas de las consultas.
+            distancias (callable): f(consultas, elementos) -> distancias en metros.
+
+        Returns:
+            tuple: (elemento, distancia) por consulta; -1 / inf si la rejilla está vacía.
+        """
+        mejor = np.full(len(qx), -1, dtype=np.int64)
+        mejor_distancia = np.full(len(qx), np.inf)
+        cx, cy = self._celda_x(qx), self._celda_y(qy)
+        pendientes = np.arange(len(qx))
+        k = 0
+        while pendientes.size and k <= max(self.nx, self.ny):
+            consultas, elementos = self.anillo(cx[pendientes], cy[pendientes], k)
+            if consultas.size:
+                consultas = pendientes[consultas]
+                d = distancias(consultas, elementos)
+                orden = np.lexsort((d, consultas))
+                primeras = orden[np.unique(consultas[orden], return_index=True)[1]]
+                mejora = d[primeras] < mejor_distancia[consultas[primeras]]
+                mejor[consultas[primeras[mejora]]] = elementos[primeras[mejora]]
+                mejor_distancia[consultas[primeras[mejora]]] = d[primeras[mejora]]
+            pendientes = pendientes[mejor_distancia[pendientes] > k * self.tamano]
+            k += 1
+        return mejor, mejor_distancia
+
+
+class IndiceEspacial:
+    """
+    Índice para ajustar coordenadas a nodos o calles de un `GrafoCSR`.
+
+    Trabaja en una proyección equirectangular local (metros), suficiente para
+    el tamaño de una zona metropolitana.
+    """
+
+    def __init__(self, grafo, tamano_celda_m=TAMANO_CELDA_M):
+        self.grafo = grafo
+        self.lat0 = float(np.mean(grafo.y))
+        self._escala_x = np.radians(1) * RADIO_TIERRA_M * np.cos(np.radians(self.lat0))
+        self._escala_y = np.radians(1) * RADIO_TIERRA_M
+
+        # Nodos.
+        self._nx, self._ny = self.proyectar(grafo.y, grafo.x)
+        self._rejilla_nodos = _Rejilla(self._nx, self._nx, self._ny, self._ny, tamano_celda_m)
+
+        # Tramos rectos del trazo de cada calle: todos los pares de puntos
+        # consecutivos salvo los que cruzan de una arista a la siguiente.
+        gx, gy = self.proyectar(grafo.geometria_y, grafo.geometria_x)
+        offsets = np.asarray(grafo.geometria_offsets)
+        puntos_por_arista = np.diff(offsets)
+        es_final = np.zeros(len(gx), dtype=bool)
+        es_final[offsets[1:] - 1] = True
+        inicio = np.flatnonzero(~es_final)
+        self._ax, self._ay = gx[inicio], gy[inicio]
+        self._bx, self._by = gx[inicio + 1], gy[inicio + 1]
+        self._arista_tramo = np.repeat(np.arange(grafo.num_aristas, dtype=np.int64), puntos_por_arista - 1)
+        # Metros recorridos sobre la arista al inicio de cada tramo, y largo total de la arista.
+        largo = np.hypot(self._bx - self._ax, self._by - self._ay)
+        acumulado = np.cumsum(largo) - largo
+        primero = np.repeat(offsets[:-1] - np.arange(grafo.num_aristas), puntos_por_arista - 1)
+        self._metros_previos = acumulado - acumulado[primero] if len(acumulado) else acumulado
+        self._largo_arista = np.bincount(self._arista_tramo, weights=largo, minlength=grafo.num_aristas)
+        self._rejilla_tramos = _Rejilla(np.minimum(self._ax, self._bx), np.maximum(self._ax, self._bx),
+                                        np.minimum(self._ay, self._by), np.maximum(self._ay, self._by),
+                                        tamano_celda_m)
+
+        # Envolvente convexa: el área de operación que se dibuja en la página principal.
+        vertices = casco_convexo(self._nx, self._ny)
+        self._casco_x, self._casco_y = self._nx[vertices], self._ny[vertices]
+        self.casco = list(zip(np.asarray(grafo.x)[vertices].tolist(), np.asarray(grafo.y)[vertices].tolist()))
+
+    def proyectar(self, lats, lons):
+        """Convierte grados a metros (x, y) en la proyección local del índice."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return lons * self._escala_x, (lats - self.lat0) * self._escala_y
+
+    def dentro_del_area(self, lats, lons):
+        """Arreglo booleano: True para los puntos dentro de la envolvente convexa de la red."""
+        px, py = self.proyectar(np.atleast_1d(lats), np.atleast_1d(lons))
+        ax, ay = self._casco_x, self._casco_y
+        bx, by = np.roll(ax, -1), np.roll(ay, -1)
+        cruz = (bx - ax) * (py[:, None] - ay) - (by - ay) * (px[:, None] - ax)
+        return np.all(cruz >= -1e-9, axis=1)
+
+    def nodos_mas_cercanos(self, lats, lons):
+        """
+        Nodo más cercano a cada punto de un lote.
+
+        Args:
+            lats, lons (array-like): Coordenadas de los puntos en grados.
+
+        Returns:
+            tuple: (índices de nodo, distancias en metros), ambos np.ndarray.
+        """
+        qx, qy = self.proyectar(np.atleast_1d(lats), np.atleast_1d(lons))
+        return self._rejilla_nodos.mas_cercanos(
+            qx, qy, lambda c, e: np.hypot(self._nx[e] - qx[c], self._ny[e] - qy[c]))
+
+    def aristas_mas_cercanas(self, lats, lons):
+        """
+        Proyecta cada punto de un lote sobre la calle más cercana.
+
+        Returns:
+            tuple: (índices de arista, fracción recorrida de la arista en [0, 1],
+                    distancias en metros, latitudes y longitudes del punto proyectado).
+        """
+        qx, qy = self.proyectar(np.atleast_1d(lats), np.atleast_1d(lons))
+
+        def proyeccion(c, e):
+            dx, dy = self._bx[e] - self._ax[e], self._by[e] - self._ay[e]
+            largo2 = dx * dx + dy * dy
+            t = np.where(largo2 > 0, ((qx[c] - self._ax[e]) * dx + (qy[c] - self._ay[e]) * dy)
+                         / np.where(largo2 > 0, largo2, 1), 0.0)
+            t = np.clip(t, 0.0, 1.0)
+            return t, self._ax[e] + t * dx, self._ay[e] + t * dy
+
+        def distancias(c, e):
+            _, px, py = proyeccion(c, e)
+            return np.hypot(px - qx[c], py - qy[c])
+
+        tramos, distancia = self._rejilla_tramos.mas_cercanos(qx, qy, distancias)
+        consultas = np.arange(len(qx))
+        t, px, py = proyeccion(consultas, tramos)
+        aristas = self._arista_tramo[tramos]
+        largo_tramo = np.hypot(self._bx[tramos] - self._ax[tramos], self._by[tramos] - self._ay[tramos])
+        largo_arista = self._largo_arista[aristas]
+        fraccion = np.where(largo_arista > 0,
+                            (self._metros_previos[tramos] + t * largo_tramo) / np.where(largo_arista > 0, largo_arista, 1),
+                            0.0)
+        return aristas, fraccion, distancia, py / self._escala_y + self.lat0, px / self._escala_x
+
+    def ajustar(self, lats, lons, a_arista=False, distancia_maxima_m=DISTANCIA_MAXIMA_AJUSTE_M):
+        """
+        Ajusta un lote de puntos a nodos del grafo, validando que estén dentro del mapa.
+
+        Args:
+            lats, lons (array-like): Coordenadas de los puntos en grados.
+            a_arista (bool): Si es True, se proyecta cada punto sobre la calle más
+                cercana y se toma el extremo de esa calle más próximo a lo largo de
+                ella, en lugar del nodo más cercano en línea recta (que puede estar
+                en otra calle). El tramo entre el punto y ese extremo no se cuenta;
+                para no perderlo, ver `ajustar_a_calles`.
+            distancia_maxima_m (float): Distancia máxima permitida a la red.
+
+        Returns:
+            np.ndarray: Índices de nodo, uno por punto.
+
+        Raises:
+            PuntoFueraDeArea: Si algún punto está fuera de la envolvente convexa
+                o a más de `distancia_maxima_m` de la red.
+        """
+        lats, lons = np.atleast_1d(lats), np.atleast_1d(lons)
+        if a_arista:
+            aristas, fraccion, distancia, _, _ = self.aristas_mas_cercanas(lats, lons)
+            nodos = np.where(fraccion <= 0.5, self.grafo.origenes[aristas], self.grafo.destinos[aristas])
+        else:
+            nodos, distancia = self.nodos_mas_cercanos(lats, lons)
+        self._validar(lats, lons, distancia, distancia_maxima_m)
+        return nodos
+
+    def ajustar_a_calles(self, lats, lons, distancia_maxima_m=DISTANCIA_MAXIMA_AJUSTE_M):
+        """
+        Ajusta un lote de puntos a la calle más cercana, conservando su posición en ella.
+
+        Es lo que usa `MotorDijkstra.ruta_entre_puntos` para contar solo la
+        parte de la calle que de verdad se recorre.
+
+        Returns:
+            list: Un par (índice de arista, fracción de su longitud) por punto;
+                  la fracción se redondea a 4 decimales para que puntos casi
+                  iguales compartan la entrada de la caché de rutas.
+
+        Raises:
+            PuntoFueraDeArea: Como en `ajustar`.
+        """
+        lats, lons = np.atleast_1d(lats), np.atleast_1d(lons)
+        aristas, fraccion, distancia, _, _ = self.aristas_mas_cercanas(lats, lons)
+        self._validar(lats, lons, distancia, distancia_maxima_m)
+        return list(zip(aristas.tolist(), np.round(fraccion, 4).tolist()))
+
+    def _validar(self, lats, lons, distancia, distancia_maxima_m):
+        fuera = np.flatnonzero(~self.dentro_del_area(lats, lons) | (distancia > distancia_maxima_m))
+        if fuera.size:
+            raise PuntoFueraDeArea(
+                fuera.tolist(),
+                f"{fuera.size} punto(s) fuera del área de operación o a más de {distancia_maxima_m:.0f} m de una calle.")
@@ -0,0 +1,203 @@
+# ==============================================================================
+# ISOCRONAS (ÁREAS ALCANZABLES EN N MINUTOS)
+# ==============================================================================
+# Una sola búsqueda de Dijkstra desde el origen, cortada en el umbral más
+# grande (`MotorDijkstra.alcanzables`), da el tiempo de llegada a cada nodo;
+# con eso se sabe, para cada umbral, qué calles se recorren completas y hasta
+# dónde se avanza en las que quedan a medias. Las calles alcanzadas se
+# rasterizan en una rejilla de `TAMANO_CELDA_M` metros, se ensancha una celda
+# y el contorno de la máscara (contourpy, que ya instala matplotlib) da los
+# polígonos, sin construir geometrías de GeoPandas en cada petición.
+
+import math
+
+import contourpy
+import numpy as np
+
+from motor_rutas import RADIO_TIERRA_M
+
+UMBRALES_MINUTOS = (5, 10, 15)
+MAXIMO_MINUTOS = 60
+MAXIMO_UMBRALES = 6
+TAMANO_CELDA_M = 50
+DECIMALES_COORDENADAS = 6
+
+
+def leer_minutos(minutos):
+    """
+    Valida los umbrales de una petición de isócronas.
+
+    Args:
+        minutos (list): Umbrales en minutos, en cualquier orden y con repetidos.
+
+    Returns:
+        list: Los umbrales distintos (float), en orden creciente.
+
+    Raises:
+        ValueError: Si no hay entre 1 y `MAXIMO_UMBRALES` umbrales, o alguno no
+            es un número finito mayor que 0 y de hasta `MAXIMO_MINUTOS`.
+    """
+    error = f"'minutos' debe tener entre 1 y {MAXIMO_UMBRALES} valores mayores que 0 y de hasta {MAXIMO_MINUTOS}."
+    try:
+        minutos = sorted(set(float(m) for m in minutos))
+    except (TypeError, ValueError):
+        raise ValueError(error) from None
+    # NaN pasa cualquier comparación de rango (todas son falsas), así que se revisa aparte.
+    if (not 0 < len(minutos) <= MAXIMO_UMBRALES or not all(map(math.isfinite, minutos))
+            or minutos[0] <= 0 or minutos[-1] > MAXIMO_MINUTOS):
+        raise ValueError(error)
+    return minutos
+
+
+def _rangos(inicios, cantidades):
+    """Concatena range(inicio, inicio + cantidad) para cada par, vectorizado."""
+    total = int(cantidades.sum())
+    saltos = np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+    return np.repeat(inicios, cantidades) + np.arange(total) - saltos
+
+
+class _Proyeccion:
+    """Proyección equirectangular local del grafo (grados <-> metros)."""
+
+    def __init__(self, grafo):
+        lat0 = float(np.mean(grafo.y))
+        self.escala_y = np.radians(1) * RADIO_TIERRA_M
+        self.escala_x = self.escala_y * np.cos(np.radians(lat0))
+
+    def a_metros(self, lons, lats):
+        return np.asarray(lons) * self.escala_x, np.asarray(lats) * self.escala_y
+
+    def a_grados(self, x, y):
+        return np.asarray(x) / self.escala_x, np.asarray(y) / self.escala_y
+
+
+def _puntos_de_aristas(grafo, proyeccion, aristas, fracciones, paso_m):
+    """
+    Puntos cada `paso_m` metros a lo largo del trazo de cada arista.
+
+    Args:
+        aristas (np.ndarray): Índices de arista.
+        fracciones (np.ndarray): Parte de cada arista (desde su inicio) que se
+            recorre, entre 0 y 1.
+
+    Returns:
+        tuple: Coordenadas x, y (metros) de los puntos.
+    """
+    offsets = np.asarray(grafo.geometria_offsets)
+    inicios = offsets[aristas]
+    tramos_por_arista = offsets[aristas + 1] - inicios - 1
+    a = _rangos(inicios, tramos_por_arista)
+    arista_tramo = np.repeat(np.arange(len(aristas)), tramos_por_arista)
+    ax, ay = proyeccion.a_metros(grafo.geometria_x[a], grafo.geometria_y[a])
+    bx, by = proyeccion.a_metros(grafo.geometria_x[a + 1], grafo.geometria_y[a + 1])
+
+    # Metros del trazo antes de cada tramo, para cortar las aristas recorridas a medias.
+    largo = np.hypot(bx - ax, by - ay)
+    acumulado = np.cumsum(largo) - largo
+    primero = np.cumsum(tramos_por_arista) - tramos_por_arista
+    previos = acumulado - np.repeat(acumulado[primero] if len(acumulado) else acumulado, tramos_por_arista)
+    total = np.bincount(arista_tramo, weights=largo, minlength=len(aristas))
+    limite = (fracciones * total)[arista_tramo]
+    recorrido = np.clip(limite - previos, 0, largo)
+    visibles = (recorrido > 0) | (previos == 0)
+    ax, ay, bx, by, largo, recorrido = ax[visibles], ay[visibles], bx[visibles], by[visibles], \
+        largo[visibles], recorrido[visibles]
+    proporcion = np.divide(recorrido, largo, out=np.zeros_like(largo), where=largo > 0)
+    bx, by = ax + (bx - ax) * proporcion, ay + (by - ay) * proporcion
+
+    # Cada tramo se muestrea con puntos separados a lo sumo `paso_m`.
+    muestras = np.ceil(recorrido / paso_m).astype(np.int64) + 1
+    tramo = np.repeat(np.arange(len(muestras)), muestras)
+    t = (np.arange(len(tramo)) - np.repeat(np.cumsum(muestras) - muestras, muestras)) / np.maximum(muestras - 1, 1)[tramo]
+    return ax[tramo] + (bx[tramo] - ax[tramo]) * t, ay[tramo] + (by[tramo] - ay[tramo]) * t
+
+
+def _poligonos(mascara, x0, y0, celda, proyeccion):
+    """
+    Contorno de una máscara de celdas como coordenadas de un MultiPolygon de GeoJSON.
+
+    Los anillos salen de contourpy en el orden exterior, agujeros...; se
+    cierran y se pasan a (lon, lat).
+    """
+    # Un borde de ceros para que el contorno siempre cierre.
+    z = np.pad(mascara.astype(np.float32), 1)
+    xs = x0 + (np.arange(z.shape[1]) - 1) * celda
+    ys = y0 + (np.arange(z.shape[0]) - 1) * celda
+    generador = contourpy.contour_generator(xs, ys, z, fill_type=contourpy.FillType.OuterOffset)
+    puntos_poligonos, offsets_poligonos = generador.filled(0.5, 2.0)
+    poligonos = []
+    for puntos, offsets in zip(puntos_poligonos, offsets_poligonos):
+        lons, lats = proyeccion.a_grados(puntos[:, 0], puntos[:, 1])
+        coordenadas = np.column_stack((lons, lats)).round(DECIMALES_COORDENADAS).tolist()
+        poligonos.append([coordenadas[inicio:fin] for inicio, fin in zip(offsets[:-1], offsets[1:])])
+    return poligonos
+
+
+def _rasterizar(x, y, celda):
+    """Máscara de las celdas tocadas por los puntos, ensanchada una celda en cada dirección."""
+    x0, y0 = x.min() - 2 * celda, y.min() - 2 * celda
+    columnas = ((x - x0) // celda).astype(np.int64)
+    filas = ((y - y0) // celda).astype(np.int64)
+    mascara = np.zeros((filas.max() + 3, columnas.max() + 3), dtype=bool)
+    mascara[filas, columnas] = True
+    ensanchada = mascara.copy()
+    for df in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            ensanchada |= np.roll(np.roll(mascara, df, axis=0), dc, axis=1)
+    # Las coordenadas de cada celda son las de su centro.
+    return ensanchada, x0 + celda / 2, y0 + celda / 2
+
+
+def calcular_isocronas(motor, origen, umbrales_seg, formato='poligonos', tamano_celda_m=TAMANO_CELDA_M):
+    """
+    Áreas o calles alcanzables desde un nodo para varios umbrales de tiempo.
+
+    Args:
+        motor (MotorDijkstra): Motor con los pesos del perfil elegido.
+        origen (int): Índice del nodo de origen.
+        umbrales_seg (list): Umbrales en segundos, en orden creciente.
+        formato (str): 'poligonos' (el área alcanzable dentro de cada umbral,
+            acumulada) o 'aristas' (las calles que se terminan de recorrer
+            dentro de cada banda, entre el umbral anterior y el suyo).
+        tamano_celda_m (float): Lado de las celdas de la rejilla de los polígonos.
+
+    Returns:
+        dict: FeatureCollection de GeoJSON con una Feature por umbral
+              (propiedades: 'minutos', 'nodos', 'aristas' y, con polígonos,
+              'area_km2') y 'nodos_asentados' de la búsqueda.
+    """
+    grafo = motor.grafo
+    nodos, tiempos = motor.alcanzables(origen, umbrales_seg[-1])
+    tiempo_nodo = np.full(grafo.num_nodos, np.inf)
+    tiempo_nodo[nodos] = tiempos
+    salida = tiempo_nodo[grafo.origenes]
+    llegada = salida + grafo.pesos
+    proyeccion = _Proyeccion(grafo)
+
+    caracteristicas = []
+    anterior = -np.inf
+    for umbral in umbrales_seg:
+        completas = llegada <= umbral
+        propiedades = {"minutos": round(umbral / 60, 2), "nodos": int(np.count_nonzero(tiempo_nodo <= umbral)),
+                       "aristas": int(np.count_nonzero(completas))}
+        if formato == 'aristas':
+            banda = np.flatnonzero(completas & (llegada > anterior))
+            geometria = {"type": "MultiLineString", "coordinates": [
+                np.column_stack(grafo.trazo_arista(arista)).round(DECIMALES_COORDENADAS).tolist() for arista in banda]}
+        else:
+            # Las calles a medias se dibujan hasta donde alcanza el tiempo.
+            alcanzadas = np.flatnonzero(salida <= umbral)
+            # Una arista de peso 0 (p. ej. un tramo de longitud 0) alcanzada se recorre completa.
+            pesos = np.asarray(grafo.pesos)[alcanzadas]
+            fracciones = np.clip(np.divide(umbral - salida[alcanzadas], pesos, out=np.ones_like(pesos),
+                                           where=pesos > 0), 0, 1)
+            x, y = _puntos_de_aristas(grafo, proyeccion, alcanzadas, fracciones, tamano_celda_m / 2)
+            origen_x, origen_y = proyeccion.a_metros(grafo.x[[origen]], grafo.y[[origen]])
+            mascara, x0, y0 = _rasterizar(np.append(x, origen_x), np.append(y, origen_y), tamano_celda_m)
+            propiedades["area_km2"] = round(float(mascara.sum()) * tamano_celda_m ** 2 / 1e6, 3)
+            geometria = {"type": "MultiPolygon", "coordinates": _poligonos(mascara, x0, y0, tamano_celda_m, proyeccion)}
+        caracteristicas.append({"type": "Feature", "properties": propiedades, "geometry": geometria})
+        anterior = umbral
+
+    return {"type": "FeatureCollection", "features": caracteristicas,
+            "nodos_asentados": motor.ultimas_estadisticas.get('nodos_asentados')}
@@ -0,0 +1,464 @@
+# ==============================================================================
+# JERARQUÍAS DE CONTRACCIÓN (CONTRACTION HIERARCHIES)
+# ==============================================================================
+# El grafo de la zona metropolitana es estático, así que vale la pena hacer un
+# preprocesamiento único que acelere todas las consultas posteriores:
+#
+#   1. Construcción (fuera de línea): se "contraen" los nodos uno por uno, del
+#      menos al más importante. Al quitar un nodo v, cada camino u -> v -> w que
+#      sea el más corto se reemplaza por un atajo u -> w con el mismo tiempo de
+#      viaje. Una búsqueda "testigo" evita crear atajos innecesarios.
+#   2. Consulta: dos búsquedas de Dijkstra que solo suben en la jerarquía (una
+#      desde el origen y otra, en reversa, desde el destino) se encuentran en
+#      un nodo importante tras asentar unos cuantos cientos de nodos.
+#   3. Desempaquetado: cada atajo recuerda el nodo que reemplazó, de modo que
+#      la ruta se puede expandir de nuevo a la lista original de nodos de OSM.
+#
+# Con `limite_testigo=0` no se hace ninguna búsqueda testigo: se agregan todos
+# los atajos posibles y la estructura deja de depender de los pesos. Es más
+# grande, pero se puede "personalizar" para pesos nuevos (tráfico, cierres)
+# recalculando solo los pesos de sus aristas, sin volver a contraer el grafo.
+
+import heapq
+import math
+
+import numpy as np
+
+from motor_rutas import MotorDijkstra, estadisticas_busqueda
+
+# Máximo de nodos que asienta cada búsqueda testigo. Un límite más bajo
+# acelera la construcción a costa de agregar algunos atajos de sobra; 0 crea
+# una jerarquía personalizable.
+LIMITE_TESTIGO = 200
+
+
+def _busqueda_testigo(salida, origen, excluido, costo_maximo, limite):
+    """
+    Dijkstra local desde `origen` que no pasa por `excluido`.
+
+    Se detiene al superar `costo_maximo` o tras asentar `limite` nodos.
+
+    Returns:
+        dict: Distancias encontradas, por nodo.
+    """
+    distancias = {origen: 0.0}
+    if limite == 0:
+        return distancias
+    monticulo = [(0.0, origen)]
+    asentados = 0
+    while monticulo and asentados < limite:
+        distancia, nodo = heapq.heappop(monticulo)
+        if distancia > distancias[nodo]:
+            continue
+        if distancia > costo_maximo:
+            break
+        asentados += 1
+        for vecino, (peso, _) in salida[nodo].items():
+            if vecino == excluido:
+                continue
+            nueva_distancia = distancia + peso
+            if nueva_distancia < distancias.get(vecino, math.inf):
+                distancias[vecino] = nueva_distancia
+                heapq.heappush(monticulo, (nueva_distancia, vecino))
+    return distancias
+
+
+def _atajos_necesarios(salida, entrada, nodo, limite):
+    """Lista de atajos (u, w, costo) que hacen falta si se contrae `nodo`."""
+    atajos = []
+    for u, (peso_entrada, _) in entrada[nodo].items():
+        objetivos = {w: peso_entrada + peso_salida
+                     for w, (peso_salida, _) in salida[nodo].items() if w != u}
+        if not objetivos:
+            continue
+        distancias = _busqueda_testigo(salida, u, nodo, max(objetivos.values()), limite)
+        for w, costo in objetivos.items():
+            if distancias.get(w, math.inf) > costo:
+                atajos.append((u, w, costo))
+    return atajos
+
+
+def construir_jerarquia(grafo, limite_testigo=LIMITE_TESTIGO, progreso=None):
+    """
+    Construye la jerarquía de contracción de un `GrafoCSR`.
+
+    El orden de contracción usa la diferencia de aristas (atajos que se crean
+    menos aristas que se eliminan) más el número de vecinos ya contraídos,
+    para repartir la contracción de manera uniforme por el mapa. Las
+    prioridades se actualizan de forma perezosa al sacar cada nodo de la cola.
+
+    Args:
+        grafo (GrafoCSR): Grafo con los pesos 'tiempo_viaje_seg'.
+        limite_testigo (int): Máximo de nodos asentados por búsqueda testigo
+            (0 = sin búsquedas testigo: jerarquía personalizable).
+        progreso (callable, opcional): Se llama con (contraídos, total) cada 1000 nodos.
+
+    Returns:
+        JerarquiaContraccion: La jerarquía lista para consultas o para guardarse.
+    """
+    n = grafo.num_nodos
+    # Grafo dinámico restante: salida[u][v] = entrada[v][u] = (peso, nodo_medio).
+    salida = [{} for _ in range(n)]
+    entrada = [{} for _ in range(n)]
+    # Las calles cerradas (peso infinito) también entran: una jerarquía
+    # personalizable debe poder representarlas si se vuelven a abrir.
+    for u, v, peso in zip(grafo.origenes.tolist(), grafo.destinos.tolist(), grafo.pesos.tolist()):
+        if u != v and (v not in salida[u] or peso < salida[u][v][0]):
+            salida[u][v] = entrada[v][u] = (peso, -1)
+
+    vecinos_contraidos = [0] * n
+    rango = [0] * n
+    contraido = [False] * n
+    aristas = []
+
+    def prioridad(nodo):
+        atajos = _atajos_necesarios(salida, entrada, nodo, limite_testigo)
+        return len(atajos) - len(salida[nodo]) - len(entrada[nodo]) + vecinos_contraidos[nodo]
+
+    cola = [(prioridad(nodo), nodo) for nodo in range(n)]
+    heapq.heapify(cola)
+    orden = 0
+    while cola:
+        _, nodo = heapq.heappop(cola)
+        if contraido[nodo]:
+            continue
+        nueva_prioridad = prioridad(nodo)
+        if cola and nueva_prioridad > cola[0][0]:
+            heapq.heappush(cola, (nueva_prioridad, nodo))
+            continue
+
+        atajos = _atajos_necesarios(salida, entrada, nodo, limite_testigo)
+        # Todas las aristas que le quedan al nodo van hacia nodos de mayor rango:
+        # se guardan ahora y se retiran del grafo restante.
+        for w, (peso, medio) in salida[nodo].items():
+            aristas.append((nodo, w, peso, medio))
+            del entrada[w][nodo]
+            vecinos_contraidos[w] += 1
+        for u, (peso, medio) in entrada[nodo].items():
+            aristas.append((u, nodo, peso, medio))
+            del salida[u][nodo]
+            vecinos_contraidos[u] += 1
+        salida[nodo].clear()
+        entrada[nodo].clear()
+
+        for u, w, costo in atajos:
+            if w not in salida[u] or costo < salida[u][w][0]:
+                salida[u][w] = entrada[w][u] = (costo, nodo)
+
+        contraido[nodo] = True
+        rango[nodo] = orden
+        orden += 1
+        if progreso and orden % 1000 == 0:
+            progreso(orden, n)
+
+    origenes, destinos, pesos, medios = zip(*aristas) if aristas else ((), (), (), ())
+    return JerarquiaContraccion(
+        rango=np.array(rango, dtype=np.int64),
+        origenes=np.array(origenes, dtype=np.int64),
+        destinos=np.array(destinos, dtype=np.int64),
+        pesos=np.array(pesos, dtype=np.float64),
+        medios=np.array(medios, dtype=np.int64),
+        huella=grafo.huella(),
+        personalizable=limite_testigo == 0,
+    )
+
+
+def _csr(claves, vecinos, pesos, n):
+    """Agrupa aristas por `claves` en arreglos CSR (offsets, vecinos, pesos, índice original)."""
+    orden = np.argsort(claves, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(claves, minlength=n), out=offsets[1:])
+    return offsets, vecinos[orden], pesos[orden], orden
+
+
+class JerarquiaContraccion:
+    """
+    Jerarquía de contracción ya construida.
+
+    Guarda todas las aristas finales (originales y atajos) con su nodo medio
+    (-1 para las aristas originales) y el rango de cada nodo. A partir de ellas
+    arma los dos grafos "ascendentes" que recorren las consultas.
+    """
+
+    def __init__(self, rango, origenes, destinos, pesos, medios, huella, personalizable=False):
+        self.rango = rango
+        self.origenes = origenes
+        self.destinos = destinos
+        self.pesos = pesos
+        self.medios = medios
+        self.huella = huella
+        self.personalizable = personalizable
+
+        n = len(rango)
+        sube = rango[destinos] > rango[origenes]
+        # Hacia adelante: aristas u -> v con v más importante, agrupadas por u.
+        self.offsets_sube, self.vecinos_sube, self.pesos_sube, _ = _csr(
+            origenes[sube], destinos[sube], pesos[sube], n)
+        # Hacia atrás: aristas u -> v con u más importante, agrupadas por v.
+        baja = ~sube
+        self.offsets_baja, self.vecinos_baja, self.pesos_baja, _ = _csr(
+            destinos[baja], origenes[baja], pesos[baja], n)
+
+        self._medios = dict(zip(zip(origenes.tolist(), destinos.tolist()), medios.tolist()))
+        # Estructuras que solo dependen de la topología; se calculan la primera
+        # vez que se personaliza y se comparten con las jerarquías derivadas.
+        self._topologia = None
+
+    @property
+    def num_atajos(self):
+        return int(np.count_nonzero(self.medios != -1))
+
+    def desempaquetar(self, nodos):
+        """
+        Expande una secuencia de nodos que usa atajos a la secuencia original.
+
+        Args:
+            nodos (list): Índices de nodo consecutivos unidos por aristas de la jerarquía.
+
+        Returns:
+            list: Índices de nodo del camino equivalente en el grafo original.
+        """
+        ruta = [nodos[0]]
+        for u, v in zip(nodos[:-1], nodos[1:]):
+            pila = [(u, v)]
+            while pila:
+                a, b = pila.pop()
+                medio = self._medios[(a, b)]
+                if medio == -1:
+                    ruta.append(b)
+                else:
+                    pila.append((medio, b))
+                    pila.append((a, medio))
+        return ruta
+
+    def _calcular_topologia(self):
+        """
+        Prepara la personalización: claves de arista ordenadas y triángulos inferiores.
+
+        Un triángulo inferior (u -> m, m -> w) con m menos importante que u y w
+        es un camino de dos aristas que la arista u -> w puede reemplazar. Los
+        triángulos se agrupan por "nivel" de m (1 + el nivel más alto de sus
+        vecinos menos importantes): los de un mismo nivel no dependen entre sí
+        y se procesan juntos con NumPy.
+        """
+        n = len(self.rango)
+        rango, origenes, destinos = self.rango, self.origenes, self.destinos
+        claves = origenes * n + destinos
+        orden_claves = np.argsort(claves)
+        claves_ordenadas = claves[orden_claves]
+
+        # Para cada nodo m: aristas que le llegan desde nodos más importantes
+        # y aristas que salen de él hacia nodos más importantes.
+        sube = rango[destinos] > rango[origenes]
+        llegan = np.flatnonzero(~sube)
+        llegan = llegan[np.argsort(destinos[llegan], kind='stable')]
+        salen = np.flatnonzero(sube)
+        salen = salen[np.argsort(origenes[salen], kind='stable')]
+        inicio_salen = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origenes[salen], minlength=n), out=inicio_salen[1:])
+
+        # Producto cartesiano (llegada × salida) de cada nodo, sin ciclos en Python.
+        medio_llegada = destinos[llegan]
+        repeticiones = inicio_salen[medio_llegada + 1] - inicio_salen[medio_llegada]
+        a_um = np.repeat(llegan, repeticiones)
+        desplazamiento = np.repeat(inicio_salen[medio_llegada] - (np.cumsum(repeticiones) - repeticiones),
+                                   repeticiones)
+        a_mw = salen[np.arange(len(a_um)) + desplazamiento]
+        u, w = origenes[a_um], destinos[a_mw]
+        distintos = u != w
+        a_um, a_mw, u, w = a_um[distintos], a_mw[distintos], u[distintos], w[distintos]
+        a_uw = orden_claves[np.searchsorted(claves_ordenadas, u * n + w)]
+        medio = destinos[a_um]
+
+        # Nivel de cada nodo, recorriendo las aristas por rango de su extremo menor.
+        nivel = [0] * n
+        bajo = np.where(sube, origenes, destinos)
+        alto = np.where(sube, destinos, origenes)
+        por_rango = np.argsort(rango[bajo], kind='stable')
+        for x, y in zip(bajo[por_rango].tolist(), alto[por_rango].tolist()):
+            if nivel[x] + 1 > nivel[y]:
+                nivel[y] = nivel[x] + 1
+        # Dentro de cada nivel, los triángulos quedan ordenados por arista
+        # destino para tomar el mínimo de cada una con `np.minimum.reduceat`.
+        nivel_triangulo = np.array(nivel, dtype=np.int64)[medio]
+        orden = np.lexsort((a_uw, nivel_triangulo))
+        a_um, a_mw, a_uw, medio, nivel_triangulo = (
+            a_um[orden], a_mw[orden], a_uw[orden], medio[orden], nivel_triangulo[orden])
+        cortes = np.flatnonzero(np.diff(nivel_triangulo)) + 1
+        niveles = []
+        for inicio, fin in zip(np.r_[0, cortes].tolist(), np.r_[cortes, len(a_uw)].tolist()):
+            destino = a_uw[inicio:fin]
+            inicios = np.flatnonzero(np.r_[True, destino[1:] != destino[:-1]])
+            niveles.append((inicio, fin, destino[inicios], inicios))
+        self._topologia = {
+            'claves_ordenadas': claves_ordenadas,
+            'orden_claves': orden_claves,
+            'triangulos': (a_um, a_mw, a_uw, medio),
+            'niveles': niveles,
+        }
+        return self._topologia
+
+    def personalizar(self, grafo):
+        """
+        Devuelve la misma jerarquía con los pesos de `grafo`, sin volver a contraer.
+
+        Solo es exacto para jerarquías personalizables (sin búsquedas testigo):
+        ahí cada par de vecinos de un nodo contraído tiene su arista, así que
+        basta recorrer los triángulos inferiores de menor a mayor nivel.
+
+        Args:
+            grafo (GrafoCSR): Grafo con la misma topología y pesos nuevos.
+
+        Returns:
+            JerarquiaContraccion: Jerarquía con la huella de `grafo`.
+
+        Raises:
+            ValueError: Si la jerarquía se construyó con búsquedas testigo.
+        """
+        if not self.personalizable:
+            raise ValueError("La jerarquía se construyó con búsquedas testigo y no se puede personalizar.")
+        topologia = self._topologia or self._calcular_topologia()
+        n = len(self.rango)
+
+        # Peso de las aristas originales (la menor si hay paralelas); inf para los atajos puros.
+        pesos = np.full(len(self.origenes), np.inf)
+        origenes, destinos = np.asarray(grafo.origenes), np.asarray(grafo.destinos)
+        validas = origenes != destinos
+        posiciones = np.searchsorted(topologia['claves_ordenadas'], origenes[validas] * n + destinos[validas])
+        np.minimum.at(pesos, topologia['orden_claves'][posiciones], np.asarray(grafo.pesos)[validas])
+        base = pesos.copy()
+
+        a_um, a_mw, a_uw, medio = topologia['triangulos']
+        for inicio, fin, destinos_nivel, inicios in topologia['niveles']:
+            candidatos = pesos[a_um[inicio:fin]] + pesos[a_mw[inicio:fin]]
+            pesos[destinos_nivel] = np.minimum(pesos[destinos_nivel], np.minimum.reduceat(candidatos, inicios))
+
+        # Nodo medio: el de cualquier triángulo que dé el peso final, salvo que
+        # la arista original ya lo dé (entonces la arista no es un atajo).
+        medios = np.full(len(self.origenes), -1, dtype=np.int64)
+        ajustados = (pesos[a_um] + pesos[a_mw] == pesos[a_uw]) & np.isfinite(pesos[a_uw]) & (base[a_uw] != pesos[a_uw])
+        medios[a_uw[ajustados]] = medio[ajustados]
+
+        jerarquia = JerarquiaContraccion(self.rango, self.origenes, self.destinos, pesos, medios,
+                                         huella=grafo.huella(), personalizable=True)
+        jerarquia._topologia = topologia
+        return jerarquia
+
+    def guardar(self, ruta_archivo):
+        """Escribe la jerarquía en un archivo .npz."""
+        np.savez(ruta_archivo, rango=self.rango, origenes=self.origenes, destinos=self.destinos,
+                 pesos=self.pesos, medios=self.medios, huella=np.array(self.huella),
+                 personalizable=np.array(self.personalizable))
+
+    @classmethod
+    def cargar(cls, ruta_archivo):
+        """Lee una jerarquía escrita con `guardar`."""
+        with np.load(ruta_archivo) as datos:
+            personalizable = bool(datos['personalizable']) if 'personalizable' in datos.files else False
+            return cls(rango=datos['rango'], origenes=datos['origenes'], destinos=datos['destinos'],
+                       pesos=datos['pesos'], medios=datos['medios'], huella=str(datos['huella']),
+                       personalizable=personalizable)
+
+
+class MotorCH(MotorDijkstra):
+    """
+    Consultas punto a punto sobre una `JerarquiaContraccion`.
+
+    Devuelve rutas en términos del grafo original (con los atajos ya
+    desempaquetados), por lo que es intercambiable con los demás motores.
+    """
+
+    def __init__(self, grafo, jerarquia):
+        super().__init__(grafo)
+        if jerarquia.huella != grafo.huella():
+            raise ValueError("La jerarquía de contracción no corresponde a este grafo.")
+        self.jerarquia = jerarquia
+        self._offsets_sube = memoryview(jerarquia.offsets_sube)
+        self._vecinos_sube = memoryview(jerarquia.vecinos_sube)
+        self._pesos_sube = memoryview(jerarquia.pesos_sube)
+        self._offsets_baja = memoryview(jerarquia.offsets_baja)
+        self._vecinos_baja = memoryview(jerarquia.vecinos_baja)
+        self._pesos_baja = memoryview(jerarquia.pesos_baja)
+
+    @staticmethod
+    def _paso(monticulo, bufer, offsets, vecinos, pesos):
+        """Asienta un nodo de una de las dos búsquedas; devuelve el nodo o -1 si estaba obsoleto."""
+        distancias, previos, tocados = bufer.distancias, bufer.aristas_previas, bufer.tocados
+        distancia, nodo = heapq.heappop(monticulo)
+        if distancia > distancias[nodo]:
+            return -1
+        for k in range(offsets[nodo], offsets[nodo + 1]):
+            vecino = vecinos[k]
+            nueva_distancia = distancia + pesos[k]
+            if nueva_distancia < distancias[vecino]:
+                if distancias[vecino] == math.inf:
+                    tocados.append(vecino)
+                distancias[vecino] = nueva_distancia
+                # En la jerarquía se guarda el nodo previo (no la arista) para desempaquetar.
+                previos[vecino] = nodo
+                heapq.heappush(monticulo, (nueva_distancia, vecino))
+        return nodo
+
+    def ruta_mas_corta(self, start_node, end_node):
+        """
+        Encuentra la ruta más rápida entre dos nodos de OSM.
+
+        Args:
+            start_node: El ID de OSM del nodo de inicio de la ruta.
+            end_node: El ID de OSM del nodo de destino de la ruta.
+
+        Returns:
+            tuple: La lista de nodos (IDs de OSM) de la ruta óptima y su costo
+                   total en segundos, o (None, math.inf) si no existe una ruta.
+        """
+        indice = self.grafo.indice
+        origen = indice[start_node]
+        destino = indice[end_node]
+
+        adelante, atras = self._buferes(2)
+        adelante.distancias[origen] = 0.0
+        adelante.tocados.append(origen)
+        atras.distancias[destino] = 0.0
+        atras.tocados.append(destino)
+        monticulo_f = [(0.0, origen)]
+        monticulo_r = [(0.0, destino)]
+        mejor_costo = math.inf
+        encuentro = -1
+        asentados = obsoletas = 0
+        hacia_adelante = True
+
+        # Cada dirección termina cuando su mínimo ya no puede mejorar la mejor ruta.
+        while True:
+            if monticulo_f and monticulo_f[0][0] >= mejor_costo:
+                obsoletas += len(monticulo_f)
+                monticulo_f.clear()
+            if monticulo_r and monticulo_r[0][0] >= mejor_costo:
+                obsoletas += len(monticulo_r)
+                monticulo_r.clear()
+            if not monticulo_f and not monticulo_r:
+                break
+            if monticulo_f and (hacia_adelante or not monticulo_r):
+                nodo = self._paso(monticulo_f, adelante, self._offsets_sube, self._vecinos_sube, self._pesos_sube)
+            else:
+                nodo = self._paso(monticulo_r, atras, self._offsets_baja, self._vecinos_baja, self._pesos_baja)
+            if nodo != -1:
+                asentados += 1
+                costo = adelante.distancias[nodo] + atras.distancias[nodo]
+                if costo < mejor_costo:
+                    mejor_costo = costo
+                    encuentro = nodo
+            else:
+                obsoletas += 1
+            hacia_adelante = not hacia_adelante
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas)
+        if encuentro == -1:
+            return None, math.inf
+
+        nodos = [encuentro]
+        while adelante.aristas_previas[nodos[-1]] != -1:
+            nodos.append(adelante.aristas_previas[nodos[-1]])
+        nodos.reverse()
+        while atras.aristas_previas[nodos[-1]] != -1:
+            nodos.append(atras.aristas_previas[nodos[-1]])
+        return self._ids_osm(self.jerarquia.desempaquetar(nodos)), mejor_costo
@@ -0,0 +1,355 @@
+# ==============================================================================
+# DIBUJO DE LA RUTA SOBRE LA RED VIAL
+# ==============================================================================
+# Dibujar las decenas de miles de calles de la red en cada petición cuesta
+# mucho más que calcular la ruta. Por eso:
+#   - La red completa se rasteriza una sola vez (la "capa base") y se guarda
+#     en disco como una máscara de intensidad, una por grafo.
+#   - Para cada ruta solo se recorta la zona de interés de la capa base y se
+#     dibujan encima la línea de la ruta y los marcadores.
+#   - El dibujo corre en un pool de procesos: /ruta devuelve al instante una
+#     URL única que se resuelve cuando la imagen está lista.
+#   - Las imágenes viejas se borran por antigüedad y por cantidad máxima.
+#   - Matplotlib solo se importa donde se dibuja (los procesos de dibujo, o al
+#     rasterizar la capa base la primera vez): el proceso del servidor no lo
+#     necesita para atender /ruta.
+
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from motor_rutas import RADIO_TIERRA_M
+
+logger = logging.getLogger(__name__)
+
+COLOR_FONDO = '#0B161D'
+COLOR_CALLES = 'gray'
+COLOR_RUTA = 'lime'
+# Rutas alternativas de /ruta?alternativas=, en orden.
+COLORES_ALTERNATIVAS = ('deepskyblue', 'orange', 'magenta', 'gold')
+MARGEN_GRADOS = 0.008
+
+# Resolución de la capa base y límite de tamaño para zonas muy grandes.
+METROS_POR_PIXEL = 4.0
+MAXIMO_PIXELES_LADO = 8000
+# Lado mayor de la imagen de la ruta (a 300 dpi).
+LADO_IMAGEN_PULGADAS = 8
+
+DIRECTORIO_CAPAS = os.path.join('datos', 'capas_base')
+DIRECTORIO_MAPAS = os.path.join('static', 'mapas')
+MAXIMO_IMAGENES = 200
+TTL_IMAGENES_SEG = 3600
+# La carpeta se revisa cada tantas imágenes encoladas o tantos segundos, no en cada una.
+ENCOLADOS_ENTRE_LIMPIEZAS = 20
+SEGUNDOS_ENTRE_LIMPIEZAS = 60
+PREFIJO_IMAGEN = 'mapa_ruta_'
+SUFIJO_TEMPORAL = '.tmp.png'
+
+
+def _matplotlib():
+    """Importa Matplotlib con el backend sin interfaz gráfica y devuelve lo que usa el dibujo."""
+    import matplotlib
+    matplotlib.use('Agg') # Configuración para que Matplotlib funcione sin interfaz gráfica en el servidor.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import to_rgb
+    from matplotlib.figure import Figure
+    return Figure, FigureCanvasAgg, LineCollection, to_rgb
+
+
+def trazos_red(grafo):
+    """Lista con el trazo (arreglo de puntos x, y) de cada arista del grafo."""
+    puntos = np.column_stack((grafo.geometria_x, grafo.geometria_y))
+    return np.split(puntos, np.asarray(grafo.geometria_offsets[1:-1]))
+
+
+def trazos_ruta(grafo, aristas, extremos=None):
+    """
+    Trazos (arreglos de puntos x, y) de las aristas de una ruta.
+
+    Con `extremos` (ver `MotorDijkstra.ruta_entre_puntos`) la primera y la
+    última arista se recortan a la parte que la ruta recorre.
+    """
+    if extremos is None or not aristas:
+        return [np.column_stack(grafo.trazo_arista(arista)) for arista in aristas]
+    inicio, fin = extremos
+    if len(aristas) == 1:
+        return [np.column_stack(grafo.trazo_arista(aristas[0], inicio, fin))]
+    return ([np.column_stack(grafo.trazo_arista(aristas[0], desde=inicio))]
+            + [np.column_stack(grafo.trazo_arista(arista)) for arista in aristas[1:-1]]
+            + [np.column_stack(grafo.trazo_arista(aristas[-1], hasta=fin))])
+
+
+def construir_capa_base(grafo, ruta_archivo):
+    """
+    Rasteriza todas las calles del grafo y guarda la máscara en `ruta_archivo`.
+
+    La máscara (uint8) vale 0 en el fondo y 255 sobre las calles; junto a ella
+    se escribe un .json con la extensión en grados que cubre.
+    """
+    xmin, xmax = float(np.min(grafo.x)), float(np.max(grafo.x))
+    ymin, ymax = float(np.min(grafo.y)), float(np.max(grafo.y))
+    # Margen para que los recortes cerca del borde no se salgan de la capa.
+    xmin, xmax, ymin, ymax = xmin - MARGEN_GRADOS, xmax + MARGEN_GRADOS, ymin - MARGEN_GRADOS, ymax + MARGEN_GRADOS
+    metros_grado_y = np.radians(1) * RADIO_TIERRA_M
+    metros_grado_x = metros_grado_y * np.cos(np.radians((ymin + ymax) / 2))
+    ancho = (xmax - xmin) * metros_grado_x / METROS_POR_PIXEL
+    alto = (ymax - ymin) * metros_grado_y / METROS_POR_PIXEL
+    escala = min(1.0, MAXIMO_PIXELES_LADO / max(ancho, alto))
+    ancho, alto = int(ancho * escala), int(alto * escala)
+
+    Figure, FigureCanvasAgg, LineCollection, _ = _matplotlib()
+    fig = Figure(figsize=(ancho / 100, alto / 100), dpi=100, facecolor='black')
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_facecolor('black')
+    ax.add_collection(LineCollection(trazos_red(grafo), colors='white', linewidths=0.5))
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    ax.axis('off')
+    canvas.draw()
+    mascara = np.asarray(canvas.buffer_rgba())[:, :, 0].copy()
+
+    os.makedirs(os.path.dirname(ruta_archivo) or '.', exist_ok=True)
+    temporal = f'{ruta_archivo}.tmp-{os.getpid()}.npy'
+    np.save(temporal, mascara)
+    with open(f'{ruta_archivo}.json', 'w', encoding='utf-8') as archivo:
+        json.dump({'extension': [xmin, xmax, ymin, ymax]}, archivo)
+    os.replace(temporal, ruta_archivo)
+
+
+def cargar_capa_base(ruta_archivo):
+    """Devuelve (máscara mapeada en memoria, extensión [xmin, xmax, ymin, ymax])."""
+    with open(f'{ruta_archivo}.json', encoding='utf-8') as archivo:
+        extension = json.load(archivo)['extension']
+    return np.load(ruta_archivo, mmap_mode='r'), extension
+
+
+def renderizar(capa_base, rutas, origen, destino, ruta_guardado):
+    """
+    Compone la imagen de una o varias rutas sobre un recorte de la capa base.
+
+    Args:
+        capa_base (tuple): (máscara, extensión) de `cargar_capa_base`.
+        rutas (list): Pares (trazos, color); los trazos son arreglos de puntos (x, y).
+        origen (tuple): Coordenadas (x, y) del origen.
+        destino (tuple): Coordenadas (x, y) del destino.
+        ruta_guardado (str): Archivo PNG a escribir.
+    """
+    Figure, FigureCanvasAgg, LineCollection, to_rgb = _matplotlib()
+    mascara, (xmin, xmax, ymin, ymax) = capa_base
+    puntos = np.vstack([np.vstack(trazos) for trazos, _ in rutas if trazos] + [np.array([origen, destino])])
+    x0, x1 = puntos[:, 0].min() - MARGEN_GRADOS, puntos[:, 0].max() + MARGEN_GRADOS
+    y0, y1 = puntos[:, 1].min() - MARGEN_GRADOS, puntos[:, 1].max() + MARGEN_GRADOS
+
+    # Recorte de la máscara (las filas van de norte a sur) y coloreado fondo/calles.
+    alto, ancho = mascara.shape
+    c0 = max(0, int((x0 - xmin) / (xmax - xmin) * ancho))
+    c1 = min(ancho, int(np.ceil((x1 - xmin) / (xmax - xmin) * ancho)))
+    f0 = max(0, int((ymax - y1) / (ymax - ymin) * alto))
+    f1 = min(alto, int(np.ceil((ymax - y0) / (ymax - ymin) * alto)))
+    intensidad = np.asarray(mascara[f0:f1, c0:c1], dtype=np.float32)[:, :, None] / 255
+    fondo, calles = np.array(to_rgb(COLOR_FONDO)), np.array(to_rgb(COLOR_CALLES))
+    imagen = fondo + (calles - fondo) * intensidad
+    extension_recorte = [xmin + c0 / ancho * (xmax - xmin), xmin + c1 / ancho * (xmax - xmin),
+                         ymax - f1 / alto * (ymax - ymin), ymax - f0 / alto * (ymax - ymin)]
+
+    # La figura toma la proporción de la zona recortada, así no hace falta
+    # `bbox_inches='tight'` (que dibuja la figura dos veces) para quitar bordes.
+    aspecto = 1 / np.cos(np.deg2rad((y0 + y1) / 2))
+    proporcion = (y1 - y0) * aspecto / (x1 - x0)
+    lado = LADO_IMAGEN_PULGADAS
+    fig = Figure(figsize=(lado, lado * proporcion) if proporcion <= 1 else (lado / proporcion, lado),
+                 facecolor=COLOR_FONDO)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_facecolor(COLOR_FONDO)
+    ax.imshow(imagen, extent=extension_recorte, interpolation='bilinear', zorder=1)
+    for trazos, color in rutas:
+        ax.add_collection(LineCollection(trazos, colors=color, linewidths=6, alpha=0.5, zorder=3))
+    ax.scatter(*origen, s=200, c='lime', marker='o', zorder=5, label='Origen')
+    ax.scatter(*destino, s=200, c='red', marker='X', zorder=5, label='Destino')
+    ax.set_xlim(x0, x1)
+    ax.set_ylim(y0, y1)
+    ax.set_aspect(aspecto)
+    ax.axis('off')
+    # La compresión PNG rápida ahorra más tiempo del que cuesta en tamaño.
+    fig.savefig(ruta_guardado, dpi=300, facecolor=COLOR_FONDO, pil_kwargs={'compress_level': 1})
+
+
+_capa_worker = None
+
+
+def _inicializar_worker(ruta_capa):
+    global _capa_worker
+    _capa_worker = cargar_capa_base(ruta_capa)
+    # Matplotlib se importa al arrancar el proceso, no en el primer dibujo.
+    _matplotlib()
+
+
+def _renderizar_en_worker(rutas, origen, destino, ruta_guardado):
+    # Se escribe con otro nombre y se renombra para no servir un PNG a medias.
+    inicio = time.perf_counter()
+    temporal = f'{ruta_guardado}.tmp.png'
+    renderizar(_capa_worker, rutas, origen, destino, temporal)
+    os.replace(temporal, ruta_guardado)
+    return time.perf_counter() - inicio
+
+
+class ColaRender:
+    """
+    Pool de procesos que dibuja los mapas de ruta fuera del hilo de la petición.
+
+    Args:
+        grafo (GrafoCSR): Grafo del que se obtiene la capa base.
+        directorio (str): Carpeta donde se escriben los PNG.
+        procesos (int): Número de procesos de dibujo.
+        maximo_imagenes (int): Imágenes que se conservan como máximo.
+        ttl_seg (float): Antigüedad máxima de una imagen antes de borrarla.
+
+    Si se asigna `al_dibujar`, se llama con los segundos que tomó cada dibujo
+    terminado sin error (en el proceso principal).
+    """
+
+    def __init__(self, grafo, directorio=DIRECTORIO_MAPAS, procesos=2,
+                 maximo_imagenes=MAXIMO_IMAGENES, ttl_seg=TTL_IMAGENES_SEG):
+        self.grafo = grafo
+        self.directorio = directorio
+        self.maximo_imagenes = maximo_imagenes
+        self.ttl_seg = ttl_seg
+        os.makedirs(directorio, exist_ok=True)
+
+        self.ruta_capa = os.path.join(DIRECTORIO_CAPAS, f'{grafo.huella()}.npy')
+        if not os.path.exists(self.ruta_capa):
+            logger.info("Rasterizando la capa base del mapa...")
+            construir_capa_base(grafo, self.ruta_capa)
+
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=procesos, initializer=_inicializar_worker, initargs=(self.ruta_capa,))
+        self._pendientes = {}
+        self._candado = threading.Lock()
+        self._encolados = 0
+        self._ultima_limpieza = time.monotonic()
+        self.al_dibujar = None
+
+    def encolar(self, rutas_aristas, origen, destino, extremos=None):
+        """
+        Programa el dibujo de una o varias rutas y devuelve el nombre del PNG.
+
+        Args:
+            rutas_aristas (list): Pares (índices de arista, color), uno por ruta.
+            origen (int): Índice del nodo de origen.
+            destino (int): Índice del nodo de destino.
+            extremos (tuple): Para una ruta entre puntos a media calle, las
+                fracciones de su primera y última arista (ver `trazos_ruta`);
+                el origen y el destino se marcan entonces en esos puntos.
+
+        Returns:
+            str: Nombre único del archivo (se puede pedir antes de que exista).
+        """
+        self._limpiar_si_toca()
+        nombre = f'{PREFIJO_IMAGEN}{uuid.uuid4().hex}.png'
+        rutas = [(trazos_ruta(self.grafo, aristas, extremos), color) for aristas, color in rutas_aristas]
+        coordenadas = lambda nodo: (float(self.grafo.x[nodo]), float(self.grafo.y[nodo]))
+        origen, destino = coordenadas(origen), coordenadas(destino)
+        if extremos is not None and rutas[-1][0]:
+            origen, destino = tuple(map(float, rutas[-1][0][0][0])), tuple(map(float, rutas[-1][0][-1][-1]))
+        futuro = self._pool.submit(_renderizar_en_worker, rutas, origen, destino,
+                                   os.path.join(self.directorio, nombre))
+        with self._candado:
+            self._pendientes[nombre] = futuro
+        futuro.add_done_callback(lambda f: self._descartar(nombre, f))
+        return nombre
+
+    def _descartar(self, nombre, futuro):
+        with self._candado:
+            self._pendientes.pop(nombre, None)
+        if self.al_dibujar is not None and not futuro.cancelled() and futuro.exception() is None:
+            self.al_dibujar(futuro.result())
+
+    def disponible(self, nombre):
+        """True si la imagen existe o se está dibujando (no se borró todavía)."""
+        with self._candado:
+            if nombre in self._pendientes:
+                return True
+        return os.path.exists(os.path.join(self.directorio, nombre))
+
+    def esperar(self, nombre, timeout=None):
+        """
+        Espera a que la imagen `nombre` esté lista.
+
+        Returns:
+            bool: True si el archivo existe; False si no se conoce o falló el dibujo.
+
+        Raises:
+            concurrent.futures.TimeoutError: Si el dibujo no terminó a tiempo.
+        """
+        with self._candado:
+            futuro = self._pendientes.get(nombre)
+        if futuro is not None:
+            try:
+                futuro.result(timeout=timeout)
+            except concurrent.futures.TimeoutError:
+                raise
+            except Exception:
+                logger.exception("Error al dibujar %s", nombre)
+                return False
+        return os.path.exists(os.path.join(self.directorio, nombre))
+
+    def _limpiar_si_toca(self):
+        """Llama a `limpiar` cada `ENCOLADOS_ENTRE_LIMPIEZAS` imágenes o `SEGUNDOS_ENTRE_LIMPIEZAS`."""
+        ahora = time.monotonic()
+        with self._candado:
+            self._encolados += 1
+            if (self._encolados < ENCOLADOS_ENTRE_LIMPIEZAS
+                    and ahora - self._ultima_limpieza < SEGUNDOS_ENTRE_LIMPIEZAS):
+                return
+            self._encolados = 0
+            self._ultima_limpieza = ahora
+        self.limpiar()
+
+    def limpiar(self):
+        """
+        Borra imágenes más viejas que `ttl_seg` y las más antiguas que excedan `maximo_imagenes`.
+
+        Solo toca los PNG terminados de esta cola: no los que se están
+        dibujando (ni su archivo temporal, salvo que un proceso de dibujo
+        caído lo haya dejado abandonado más de `ttl_seg`) ni otros archivos
+        de la carpeta.
+        """
+        with self._candado:
+            pendientes = set(self._pendientes)
+        try:
+            entradas = [e for e in os.scandir(self.directorio)
+                        if e.name.startswith(PREFIJO_IMAGEN) and e.name.endswith('.png') and e.is_file()]
+        except FileNotFoundError:
+            return
+        limite = time.time() - self.ttl_seg
+        terminadas = []
+        for entrada in entradas:
+            try:
+                modificada = entrada.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if entrada.name.endswith(SUFIJO_TEMPORAL):
+                if modificada < limite and entrada.name[:-len(SUFIJO_TEMPORAL)] not in pendientes:
+                    self._borrar(entrada.path)
+            elif entrada.name not in pendientes:
+                terminadas.append((modificada, entrada.path))
+        terminadas.sort(reverse=True)
+        for posicion, (modificada, ruta) in enumerate(terminadas):
+            if posicion >= self.maximo_imagenes or modificada < limite:
+                self._borrar(ruta)
+
+    @staticmethod
+    def _borrar(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
@@ -0,0 +1,171 @@
+# ==============================================================================
+# MATRICES DE TIEMPO Y DISTANCIA (MUCHOS A MUCHOS)
+# ==============================================================================
+# Para un despacho con cientos de orígenes y destinos no tiene sentido pedir
+# cada par a /ruta. Aquí se hace una búsqueda de Dijkstra por origen que se
+# detiene al alcanzar todos los destinos, y las filas de la matriz se reparten
+# entre varios procesos. Cada proceso mapea en memoria el mismo snapshot del
+# grafo, así que no se duplica la red por worker, y se pone al día con las
+# anulaciones de tráfico que trae cada tarea (como los de servicio.py).
+#
+# Como /ruta, cada matriz tiene un plazo (`plazo_seg`, después se descartan las
+# filas que falten) y un máximo de matrices en curso (`maximo_pendientes`, la
+# siguiente se rechaza con ColaLlena en lugar de formarse).
+
+import concurrent.futures
+import os
+import threading
+import time
+
+import numpy as np
+
+from motor_rutas import MotorDijkstra
+from servicio import ColaLlena
+from trafico import RedEnVivo
+
+# Por debajo de este número de orígenes no compensa enviar el trabajo a otros procesos.
+MINIMO_ORIGENES_POOL = 8
+# Filas por tarea enviada al pool: bloques pequeños reparten mejor la carga.
+FILAS_POR_TAREA = 4
+# Una matriz de 1000 × 1000 tarda bastante más que una ruta: plazo y cupo propios.
+MAXIMO_MATRICES = 4
+PLAZO_MATRIZ_SEG = 60
+
+_red_worker = None
+
+
+def _motores_matriz(grafo, jerarquia):
+    return {'dijkstra': MotorDijkstra(grafo)}
+
+
+def _inicializar_worker():
+    """Carga el snapshot del grafo (mapeado en memoria) y los pesos de cada perfil en cada proceso del pool."""
+    global _red_worker
+    from red_vial import cargar_perfiles, cargar_red
+
+    _red_worker = RedEnVivo(cargar_perfiles(cargar_red()), _motores_matriz)
+
+
+def _calcular_filas_en_worker(origenes, destinos, perfil, generacion, anulaciones):
+    _red_worker.sincronizar(generacion, anulaciones)
+    return _calcular_filas(_red_worker.estado(perfil).motores['dijkstra'], origenes, destinos)
+
+
+def _calcular_filas(motor, origenes, destinos, limite=None):
+    """
+    Calcula las filas de la matriz para una lista de orígenes.
+
+    Args:
+        limite (float, opcional): Instante de `time.monotonic()` a partir del
+            cual ya no se empieza otra fila.
+
+    Returns:
+        list: Por origen, (tiempos float32, metros float32, milisegundos, nodos asentados).
+
+    Raises:
+        concurrent.futures.TimeoutError: Si se alcanza `limite` antes de terminar.
+    """
+    filas = []
+    for origen in origenes:
+        if limite is not None and time.monotonic() >= limite:
+            raise concurrent.futures.TimeoutError()
+        inicio = time.perf_counter()
+        tiempos, metros = motor.uno_a_muchos(origen, destinos)
+        milisegundos = (time.perf_counter() - inicio) * 1000
+        filas.append((np.array(tiempos, dtype=np.float32), np.array(metros, dtype=np.float32),
+                      milisegundos, motor.ultimas_estadisticas['nodos_asentados']))
+    return filas
+
+
+class CalculadoraMatriz:
+    """
+    Calcula matrices origen × destino de tiempo (s) y distancia (m).
+
+    El pool de procesos se crea la primera vez que se necesita.
+
+    Args:
+        procesos (int): Procesos del pool (por defecto, uno por CPU).
+        maximo_pendientes (int): Matrices en curso a partir de las cuales se
+            rechazan las nuevas.
+        plazo_seg (float): Tiempo máximo de cálculo de cada matriz.
+    """
+
+    def __init__(self, procesos=None, maximo_pendientes=MAXIMO_MATRICES, plazo_seg=PLAZO_MATRIZ_SEG):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.maximo_pendientes = maximo_pendientes
+        self.plazo_seg = plazo_seg
+        self._pool = None
+        self._en_curso = 0
+        self._candado = threading.Lock()
+        self.contadores = {'calculadas': 0, 'rechazadas': 0, 'vencidas': 0}
+
+    def _obtener_pool(self):
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.procesos, initializer=_inicializar_worker)
+        return self._pool
+
+    def calcular(self, origenes, destinos, estado, perfil):
+        """
+        Args:
+            origenes (list): Índices de nodo de los orígenes.
+            destinos (list): Índices de nodo de los destinos.
+            estado (EstadoPerfil): Estado del perfil (pesos con el tráfico
+                vigente) con el que se calcula toda la matriz.
+            perfil (str): Perfil de velocidad de `estado`.
+
+        Returns:
+            dict: 'tiempos' y 'distancias' (np.float32, orígenes × destinos, inf
+                  si no hay ruta), 'ms' y 'nodos_asentados' por origen.
+
+        Raises:
+            ColaLlena: Si ya hay `maximo_pendientes` matrices en curso.
+            concurrent.futures.TimeoutError: Si la matriz no termina en `plazo_seg`.
+        """
+        with self._candado:
+            if self._en_curso >= self.maximo_pendientes:
+                self.contadores['rechazadas'] += 1
+                raise ColaLlena()
+            self._en_curso += 1
+            self.contadores['calculadas'] += 1
+        try:
+            filas = self._calcular_filas(origenes, destinos, estado, perfil, time.monotonic() + self.plazo_seg)
+        except concurrent.futures.TimeoutError:
+            with self._candado:
+                self.contadores['vencidas'] += 1
+            raise
+        finally:
+            with self._candado:
+                self._en_curso -= 1
+
+        forma = (len(origenes), len(destinos))
+        return {
+            'tiempos': np.vstack([f[0] for f in filas]) if filas else np.zeros(forma, dtype=np.float32),
+            'distancias': np.vstack([f[1] for f in filas]) if filas else np.zeros(forma, dtype=np.float32),
+            'ms': np.array([f[2] for f in filas], dtype=np.float32),
+            'nodos_asentados': np.array([f[3] for f in filas], dtype=np.int64),
+        }
+
+    def _calcular_filas(self, origenes, destinos, estado, perfil, limite):
+        origenes, destinos = [int(o) for o in origenes], [int(d) for d in destinos]
+        if len(origenes) < MINIMO_ORIGENES_POOL or self.procesos == 1:
+            return _calcular_filas(estado.motores['dijkstra'], origenes, destinos, limite)
+
+        bloques = [origenes[i:i + FILAS_POR_TAREA] for i in range(0, len(origenes), FILAS_POR_TAREA)]
+        pool = self._obtener_pool()
+        futuros = [pool.submit(_calcular_filas_en_worker, bloque, destinos, perfil,
+                               estado.generacion, estado.anulaciones) for bloque in bloques]
+        try:
+            return [fila for futuro in futuros
+                    for fila in futuro.result(timeout=max(0.0, limite - time.monotonic()))]
+        except concurrent.futures.TimeoutError:
+            # Los bloques que aún no empiezan se descartan para no ocupar el pool.
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+
+    def estadisticas(self):
+        """Contadores de matrices calculadas, rechazadas y vencidas."""
+        with self._candado:
+            return dict(self.contadores, en_curso=self._en_curso, maximo_pendientes=self.maximo_pendientes,
+                        plazo_seg=self.plazo_seg)
@@ -0,0 +1,198 @@
+# ==============================================================================
+# MÉTRICAS DEL SERVIDOR
+# ==============================================================================
+# Histogramas y contadores en memoria que se exponen en el formato de texto de
+# Prometheus (GET /metrics). Cada observación es una búsqueda binaria en los
+# límites del histograma y una suma bajo un candado, así que cuesta lo mismo
+# sin importar cuántas peticiones se hayan medido.
+#
+# Con el registro inactivo (`activo=False`) no se toma ningún tiempo: las
+# peticiones usan el cronómetro nulo, cuyas marcas no hacen nada.
+
+import bisect
+import threading
+import time
+
+# Límites (en segundos) de los histogramas de tiempo: de 0.1 ms a 10 s.
+LIMITES_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_NODOS = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+LIMITES_KM = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50)
+
+
+def _etiquetas(nombres, valores, extra=''):
+    """Texto `{a="x",b="y"}` de una serie; cadena vacía si no tiene etiquetas."""
+    pares = [f'{nombre}="{valor}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """
+    Contador monótono, opcionalmente con etiquetas.
+
+    Args:
+        nombre (str): Nombre de la métrica en /metrics.
+        ayuda (str): Descripción (línea HELP).
+        etiquetas (tuple): Nombres de las etiquetas de cada serie.
+    """
+
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._candado = threading.Lock()
+
+    def incrementar(self, *valores, cantidad=1):
+        with self._candado:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self):
+        with self._candado:
+            series = sorted(self._valores.items())
+        return [f'{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(total)}' for valores, total in series]
+
+
+class Histograma:
+    """
+    Histograma de límites fijos, opcionalmente con etiquetas.
+
+    Args:
+        nombre (str): Nombre de la métrica en /metrics.
+        ayuda (str): Descripción (línea HELP).
+        limites (tuple): Límites superiores de las cubetas, en orden creciente.
+        etiquetas (tuple): Nombres de las etiquetas de cada serie.
+    """
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, limites=LIMITES_SEGUNDOS, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = tuple(limites)
+        self.etiquetas = tuple(etiquetas)
+        # Etiquetas -> [conteos por cubeta (la última es +Inf), suma, total].
+        self._series = {}
+        self._candado = threading.Lock()
+
+    def observar(self, valor, *valores):
+        cubeta = bisect.bisect_left(self.limites, valor)
+        with self._candado:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        with self._candado:
+            series = sorted((valores, (list(conteos), suma, total))
+                            for valores, (conteos, suma, total) in self._series.items())
+        lineas = []
+        for valores, (conteos, suma, total) in series:
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float('inf'),), conteos):
+                acumulado += conteo
+                le = f'le="{_numero(limite)}"'
+                lineas.append(f'{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}')
+            lineas.append(f'{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {total}')
+        return lineas
+
+
+class Registro:
+    """
+    Conjunto de métricas del proceso y su exposición en texto de Prometheus.
+
+    Args:
+        activo (bool): Si es False, `cronometro()` devuelve el cronómetro nulo
+            y quien instrumenta debe omitir las observaciones.
+    """
+
+    def __init__(self, activo=True):
+        self.activo = activo
+        self._metricas = []
+        self._recolectores = []
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre, ayuda, limites=LIMITES_SEGUNDOS, etiquetas=()):
+        metrica = Histograma(nombre, ayuda, limites, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def recolector(self, funcion):
+        """
+        Registra una función que se consulta en cada exposición.
+
+        `funcion()` devuelve tuplas (nombre, tipo, ayuda, valor); sirve para
+        publicar contadores que ya lleva otro componente (la caché, el
+        servicio de rutas) sin duplicarlos.
+        """
+        self._recolectores.append(funcion)
+        return funcion
+
+    def cronometro(self, forzar=False):
+        """Cronómetro para una petición: uno real si el registro está activo o se pide `forzar`."""
+        return Cronometro() if self.activo or forzar else CRONOMETRO_NULO
+
+    def exponer(self):
+        """Texto de todas las métricas en el formato de exposición de Prometheus."""
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            lineas.extend(metrica.exponer())
+        for funcion in self._recolectores:
+            for nombre, tipo, ayuda, valor in funcion():
+                if valor is None:
+                    continue
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                lineas.append(f'{nombre} {_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+class Cronometro:
+    """Acumula, por etapa, el tiempo transcurrido desde la marca anterior."""
+
+    def __init__(self):
+        self.etapas = {}
+        self._ultima = time.perf_counter()
+
+    def __bool__(self):
+        return True
+
+    def marcar(self, etapa):
+        ahora = time.perf_counter()
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + (ahora - self._ultima)
+        self._ultima = ahora
+
+
+class _CronometroNulo:
+    """Cronómetro que no mide nada (registro inactivo)."""
+
+    etapas = {}
+
+    def __bool__(self):
+        return False
+
+    def marcar(self, etapa):
+        pass
+
+
+CRONOMETRO_NULO = _CronometroNulo()
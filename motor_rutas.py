@@ -0,0 +1,785 @@
+# ==============================================================================
+# MOTOR DE RUTAS SOBRE EL GRAFO COMPACTO
+# ==============================================================================
+# Versión de Dijkstra pensada para atender muchas consultas seguidas:
+#   - Usa una cola de prioridad (montículo binario de `heapq`) con borrado
+#     perezoso en lugar de recorrer la lista completa de nodos no visitados.
+#   - Se detiene en cuanto se asienta el nodo destino.
+#   - Reutiliza los arreglos de distancias y predecesores entre consultas;
+#     solo se limpian las posiciones que la consulta anterior tocó.
+
+import heapq
+import math
+import threading
+
+# Radio terrestre (m) que usa OSMnx para calcular el atributo 'length'.
+RADIO_TIERRA_M = 6_371_009
+
+# Rutas alternativas (ver `MotorDijkstra.rutas_alternativas`): cuánto más
+# pueden tardar que la óptima, qué fracción de su tiempo pueden compartir con
+# otra ruta ya elegida y qué fracción del tiempo óptimo debe cubrir su meseta.
+ESTIRAMIENTO_ALTERNATIVAS = 0.25
+SOLAPAMIENTO_ALTERNATIVAS = 0.6
+MESETA_MINIMA_ALTERNATIVAS = 0.2
+
+
+def distancia_haversine(lat1, lon1, lat2, lon2):
+    """Distancia en metros sobre la esfera entre dos puntos dados en grados."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * RADIO_TIERRA_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def calcular_rumbo(lat1, lon1, lat2, lon2):
+    """
+    Rumbo inicial (0-360°, 0 = norte) de un punto a otro.
+
+    Es la misma fórmula que `ox.bearing.calculate_bearing`.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlambda = math.radians(lon2 - lon1)
+    y = math.sin(dlambda) * math.cos(phi2)
+    x = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+def estadisticas_busqueda(asentados, obsoletas, *monticulos):
+    """
+    Contadores de una búsqueda a partir de lo que ya se lleva en el bucle.
+
+    Toda entrada insertada en un montículo se extrajo (asentando su nodo o
+    descartándose por obsoleta), se desechó al terminar la búsqueda o sigue en
+    él, así que las inserciones se obtienen sin contarlas una por una.
+    """
+    return {'nodos_asentados': asentados,
+            'inserciones_monticulo': asentados + obsoletas + sum(map(len, monticulos))}
+
+
+# Implementación original del proyecto sobre el MultiDiGraph de NetworkX (sin
+# importarlo: basta con `nodes`, `neighbors` y `graph[u][v]`). Queda como
+# referencia para los benchmarks que comparan contra `MotorDijkstra`.
+def dijkstra_personalizado(graph, start_node, end_node):
+    """
+    Implementación adaptada del algoritmo de Dijkstra.
+
+    Encuentra la ruta más corta (basada en el peso 'tiempo_viaje_seg') desde un
+    nodo de inicio a un nodo de fin en un grafo de NetworkX.
+
+    Args:
+        graph (networkx.Graph): El grafo de OSMnx/NetworkX que representa la red de calles.
+        start_node: El ID del nodo de inicio de la ruta.
+        end_node: El ID del nodo de destino de la ruta.
+
+    Returns:
+        tuple: Una tupla que contiene:
+               - La lista de nodos de la ruta óptima.
+               - El costo total (tiempo en segundos) de esa ruta.
+               Devuelve (None, math.inf) si no se encuentra una ruta.
+    """
+    # 2.1. Inicialización de estructuras de datos
+    # 'distancias' guarda el costo mínimo conocido para llegar a cada nodo desde el inicio.
+    distancias = {node: math.inf for node in graph.nodes}
+    distancias[start_node] = 0
+    # 'nodos_anteriores' permite reconstruir el camino guardando el "paso anterior" para cada nodo.
+    nodos_anteriores = {node: None for node in graph.nodes}
+    # 'nodos_no_visitados' es la lista de todos los nodos que aún no hemos procesado.
+    nodos_no_visitados = list(graph.nodes)
+
+    # 2.2. Bucle principal del algoritmo
+    # El bucle se ejecuta mientras queden nodos por visitar.
+    while nodos_no_visitados:
+        # Encuentra el nodo no visitado con la distancia más corta acumulada.
+        dis_min = math.inf
+        nodo_actual = None
+        for nodo in nodos_no_visitados:
+            if distancias[nodo] < dis_min:
+                dis_min = distancias[nodo]
+                nodo_actual = nodo
+        
+        # Si hemos llegado al nodo final, la ruta está encontrada.
+        if nodo_actual == end_node:
+            ruta = []
+            temp_nodo = end_node
+            # Reconstruimos la ruta hacia atrás, desde el final hasta el principio.
+            while temp_nodo is not None:
+                ruta.append(temp_nodo)
+                temp_nodo = nodos_anteriores[temp_nodo]
+            return ruta[::-1], distancias[end_node] # Devolvemos la ruta en orden y el costo final.
+
+        # Si el nodo más cercano es inalcanzable, no hay más caminos posibles.
+        if nodo_actual is None:
+            break
+
+        # 2.3. Exploración de vecinos
+        # Para el nodo actual, revisamos todos sus vecinos directos.
+        for vecino in graph.neighbors(nodo_actual):
+            # Obtenemos el "peso" de la calle entre el nodo actual y su vecino. Si hay
+            # varias calles paralelas entre los dos nodos, se toma la más rápida.
+            peso = min(datos.get('tiempo_viaje_seg', math.inf) for datos in graph[nodo_actual][vecino].values())
+            # Calculamos la nueva distancia posible pasando por el nodo actual.
+            nueva_distancia = distancias[nodo_actual] + peso
+            
+            # Se actualiza si este nuevo camino es más corto que el que ya conocíamos.
+            if nueva_distancia < distancias[vecino]:
+                distancias[vecino] = nueva_distancia
+                nodos_anteriores[vecino] = nodo_actual
+        
+        # Marcamos el nodo actual como "visitado" para no procesarlo de nuevo.
+        nodos_no_visitados.remove(nodo_actual)
+            
+    # Si el bucle termina sin haber llegado al 'end_node', no existe una ruta.
+    return None, math.inf
+
+
+class _Buferes:
+    """Distancias, aristas previas y nodos tocados de una dirección de búsqueda."""
+
+    __slots__ = ('distancias', 'aristas_previas', 'tocados')
+
+    def __init__(self, n):
+        self.distancias = [math.inf] * n
+        self.aristas_previas = [-1] * n
+        self.tocados = []
+
+    def limpiar(self):
+        distancias, aristas_previas = self.distancias, self.aristas_previas
+        for nodo in self.tocados:
+            distancias[nodo] = math.inf
+            aristas_previas[nodo] = -1
+        self.tocados.clear()
+
+
+class MotorDijkstra:
+    """
+    Motor de Dijkstra con montículo sobre un `GrafoCSR`.
+
+    Cada hilo del servidor obtiene sus propios búferes de trabajo, por lo que
+    una misma instancia puede atender peticiones concurrentes.
+    """
+
+    def __init__(self, grafo):
+        self.grafo = grafo
+        # Las vistas de memoria devuelven enteros y flotantes de Python al
+        # indexarlas, lo que es mucho más rápido que indexar el arreglo de NumPy.
+        self._offsets = memoryview(grafo.offsets)
+        self._origenes = memoryview(grafo.origenes)
+        self._destinos = memoryview(grafo.destinos)
+        self._pesos = memoryview(grafo.pesos)
+        self._longitudes = memoryview(grafo.longitudes)
+        self._offsets_inv = memoryview(grafo.offsets_inv)
+        self._aristas_inv = memoryview(grafo.aristas_inv)
+        self._local = threading.local()
+
+    def _buferes(self, cantidad=1):
+        """Devuelve `cantidad` juegos de búferes del hilo actual, limpios para una nueva consulta."""
+        buferes = getattr(self._local, 'buferes', None)
+        if buferes is None:
+            buferes = self._local.buferes = []
+        while len(buferes) < cantidad:
+            buferes.append(_Buferes(self.grafo.num_nodos))
+        for bufer in buferes[:cantidad]:
+            bufer.limpiar()
+        return buferes[:cantidad]
+
+    @property
+    def ultimas_estadisticas(self):
+        """Contadores de la última consulta hecha desde el hilo actual."""
+        return getattr(self._local, 'estadisticas', {})
+
+    def _ids_osm(self, indices):
+        ids = self.grafo.ids_nodos
+        return [int(ids[i]) for i in indices]
+
+    def _reconstruir_ruta(self, aristas_previas, destino):
+        """Recorre las aristas previas desde el destino y devuelve los índices en orden."""
+        ruta = [destino]
+        arista = aristas_previas[destino]
+        while arista != -1:
+            nodo = self._origenes[arista]
+            ruta.append(nodo)
+            arista = aristas_previas[nodo]
+        return ruta[::-1]
+
+    def ruta_mas_corta(self, start_node, end_node):
+        """
+        Encuentra la ruta más rápida entre dos nodos de OSM.
+
+        Args:
+            start_node: El ID de OSM del nodo de inicio de la ruta.
+            end_node: El ID de OSM del nodo de destino de la ruta.
+
+        Returns:
+            tuple: Igual que `dijkstra_personalizado`: la lista de nodos (IDs de
+                   OSM) de la ruta óptima y su costo total en segundos, o
+                   (None, math.inf) si no existe una ruta.
+        """
+        indice = self.grafo.indice
+        origen = indice[start_node]
+        destino = indice[end_node]
+
+        (bufer,) = self._buferes()
+        distancias, aristas_previas, tocados = bufer.distancias, bufer.aristas_previas, bufer.tocados
+        offsets, destinos, pesos = self._offsets, self._destinos, self._pesos
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        distancias[origen] = 0.0
+        tocados.append(origen)
+        monticulo = [(0.0, origen)]
+        asentados = obsoletas = 0
+
+        while monticulo:
+            distancia, nodo = heappop(monticulo)
+            # Borrado perezoso: la entrada quedó obsoleta si ya se encontró algo mejor.
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            asentados += 1
+            if nodo == destino:
+                break
+            for arista in range(offsets[nodo], offsets[nodo + 1]):
+                vecino = destinos[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    aristas_previas[vecino] = arista
+                    heappush(monticulo, (nueva_distancia, vecino))
+        else:
+            self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo)
+            return None, math.inf
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo)
+        return self._ids_osm(self._reconstruir_ruta(aristas_previas, destino)), distancias[destino]
+
+    def _sentidos(self, arista, fraccion):
+        """Pares (arista, fracción) de un punto sobre una calle, en cada sentido en que se puede recorrer."""
+        sentidos = [(arista, fraccion)]
+        gemela = self.grafo.gemela(arista)
+        if gemela != -1:
+            sentidos.append((gemela, 1.0 - fraccion))
+        return sentidos
+
+    def ruta_entre_puntos(self, origen, destino):
+        """
+        Ruta más rápida entre dos puntos situados a media calle.
+
+        Cada punto es una arista y la fracción de su longitud en la que está
+        (ver `IndiceEspacial.ajustar_a_calles`). La búsqueda arranca desde
+        ambos extremos de la calle de origen, cada uno con el costo de la
+        parte de la calle que falta recorrer para llegar a él (el extremo
+        opuesto solo si la calle es de doble sentido), y termina en el punto
+        de destino sumando la parte recorrida de su calle, con lo que el
+        costo no se redondea al nodo más cercano.
+
+        Args:
+            origen, destino (tuple): (índice de arista, fracción en [0, 1]).
+
+        Returns:
+            tuple: (nodos, costo, extremos): los IDs de OSM de la ruta, desde
+                   el inicio de la primera arista recorrida hasta el final de
+                   la última; su costo en segundos; y (fracción de la primera
+                   arista en la que empieza, fracción de la última en la que
+                   termina). (None, math.inf, None) si no hay ruta.
+        """
+        (bufer,) = self._buferes()
+        distancias, aristas_previas, tocados = bufer.distancias, bufer.aristas_previas, bufer.tocados
+        offsets, origenes, destinos, pesos = self._offsets, self._origenes, self._destinos, self._pesos
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        salidas = self._sentidos(*origen)
+        llegadas = self._sentidos(*destino)
+        # Mismo tramo de calle y en el sentido de la arista: no hace falta buscar.
+        mejor, final = math.inf, None
+        for arista, inicio in salidas:
+            for arista_destino, fin in llegadas:
+                if arista == arista_destino and inicio <= fin and (fin - inicio) * pesos[arista] < mejor:
+                    mejor, final = (fin - inicio) * pesos[arista], (None, arista, inicio, fin)
+
+        # Semillas (nodo, costo, arista por la que se llega). En la punta de
+        # una calle el punto es el propio nodo y se puede salir por cualquiera
+        # de sus aristas; de igual modo se puede llegar a él por cualquiera.
+        semillas = {}
+        arranques = []
+        for arista, inicio in salidas:
+            semillas[arista] = inicio
+            arranques.append((destinos[arista], (1.0 - inicio) * pesos[arista], arista))
+            if inicio == 0.0:
+                arranques.append((origenes[arista], 0.0, -1))
+        monticulo = []
+        for nodo, costo, arista in arranques:
+            if costo < distancias[nodo]:
+                if distancias[nodo] == math.inf:
+                    tocados.append(nodo)
+                distancias[nodo] = costo
+                aristas_previas[nodo] = arista
+                heappush(monticulo, (costo, nodo))
+        # Nodo -> llegadas (arista que se recorre en parte, o None si el punto es el nodo).
+        metas = {}
+        for arista, fin in llegadas:
+            metas.setdefault(origenes[arista], []).append((arista, fin))
+            if fin == 1.0:
+                metas.setdefault(destinos[arista], []).append((None, fin))
+        asentados = obsoletas = 0
+
+        while monticulo:
+            distancia, nodo = heappop(monticulo)
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            # Ningún nodo que falte por asentar puede mejorar la mejor llegada.
+            if distancia >= mejor:
+                break
+            asentados += 1
+            for arista, fin in metas.get(nodo, ()):
+                costo = distancia if arista is None else distancia + fin * pesos[arista]
+                if costo < mejor:
+                    mejor, final = costo, (nodo, arista, None, fin)
+            for arista in range(offsets[nodo], offsets[nodo + 1]):
+                vecino = destinos[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    aristas_previas[vecino] = arista
+                    heappush(monticulo, (nueva_distancia, vecino))
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo)
+        if final is None:
+            return None, math.inf, None
+        nodo, arista_final, inicio, fin = final
+        if nodo is None:
+            return self._ids_osm([origenes[arista_final], destinos[arista_final]]), mejor, (inicio, fin)
+        # Se recorren las aristas previas hasta la calle de origen, o hasta el
+        # nodo de origen si el punto estaba en la punta de la calle.
+        ruta = [nodo] if arista_final is None else [destinos[arista_final], nodo]
+        inicio = 0.0
+        arista = aristas_previas[nodo]
+        while arista != -1:
+            ruta.append(origenes[arista])
+            if arista in semillas:
+                inicio = semillas[arista]
+                break
+            arista = aristas_previas[origenes[arista]]
+        return self._ids_osm(ruta[::-1]), mejor, (inicio, fin)
+
+
+    def uno_a_muchos(self, origen, destinos):
+        """
+        Tiempos y distancias desde un nodo hacia varios destinos con una sola búsqueda.
+
+        La búsqueda se detiene en cuanto todos los destinos quedan asentados.
+
+        Args:
+            origen (int): Índice del nodo de origen.
+            destinos (list): Índices de los nodos de destino.
+
+        Returns:
+            tuple: (tiempos en segundos, distancias en metros), listas en el
+                   mismo orden que `destinos`; math.inf si no hay ruta.
+        """
+        (bufer,) = self._buferes()
+        distancias, aristas_previas, tocados = bufer.distancias, bufer.aristas_previas, bufer.tocados
+        offsets, destinos_csr, pesos = self._offsets, self._destinos, self._pesos
+        longitudes = self._longitudes
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        pendientes = set(destinos)
+        # Metros recorridos por la ruta más rápida (no la más corta) a cada nodo.
+        metros = {origen: 0.0}
+        distancias[origen] = 0.0
+        tocados.append(origen)
+        monticulo = [(0.0, origen)]
+        asentados = obsoletas = 0
+
+        while monticulo and pendientes:
+            distancia, nodo = heappop(monticulo)
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            asentados += 1
+            pendientes.discard(nodo)
+            metros_nodo = metros[nodo]
+            for arista in range(offsets[nodo], offsets[nodo + 1]):
+                vecino = destinos_csr[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    aristas_previas[vecino] = arista
+                    metros[vecino] = metros_nodo + longitudes[arista]
+                    heappush(monticulo, (nueva_distancia, vecino))
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo)
+        tiempos = [distancias[d] for d in destinos]
+        return tiempos, [metros[d] if t < math.inf else math.inf for d, t in zip(destinos, tiempos)]
+
+    def desde_muchos(self, origenes, destino):
+        """
+        Tiempos desde varios nodos hacia un mismo destino con una sola búsqueda.
+
+        Es `uno_a_muchos` en reversa (sobre las aristas que llegan a cada
+        nodo), sin las distancias en metros.
+
+        Args:
+            origenes (list): Índices de los nodos de origen.
+            destino (int): Índice del nodo de destino.
+
+        Returns:
+            list: Tiempos en segundos, en el orden de `origenes`; math.inf si no hay ruta.
+        """
+        (bufer,) = self._buferes()
+        distancias, tocados = bufer.distancias, bufer.tocados
+        offsets_inv, aristas_inv, origenes_csr, pesos = self._offsets_inv, self._aristas_inv, self._origenes, self._pesos
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        pendientes = set(origenes)
+        distancias[destino] = 0.0
+        tocados.append(destino)
+        monticulo = [(0.0, destino)]
+        asentados = obsoletas = 0
+
+        while monticulo and pendientes:
+            distancia, nodo = heappop(monticulo)
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            asentados += 1
+            pendientes.discard(nodo)
+            for k in range(offsets_inv[nodo], offsets_inv[nodo + 1]):
+                arista = aristas_inv[k]
+                vecino = origenes_csr[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    heappush(monticulo, (nueva_distancia, vecino))
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo)
+        return [distancias[o] for o in origenes]
+
+    def alcanzables(self, origen, limite_seg):
+        """
+        Nodos a los que se llega desde `origen` en a lo sumo `limite_seg` segundos.
+
+        Es una sola búsqueda que se corta en cuanto el siguiente nodo del
+        montículo queda fuera del presupuesto de tiempo.
+
+        Args:
+            origen (int): Índice del nodo de origen.
+            limite_seg (float): Tiempo máximo de viaje.
+
+        Returns:
+            tuple: (índices de los nodos, tiempo de llegada a cada uno en
+                   segundos), en el orden en que se asentaron.
+        """
+        (bufer,) = self._buferes()
+        distancias, tocados = bufer.distancias, bufer.tocados
+        offsets, destinos, pesos = self._offsets, self._destinos, self._pesos
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        distancias[origen] = 0.0
+        tocados.append(origen)
+        monticulo = [(0.0, origen)]
+        obsoletas = 0
+        nodos, tiempos = [], []
+
+        while monticulo:
+            distancia, nodo = heappop(monticulo)
+            if distancia > limite_seg:
+                monticulo.append((distancia, nodo))
+                break
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            nodos.append(nodo)
+            tiempos.append(distancia)
+            for arista in range(offsets[nodo], offsets[nodo + 1]):
+                vecino = destinos[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    heappush(monticulo, (nueva_distancia, vecino))
+
+        self._local.estadisticas = estadisticas_busqueda(len(nodos), obsoletas, monticulo)
+        return nodos, tiempos
+
+    def _arbol_acotado(self, bufer, raiz, objetivo, estiramiento, reverso=False):
+        """
+        Árbol de rutas más rápidas desde `raiz` (o hacia ella, si `reverso`).
+
+        La búsqueda sigue después de asentar `objetivo` hasta que el siguiente
+        nodo del montículo pasa de (1 + estiramiento) veces su tiempo: así
+        quedan asentados todos los nodos por los que puede pasar una ruta
+        alternativa aceptable. Deja distancias y aristas previas en `bufer`
+        (en reversa, la arista previa de un nodo es la que sale de él hacia
+        la raíz).
+
+        Returns:
+            tuple: (nodos asentados, entradas obsoletas, montículo restante).
+        """
+        distancias, aristas_previas, tocados = bufer.distancias, bufer.aristas_previas, bufer.tocados
+        if reverso:
+            offsets, aristas_inv, vecinos = self._offsets_inv, self._aristas_inv, self._origenes
+        else:
+            offsets, vecinos = self._offsets, self._destinos
+        pesos = self._pesos
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        distancias[raiz] = 0.0
+        tocados.append(raiz)
+        monticulo = [(0.0, raiz)]
+        asentados = obsoletas = 0
+        limite = math.inf
+
+        while monticulo:
+            distancia, nodo = heappop(monticulo)
+            if distancia > limite:
+                monticulo.append((distancia, nodo))
+                break
+            if distancia > distancias[nodo]:
+                obsoletas += 1
+                continue
+            asentados += 1
+            if nodo == objetivo:
+                limite = distancia * (1 + estiramiento)
+            for k in range(offsets[nodo], offsets[nodo + 1]):
+                arista = aristas_inv[k] if reverso else k
+                vecino = vecinos[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias[vecino]:
+                    if distancias[vecino] == math.inf:
+                        tocados.append(vecino)
+                    distancias[vecino] = nueva_distancia
+                    aristas_previas[vecino] = arista
+                    heappush(monticulo, (nueva_distancia, vecino))
+        return asentados, obsoletas, monticulo
+
+    def rutas_alternativas(self, start_node, end_node, maximo=3, estiramiento=ESTIRAMIENTO_ALTERNATIVAS,
+                           solapamiento=SOLAPAMIENTO_ALTERNATIVAS, meseta_minima=MESETA_MINIMA_ALTERNATIVAS):
+        """
+        La ruta más rápida y hasta `maximo - 1` alternativas, con dos búsquedas.
+
+        Método de mesetas: se calcula el árbol de rutas más rápidas desde el
+        origen y el árbol hacia el destino (en reversa), ambos acotados a
+        (1 + estiramiento) veces el tiempo óptimo. Una meseta es un tramo de
+        aristas que está en los dos árboles; por cada meseta hay una ruta
+        origen -> inicio de la meseta -> fin de la meseta -> destino, óptima en
+        cada una de sus partes. Las mesetas largas dan rutas razonables (no
+        hacen rodeos locales), así que se prueban de la más larga a la más
+        corta y se aceptan las que no se parecen demasiado a las ya elegidas.
+
+        Args:
+            start_node, end_node: IDs de OSM del origen y del destino.
+            maximo (int): Rutas que se devuelven como máximo (contando la óptima).
+            estiramiento (float): Una alternativa tarda a lo sumo
+                (1 + estiramiento) veces lo que la ruta óptima.
+            solapamiento (float): Fracción máxima del tiempo de una alternativa
+                que puede compartir con cada ruta ya elegida.
+            meseta_minima (float): Fracción mínima del tiempo óptimo que debe
+                cubrir la meseta de una alternativa.
+
+        Returns:
+            list: Pares (lista de IDs de OSM, costo en segundos); la óptima
+                  primero. Vacía si no existe una ruta.
+        """
+        indice = self.grafo.indice
+        origen = indice[start_node]
+        destino = indice[end_node]
+        adelante, atras = self._buferes(2)
+        asentados_f, obsoletas_f, monticulo_f = self._arbol_acotado(adelante, origen, destino, estiramiento)
+        optimo = adelante.distancias[destino]
+        if optimo == math.inf:
+            self._local.estadisticas = estadisticas_busqueda(asentados_f, obsoletas_f, monticulo_f)
+            return []
+        asentados_r, obsoletas_r, monticulo_r = self._arbol_acotado(atras, destino, origen, estiramiento, reverso=True)
+        self._local.estadisticas = estadisticas_busqueda(
+            asentados_f + asentados_r, obsoletas_f + obsoletas_r, monticulo_f, monticulo_r)
+
+        dist_f, previas_f = adelante.distancias, adelante.aristas_previas
+        dist_r, previas_r = atras.distancias, atras.aristas_previas
+        origenes, destinos, pesos = self._origenes, self._destinos, self._pesos
+        limite = optimo * (1 + estiramiento)
+
+        def en_meseta(arista):
+            return arista != -1 and previas_f[destinos[arista]] == arista and previas_r[origenes[arista]] == arista
+
+        # Cada meseta empieza en un nodo del que sale una arista de meseta y al
+        # que no llega ninguna.
+        mesetas = []
+        for nodo in adelante.tocados:
+            if dist_f[nodo] + dist_r[nodo] > limite or not en_meseta(previas_r[nodo]) or en_meseta(previas_f[nodo]):
+                continue
+            duracion, arista = 0.0, previas_r[nodo]
+            while en_meseta(arista):
+                duracion += pesos[arista]
+                arista = previas_r[destinos[arista]]
+            mesetas.append((duracion, nodo))
+        mesetas.sort(reverse=True)
+
+        def aristas_via(nodo):
+            """Aristas de la ruta origen -> nodo (árbol de ida) -> destino (árbol de vuelta)."""
+            ida = []
+            arista = previas_f[nodo]
+            while arista != -1:
+                ida.append(arista)
+                arista = previas_f[origenes[arista]]
+            vuelta = []
+            arista = previas_r[nodo]
+            while arista != -1:
+                vuelta.append(arista)
+                arista = previas_r[destinos[arista]]
+            return ida[::-1] + vuelta
+
+        elegidas = [aristas_via(destino)]
+        costos = [optimo]
+        for duracion, inicio in mesetas:
+            if len(elegidas) >= maximo or duracion < meseta_minima * optimo:
+                break
+            aristas = aristas_via(inicio)
+            nodos = [origenes[a] for a in aristas] + [destino]
+            if len(set(nodos)) < len(nodos):
+                continue  # La ida y la vuelta se cruzan: la ruta tendría un ciclo.
+            costo = dist_f[inicio] + dist_r[inicio]
+            if all(sum(pesos[a] for a in set(aristas).intersection(otra)) <= solapamiento * costo for otra in elegidas):
+                elegidas.append(aristas)
+                costos.append(costo)
+
+        return [(self._ids_osm([origenes[a] for a in aristas] + [destino]), costo)
+                for aristas, costo in zip(elegidas, costos)]
+
+
+class MotorAStarBidireccional(MotorDijkstra):
+    """
+    A* bidireccional sobre un `GrafoCSR`.
+
+    La heurística es la distancia de círculo máximo dividida entre la velocidad
+    más alta del grafo: ninguna calle se recorre más rápido que eso, así que
+    nunca sobreestima el tiempo restante. Para que ambas búsquedas usen costos
+    reducidos consistentes se emplea el potencial promedio
+    p(v) = (h_destino(v) - h_origen(v)) / 2; la búsqueda hacia adelante ordena
+    por d(v) + p(v) y la de reversa por d(v) - p(v). Con eso se puede parar en
+    cuanto la suma de los dos mínimos alcanza el mejor costo encontrado.
+    """
+
+    # Margen para que el redondeo de 'length' no vuelva la heurística inadmisible.
+    MARGEN_VELOCIDAD = 1.001
+
+    def __init__(self, grafo):
+        super().__init__(grafo)
+        self._x = memoryview(grafo.x)
+        self._y = memoryview(grafo.y)
+        velocidad = grafo.velocidad_maxima_ms() * self.MARGEN_VELOCIDAD
+        self._inversa_velocidad = 1 / velocidad if 0 < velocidad < math.inf else 0.0
+
+    def ruta_mas_corta(self, start_node, end_node):
+        """
+        Encuentra la ruta más rápida entre dos nodos de OSM.
+
+        Args:
+            start_node: El ID de OSM del nodo de inicio de la ruta.
+            end_node: El ID de OSM del nodo de destino de la ruta.
+
+        Returns:
+            tuple: La lista de nodos (IDs de OSM) de la ruta óptima y su costo
+                   total en segundos, o (None, math.inf) si no existe una ruta.
+        """
+        indice = self.grafo.indice
+        origen = indice[start_node]
+        destino = indice[end_node]
+        if origen == destino:
+            self._local.estadisticas = {'nodos_asentados': 1, 'inserciones_monticulo': 1}
+            return [start_node], 0.0
+
+        adelante, atras = self._buferes(2)
+        dist_f, previas_f, tocados_f = adelante.distancias, adelante.aristas_previas, adelante.tocados
+        dist_r, previas_r, tocados_r = atras.distancias, atras.aristas_previas, atras.tocados
+        offsets, destinos, pesos = self._offsets, self._destinos, self._pesos
+        offsets_inv, aristas_inv, origenes = self._offsets_inv, self._aristas_inv, self._origenes
+        xs, ys, inversa_velocidad = self._x, self._y, self._inversa_velocidad
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        lat_o, lon_o = ys[origen], xs[origen]
+        lat_d, lon_d = ys[destino], xs[destino]
+        potenciales = {}
+
+        def potencial(nodo):
+            p = potenciales.get(nodo)
+            if p is None:
+                lat, lon = ys[nodo], xs[nodo]
+                p = potenciales[nodo] = 0.5 * inversa_velocidad * (
+                    distancia_haversine(lat, lon, lat_d, lon_d) - distancia_haversine(lat_o, lon_o, lat, lon))
+            return p
+
+        dist_f[origen] = 0.0
+        tocados_f.append(origen)
+        dist_r[destino] = 0.0
+        tocados_r.append(destino)
+        monticulo_f = [(potencial(origen), 0.0, origen)]
+        monticulo_r = [(-potencial(destino), 0.0, destino)]
+        mejor_costo = math.inf
+        encuentro = -1
+        asentados = obsoletas = 0
+        hacia_adelante = True
+
+        while monticulo_f and monticulo_r:
+            if monticulo_f[0][0] + monticulo_r[0][0] >= mejor_costo:
+                break
+            if hacia_adelante:
+                _, distancia, nodo = heappop(monticulo_f)
+                if distancia <= dist_f[nodo]:
+                    asentados += 1
+                    for arista in range(offsets[nodo], offsets[nodo + 1]):
+                        vecino = destinos[arista]
+                        nueva_distancia = distancia + pesos[arista]
+                        if nueva_distancia < dist_f[vecino]:
+                            if dist_f[vecino] == math.inf:
+                                tocados_f.append(vecino)
+                            dist_f[vecino] = nueva_distancia
+                            previas_f[vecino] = arista
+                            heappush(monticulo_f, (nueva_distancia + potencial(vecino), nueva_distancia, vecino))
+                            if nueva_distancia + dist_r[vecino] < mejor_costo:
+                                mejor_costo = nueva_distancia + dist_r[vecino]
+                                encuentro = vecino
+                else:
+                    obsoletas += 1
+            else:
+                _, distancia, nodo = heappop(monticulo_r)
+                if distancia <= dist_r[nodo]:
+                    asentados += 1
+                    for k in range(offsets_inv[nodo], offsets_inv[nodo + 1]):
+                        arista = aristas_inv[k]
+                        vecino = origenes[arista]
+                        nueva_distancia = distancia + pesos[arista]
+                        if nueva_distancia < dist_r[vecino]:
+                            if dist_r[vecino] == math.inf:
+                                tocados_r.append(vecino)
+                            dist_r[vecino] = nueva_distancia
+                            previas_r[vecino] = arista
+                            heappush(monticulo_r, (nueva_distancia - potencial(vecino), nueva_distancia, vecino))
+                            if nueva_distancia + dist_f[vecino] < mejor_costo:
+                                mejor_costo = nueva_distancia + dist_f[vecino]
+                                encuentro = vecino
+                else:
+                    obsoletas += 1
+            hacia_adelante = not hacia_adelante
+
+        self._local.estadisticas = estadisticas_busqueda(asentados, obsoletas, monticulo_f, monticulo_r)
+        if encuentro == -1:
+            return None, math.inf
+
+        # La mitad hacia adelante sale de las aristas previas; la otra mitad se
+        # completa siguiendo las aristas de la búsqueda en reversa hasta el destino.
+        ruta = self._reconstruir_ruta(previas_f, encuentro)
+        nodo = encuentro
+        while previas_r[nodo] != -1:
+            nodo = destinos[previas_r[nodo]]
+            ruta.append(nodo)
+        return self._ids_osm(ruta), mejor_costo
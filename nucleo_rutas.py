@@ -0,0 +1,184 @@
+# ==============================================================================
+# NÚCLEO DE RUTAS (SOLO BIBLIOTECA ESTÁNDAR Y NUMPY)
+# ==============================================================================
+# Todo lo necesario para calcular rutas a partir de un snapshot ya construido:
+# cargar el grafo compacto, ajustar coordenadas a la red y buscar con
+# `MotorDijkstra`. No importa Flask, OSMnx, NetworkX, Folium ni Matplotlib, así
+# que un proceso que solo calcula rutas (rutas_lote.py, una herramienta, una
+# prueba) arranca en una fracción del tiempo de app.py.
+#
+# Con una red partida en regiones (construir_regiones.py), `NucleoRegional`
+# calcula las mismas rutas cargando solo las regiones que cada consulta toca.
+#
+# Nunca descarga el mapa: si no hay snapshot, se construye antes con
+# construir_snapshot.py (en una máquina con OSMnx) y se copia la carpeta.
+
+import json
+import os
+from importlib.metadata import PackageNotFoundError
+
+import numpy as np
+
+from grafo_compacto import GrafoCSR, fracciones_recorridas
+from indice_espacial import IndiceEspacial, PuntoFueraDeArea
+from motor_rutas import MotorDijkstra
+from perfiles_velocidad import PERFIL_POR_DEFECTO, PERFILES, VELOCIDAD_ESTANDAR_KMH
+import red_vial
+from regiones import DIRECTORIO_REGIONES, PRESUPUESTO_REGIONES_MB, RedRegional
+
+
+def localizar_snapshot(directorio=red_vial.DIRECTORIO_SNAPSHOTS):
+    """
+    Carpeta del snapshot que corresponde a la configuración actual de red_vial.py.
+
+    La clave del snapshot incluye la versión de OSMnx. Si OSMnx no está
+    instalado (un proceso que solo calcula rutas no lo necesita), se elige el
+    snapshot más reciente cuyo meta.json coincide en lo demás: formato,
+    lugares, tipo de red y velocidad estándar.
+
+    Returns:
+        str: Ruta de la carpeta del snapshot.
+
+    Raises:
+        FileNotFoundError: Si no hay un snapshot compatible en `directorio`.
+    """
+    try:
+        ruta = os.path.join(directorio, red_vial.clave_snapshot())
+        if os.path.isdir(ruta):
+            return ruta
+    except PackageNotFoundError:
+        pass
+
+    esperado = {'formato': red_vial.FORMATO_SNAPSHOT, 'places': red_vial.places,
+                'network_type': red_vial.TIPO_RED, 'velocidad_estandar_kmh': VELOCIDAD_ESTANDAR_KMH}
+    candidatos = []
+    for entrada in os.scandir(directorio) if os.path.isdir(directorio) else ():
+        try:
+            with open(os.path.join(entrada.path, 'meta.json'), encoding='utf-8') as archivo:
+                meta = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        if all(meta.get(campo) == valor for campo, valor in esperado.items()):
+            candidatos.append((meta.get('creado', ''), entrada.path))
+    if not candidatos:
+        raise FileNotFoundError(
+            f"No hay un snapshot del grafo para la configuración actual en '{directorio}'; "
+            f"constrúyelo con construir_snapshot.py.")
+    return max(candidatos)[1]
+
+
+class NucleoRutas:
+    """
+    Grafo, índice espacial y motor de Dijkstra de un perfil de velocidad.
+
+    Args:
+        grafo (GrafoCSR): Grafo con los pesos del snapshot.
+        perfil (str): Perfil de velocidad (ver perfiles_velocidad.py).
+        ruta_snapshot (str): Carpeta del snapshot; si se da, se reutilizan los
+            pesos del perfil que app.py ya guardó en ella.
+    """
+
+    def __init__(self, grafo, perfil=PERFIL_POR_DEFECTO, ruta_snapshot=None):
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil desconocido: '{perfil}'. Opciones: {', '.join(PERFILES)}.")
+        if perfil != PERFIL_POR_DEFECTO:
+            archivo = ruta_snapshot and os.path.join(
+                ruta_snapshot, red_vial.CARPETA_PERFILES, f'{perfil}-{PERFILES[perfil].huella()}.npy')
+            if archivo and os.path.exists(archivo):
+                grafo = grafo.con_pesos(np.load(archivo, mmap_mode='r'))
+            else:
+                grafo = grafo.con_pesos(PERFILES[perfil].pesos_grafo(grafo))
+        self.grafo = grafo
+        self.perfil = perfil
+        self.indice_espacial = IndiceEspacial(grafo)
+        self.motor = MotorDijkstra(grafo)
+
+    @classmethod
+    def desde_snapshot(cls, ruta=None, perfil=PERFIL_POR_DEFECTO):
+        """Carga el snapshot `ruta` (por defecto, el de `localizar_snapshot`)."""
+        ruta = ruta or localizar_snapshot()
+        return cls(GrafoCSR.cargar(ruta), perfil, ruta)
+
+    def ruta(self, origen_lat, origen_lon, destino_lat, destino_lon, a_arista=False):
+        """
+        Ruta más rápida entre dos coordenadas.
+
+        Args:
+            a_arista (bool): Si es True, cada punto se proyecta sobre la calle
+                más cercana y la ruta empieza y termina a media calle (ver
+                `MotorDijkstra.ruta_entre_puntos`); si no, en el nodo más cercano.
+
+        Returns:
+            dict: 'tiempo_seg', 'distancia_km' y 'nodos' (IDs de OSM; con
+                  `a_arista`, desde el inicio de la primera calle hasta el final
+                  de la última, aunque solo se recorra parte de ellas), o None
+                  si no hay ruta entre los puntos ajustados.
+
+        Raises:
+            PuntoFueraDeArea: Si algún punto está fuera de la red.
+        """
+        lats, lons = [origen_lat, destino_lat], [origen_lon, destino_lon]
+        if a_arista:
+            origen, destino = self.indice_espacial.ajustar_a_calles(lats, lons)
+            nodos, tiempo, extremos = self.motor.ruta_entre_puntos(origen, destino)
+        else:
+            origen, destino = self.indice_espacial.ajustar(lats, lons)
+            ids = self.grafo.ids_nodos
+            nodos, tiempo = self.motor.ruta_mas_corta(int(ids[origen]), int(ids[destino]))
+            extremos = None
+        if nodos is None:
+            return None
+        indice = self.grafo.indice
+        aristas = self.grafo.aristas_de_ruta([indice[nodo] for nodo in nodos])
+        distancia_m = (float(np.asarray(self.grafo.longitudes)[aristas] @ fracciones_recorridas(len(aristas), extremos))
+                       if aristas else 0.0)
+        return {'tiempo_seg': tiempo, 'distancia_km': distancia_m / 1000, 'nodos': nodos}
+
+
+class NucleoRegional:
+    """
+    Como `NucleoRutas`, pero sobre la red partida en regiones (ver regiones.py).
+
+    Las regiones se cargan cuando una consulta las necesita y se descartan
+    las menos usadas al pasar de `presupuesto_mb`. Los fragmentos llevan los
+    pesos de un solo perfil (el predeterminado) y las rutas van de nodo a
+    nodo.
+
+    Args:
+        directorio (str): Carpeta escrita por construir_regiones.py.
+        perfil (str): Perfil de velocidad; debe ser el de los fragmentos.
+        presupuesto_mb (float): Memoria para las regiones cargadas.
+
+    Raises:
+        ValueError: Si los fragmentos se construyeron con otro perfil.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_REGIONES, perfil=PERFIL_POR_DEFECTO,
+                 presupuesto_mb=PRESUPUESTO_REGIONES_MB):
+        self.red = RedRegional(directorio, presupuesto_mb)
+        perfil_regiones = self.red.manifiesto.get('perfil', PERFIL_POR_DEFECTO)
+        if perfil != perfil_regiones:
+            raise ValueError(f"Las regiones de '{directorio}' tienen los pesos del perfil '{perfil_regiones}', no '{perfil}'.")
+        self.perfil = perfil
+
+    def ruta(self, origen_lat, origen_lon, destino_lat, destino_lon, a_arista=False):
+        """
+        Ruta más rápida entre dos coordenadas (ver `NucleoRutas.ruta`).
+
+        Returns:
+            dict: 'tiempo_seg', 'distancia_km', 'nodos' (IDs de OSM) y
+                  'regiones' (nombres de las regiones recorridas), o None si
+                  no hay ruta.
+
+        Raises:
+            PuntoFueraDeArea: Si algún punto está fuera de la red.
+            ValueError: Con `a_arista`, que la red por regiones no admite.
+        """
+        if a_arista:
+            raise ValueError("La red por regiones solo ajusta los puntos al nodo más cercano.")
+        resultado = self.red.ruta_mas_corta(self.red.ajustar(origen_lat, origen_lon),
+                                            self.red.ajustar(destino_lat, destino_lon))
+        if resultado is None:
+            return None
+        return {'tiempo_seg': resultado['tiempo_seg'], 'distancia_km': resultado['distancia_km'],
+                'nodos': resultado['ruta'], 'regiones': resultado['regiones']}
@@ -0,0 +1,180 @@
+# ==============================================================================
+# PERFILES DE VELOCIDAD Y CÁLCULO VECTORIZADO DE PESOS
+# ==============================================================================
+# El tiempo de viaje de una calle es `longitud / velocidad`. La velocidad sale
+# del dato 'maxspeed' de OSM cuando existe y, si no, de una velocidad por
+# defecto (general o según el tipo de vía, 'highway'). Cada perfil de
+# velocidad (normal, hora pico, nocturno, ...) es una regla distinta para
+# elegir esa velocidad, y produce su propio arreglo de pesos.
+#
+# Todo se calcula de una vez sobre arreglos de NumPy: 'maxspeed' y 'highway'
+# se convierten a números una sola vez por valor distinto (hay pocas decenas)
+# y después se indexan, sin try/except por arista.
+
+import hashlib
+import json
+
+import numpy as np
+
+VELOCIDAD_ESTANDAR_KMH = 15
+KMH_A_MS = 1000 / 3600
+
+# Velocidades de referencia (km/h) por tipo de vía para calles sin 'maxspeed'.
+VELOCIDADES_CLASE_KMH = {
+    'motorway': 80, 'motorway_link': 50,
+    'trunk': 60, 'trunk_link': 40,
+    'primary': 45, 'primary_link': 35,
+    'secondary': 40, 'secondary_link': 30,
+    'tertiary': 30, 'tertiary_link': 25,
+    'unclassified': 25, 'residential': 20,
+    'living_street': 10, 'service': 10, 'road': 20,
+}
+
+
+def primer_valor(valor):
+    """OSM puede devolver una lista de valores para una arista; se toma el primero."""
+    if isinstance(valor, list):
+        return valor[0] if valor else None
+    return valor
+
+
+def _a_kmh(texto):
+    try:
+        return float(texto)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def parsear_maxspeed(valores):
+    """
+    Convierte los valores crudos de 'maxspeed' a km/h.
+
+    Args:
+        valores (list): Atributo 'maxspeed' de cada arista (texto, lista o None).
+
+    Returns:
+        np.ndarray: km/h por arista (float64); NaN si falta o no es un número
+                    (por ejemplo 'walk' o '30 mph').
+    """
+    textos = np.array([str(v) if v else '' for v in map(primer_valor, valores)], dtype=str)
+    if len(textos) == 0:
+        return np.zeros(0, dtype=np.float64)
+    unicos, inverso = np.unique(textos, return_inverse=True)
+    return np.array([_a_kmh(t) if t else np.nan for t in unicos], dtype=np.float64)[inverso]
+
+
+def codificar_clases(valores):
+    """
+    Convierte el atributo 'highway' de cada arista en (ids int16, lista de clases).
+
+    Las aristas sin dato quedan con la clase ''.
+    """
+    textos = np.array([str(v) if v else '' for v in map(primer_valor, valores)], dtype=str)
+    if len(textos) == 0:
+        return np.zeros(0, dtype=np.int16), ['']
+    unicos, inverso = np.unique(textos, return_inverse=True)
+    return inverso.astype(np.int16), unicos.tolist()
+
+
+def tiempos_viaje(longitudes, velocidad_kmh):
+    """
+    Tiempo de viaje (s) de cada arista.
+
+    Args:
+        longitudes (np.ndarray): Metros por arista.
+        velocidad_kmh (np.ndarray): km/h por arista.
+
+    Returns:
+        np.ndarray: Segundos por arista (inf si la velocidad no es positiva).
+    """
+    velocidad_ms = np.asarray(velocidad_kmh, dtype=np.float64) * KMH_A_MS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(velocidad_ms > 0, np.asarray(longitudes, dtype=np.float64) / velocidad_ms, np.inf)
+
+
+class PerfilVelocidad:
+    """
+    Regla para asignar velocidad (y por lo tanto peso) a cada arista.
+
+    La velocidad de una arista es su 'maxspeed' o, si no lo tiene, la de su
+    tipo de vía en `velocidades_clase_kmh` (o `velocidad_defecto_kmh`). Después
+    se multiplica por el factor de su tipo de vía en `factores_clase` (o por
+    `factor_general`), sin pasar nunca de su 'maxspeed' ni, si se da `tope`,
+    de la velocidad que le asigna ese otro perfil.
+
+    Args:
+        nombre (str): Identificador que se usa en `?perfil=`.
+        descripcion (str): Texto para mostrar al usuario.
+        velocidad_defecto_kmh (float): Velocidad de calles sin 'maxspeed' ni clase conocida.
+        velocidades_clase_kmh (dict): Velocidad por valor de 'highway'.
+        factor_general (float): Multiplicador de la velocidad.
+        factores_clase (dict): Multiplicador por valor de 'highway'.
+        tope (PerfilVelocidad): Perfil cuya velocidad no se supera en ninguna arista.
+    """
+
+    def __init__(self, nombre, descripcion, velocidad_defecto_kmh=VELOCIDAD_ESTANDAR_KMH,
+                 velocidades_clase_kmh=None, factor_general=1.0, factores_clase=None, tope=None):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.velocidad_defecto_kmh = velocidad_defecto_kmh
+        self.velocidades_clase_kmh = dict(velocidades_clase_kmh or {})
+        self.factor_general = factor_general
+        self.factores_clase = dict(factores_clase or {})
+        self.tope = tope
+
+    def huella(self):
+        """Resumen de los parámetros: cambia si cambia la regla del perfil."""
+        parametros = {
+            'defecto': self.velocidad_defecto_kmh,
+            'clases': self.velocidades_clase_kmh,
+            'factor': self.factor_general,
+            'factores': self.factores_clase,
+        }
+        # Solo si hay tope, para no cambiar la huella (ni los pesos guardados) de los demás perfiles.
+        if self.tope is not None:
+            parametros['tope'] = self.tope.huella()
+        texto = json.dumps(parametros, sort_keys=True)
+        return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:12]
+
+    def velocidades_kmh(self, maxspeed_kmh, clase_via_id, clases_via):
+        """Velocidad (km/h) por arista según el perfil."""
+        defecto = np.array([self.velocidades_clase_kmh.get(c, self.velocidad_defecto_kmh) for c in clases_via],
+                           dtype=np.float64)[clase_via_id]
+        factor = np.array([self.factores_clase.get(c, self.factor_general) for c in clases_via],
+                          dtype=np.float64)[clase_via_id]
+        velocidad = np.where(np.isnan(maxspeed_kmh), defecto, maxspeed_kmh) * factor
+        velocidad = np.where(np.isnan(maxspeed_kmh), velocidad, np.minimum(velocidad, maxspeed_kmh))
+        if self.tope is not None:
+            velocidad = np.minimum(velocidad, self.tope.velocidades_kmh(maxspeed_kmh, clase_via_id, clases_via))
+        return velocidad
+
+    def pesos(self, longitudes, maxspeed_kmh, clase_via_id, clases_via):
+        """Tiempo de viaje (s) por arista según el perfil."""
+        return tiempos_viaje(longitudes, self.velocidades_kmh(maxspeed_kmh, clase_via_id, clases_via))
+
+    def pesos_grafo(self, grafo):
+        """Arreglo de pesos del perfil para un `GrafoCSR`."""
+        return self.pesos(grafo.longitudes, grafo.maxspeed_kmh, grafo.clase_via_id, grafo.clases_via)
+
+
+# El perfil 'normal' reproduce exactamente los pesos originales del proyecto
+# ('maxspeed' o 15 km/h), que son los que se guardan en el snapshot. La hora
+# pico lo toma como tope: las velocidades por clase (20 km/h en una calle
+# residencial sin 'maxspeed', por ejemplo) por sí solas la harían más rápida.
+PERFIL_POR_DEFECTO = 'normal'
+_NORMAL = PerfilVelocidad('normal', f"Límite de velocidad o {VELOCIDAD_ESTANDAR_KMH} km/h")
+PERFILES = {
+    'normal': _NORMAL,
+    'por_clase': PerfilVelocidad(
+        'por_clase', "Límite de velocidad o velocidad típica del tipo de vía",
+        velocidades_clase_kmh=VELOCIDADES_CLASE_KMH),
+    'hora_pico': PerfilVelocidad(
+        'hora_pico', "Tráfico de hora pico: avenidas principales congestionadas",
+        velocidades_clase_kmh=VELOCIDADES_CLASE_KMH, factor_general=0.8,
+        factores_clase={'trunk': 0.45, 'trunk_link': 0.45, 'primary': 0.5, 'primary_link': 0.5,
+                        'secondary': 0.55, 'secondary_link': 0.55, 'tertiary': 0.7, 'tertiary_link': 0.7},
+        tope=_NORMAL),
+    'nocturno': PerfilVelocidad(
+        'nocturno', "Calles despejadas de noche (sin pasar del límite de velocidad)",
+        velocidades_clase_kmh=VELOCIDADES_CLASE_KMH, factor_general=1.2),
+}
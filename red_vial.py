@@ -0,0 +1,197 @@
+# ==============================================================================
+# CARGA DE LA RED VIAL (DESCARGA, PESOS Y SNAPSHOT EN DISCO)
+# ==============================================================================
+# Descargar el mapa con `ox.graph_from_place` y calcular el tiempo de viaje de
+# cada calle tarda varios minutos. Para no repetirlo en cada arranque (ni en
+# cada proceso del servidor), el resultado se guarda en una carpeta "snapshot"
+# con los arreglos del grafo compacto. La carpeta se identifica con una clave
+# que resume todo lo que afecta al resultado: si cambian los lugares, el tipo
+# de red, la velocidad estándar o la versión de OSMnx, se reconstruye sola.
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from importlib.metadata import version
+
+import numpy as np
+
+from grafo_compacto import GrafoCSR
+from perfiles_velocidad import KMH_A_MS, PERFIL_POR_DEFECTO, PERFILES, VELOCIDAD_ESTANDAR_KMH
+
+# --- Parámetros de la red ---
+places = ["Oaxaca de Juárez, Oaxaca, México",
+          "Santa Cruz Xoxocotlán, Oaxaca, México",
+          "San Raymundo Jalpan, Oaxaca, México",
+          "San Antonio de la Cal, Oaxaca, México",
+          "San Agustín de las Juntas, Oaxaca, México",
+          "Santa Lucía del Camino, Oaxaca, México",
+          "Villa de Zaachila, Oaxaca, México"]
+TIPO_RED = 'drive'
+
+# Se incrementa cuando cambia el contenido o la estructura de la carpeta.
+FORMATO_SNAPSHOT = 6
+DIRECTORIO_SNAPSHOTS = os.path.join('datos', 'snapshots')
+ARCHIVO_NETWORKX = 'grafo_networkx.pickle'
+CARPETA_PERFILES = 'perfiles'
+
+
+def clave_snapshot():
+    """Resumen de los parámetros que determinan el contenido del snapshot."""
+    parametros = {
+        'formato': FORMATO_SNAPSHOT,
+        'places': places,
+        'network_type': TIPO_RED,
+        'velocidad_estandar_kmh': VELOCIDAD_ESTANDAR_KMH,
+        'osmnx': version('osmnx'),
+    }
+    texto = json.dumps(parametros, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def asignar_tiempos_viaje(G):
+    """
+    Calcula y asigna el atributo 'tiempo_viaje_seg' a cada calle (arista) del grafo.
+
+    Solo se usa al construir el snapshot, para el grafo de NetworkX que se
+    guarda junto a él. Escribir un atributo por arista exige recorrerlas en
+    Python de todos modos, así que aquí no se gana nada vectorizando; los
+    pesos del servidor salen de `perfiles_velocidad` sobre los arreglos del
+    grafo compacto.
+    """
+    for u, v, data in G.edges(data=True):
+        longitud_m = data.get('length', 0)
+        velocidad_ms = VELOCIDAD_ESTANDAR_KMH * KMH_A_MS
+        maxspeed_kmh = data.get('maxspeed')
+        if maxspeed_kmh:
+            try:
+                speed_val = float(maxspeed_kmh[0]) if isinstance(maxspeed_kmh, list) else float(maxspeed_kmh)
+                velocidad_ms = speed_val * KMH_A_MS
+            except (ValueError, TypeError): pass
+        data['tiempo_viaje_seg'] = longitud_m / velocidad_ms if velocidad_ms > 0 else float('inf')
+
+
+def descargar_grafo():
+    """Descarga la red vial de `places` y le asigna los tiempos de viaje."""
+    import osmnx as ox
+
+    print("Descargando el grafo de la red vial...")
+    G = ox.graph_from_place(places, network_type=TIPO_RED, simplify=True)
+    print("Calculando pesos de tiempo de viaje para cada calle...")
+    asignar_tiempos_viaje(G)
+    return G
+
+
+def construir_snapshot(directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Descarga el grafo y escribe su snapshot en `directorio/<clave>`.
+
+    La carpeta se escribe primero con un nombre temporal y después se
+    renombra, así que un proceso nunca ve un snapshot a medio escribir.
+
+    Returns:
+        tuple: (ruta de la carpeta del snapshot, grafo de NetworkX descargado).
+    """
+    G = descargar_grafo()
+    destino = os.path.join(directorio, clave_snapshot())
+    temporal = f'{destino}.tmp-{os.getpid()}'
+    shutil.rmtree(temporal, ignore_errors=True)
+
+    grafo = GrafoCSR.desde_networkx(G)
+    grafo.guardar(temporal)
+    with open(os.path.join(temporal, ARCHIVO_NETWORKX), 'wb') as archivo:
+        pickle.dump(G, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'clave': clave_snapshot(),
+            'formato': FORMATO_SNAPSHOT,
+            'places': places,
+            'network_type': TIPO_RED,
+            'velocidad_estandar_kmh': VELOCIDAD_ESTANDAR_KMH,
+            'osmnx': version('osmnx'),
+            'nodos': grafo.num_nodos,
+            'aristas': grafo.num_aristas,
+            'creado': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }, archivo, ensure_ascii=False, indent=2)
+
+    try:
+        os.rename(temporal, destino)
+    except OSError:
+        # Otro proceso terminó primero; su snapshot es equivalente.
+        shutil.rmtree(temporal, ignore_errors=True)
+    return destino, G
+
+
+def cargar_red(directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Devuelve el grafo compacto, usando el snapshot si existe.
+
+    Solo cuando no hay un snapshot con la clave actual se descarga el mapa
+    (y se consultan los archivos de `cache/` de Nominatim). Los arreglos
+    quedan mapeados en memoria de solo lectura: varios procesos del servidor
+    que cargan el mismo snapshot comparten esas páginas en lugar de copiarlas.
+
+    Returns:
+        GrafoCSR: El grafo compacto mapeado en memoria.
+    """
+    ruta = os.path.join(directorio, clave_snapshot())
+    if os.path.isdir(ruta):
+        print(f"Cargando snapshot del grafo desde {ruta}...")
+    else:
+        print("No hay snapshot del grafo para la configuración actual; se construirá uno.")
+        ruta, _ = construir_snapshot(directorio)
+    return GrafoCSR.cargar(ruta)
+
+
+def cargar_perfiles(grafo, perfiles=None, directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Devuelve un grafo (copia ligera de `grafo`) por perfil de velocidad.
+
+    Los pesos de cada perfil se calculan una sola vez y se guardan dentro del
+    snapshot como `perfiles/<nombre>-<huella del perfil>.npy`; en los
+    siguientes arranques (y en los demás procesos) se mapean en memoria. El
+    perfil por defecto usa directamente los pesos del snapshot.
+
+    Returns:
+        dict: Nombre del perfil -> GrafoCSR con los pesos de ese perfil.
+    """
+    perfiles = PERFILES if perfiles is None else perfiles
+    carpeta = os.path.join(directorio, clave_snapshot(), CARPETA_PERFILES)
+    grafos = {}
+    for nombre, perfil in perfiles.items():
+        if nombre == PERFIL_POR_DEFECTO:
+            grafos[nombre] = grafo
+            continue
+        archivo = os.path.join(carpeta, f'{nombre}-{perfil.huella()}.npy')
+        if not os.path.exists(archivo):
+            inicio = time.perf_counter()
+            pesos = perfil.pesos_grafo(grafo)
+            milisegundos = (time.perf_counter() - inicio) * 1000
+            os.makedirs(carpeta, exist_ok=True)
+            temporal = f'{archivo}.tmp-{os.getpid()}.npy'
+            np.save(temporal, pesos)
+            os.replace(temporal, archivo)
+            print(f"Perfil '{nombre}': pesos calculados en {milisegundos:.1f} ms "
+                  f"({pesos.nbytes / 2**20:.2f} MiB).")
+        grafos[nombre] = grafo.con_pesos(np.load(archivo, mmap_mode='r'))
+    return grafos
+
+
+@functools.lru_cache(maxsize=None)
+def grafo_networkx(directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Devuelve el MultiDiGraph de NetworkX del snapshot actual, cargándolo la primera vez.
+
+    Ninguna ruta frecuente del servidor lo necesita; queda para herramientas y
+    código que todavía trabaja con OSMnx/NetworkX (por ejemplo, los benchmarks
+    que comparan contra `dijkstra_personalizado`).
+    """
+    ruta = os.path.join(directorio, clave_snapshot())
+    if not os.path.isdir(ruta):
+        _, G = construir_snapshot(directorio)
+        return G
+    with open(os.path.join(ruta, ARCHIVO_NETWORKX), 'rb') as archivo:
+        return pickle.load(archivo)
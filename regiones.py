@@ -0,0 +1,399 @@
+# ==============================================================================
+# RED VIAL POR REGIONES (FRAGMENTOS, CARGA PEREZOSA Y GRAFO DE SUPERPOSICIÓN)
+# ==============================================================================
+# Con una sola red en memoria, ampliar la cobertura (Valles Centrales, el
+# estado) multiplica la memoria y el arranque de cada proceso. Aquí la red se
+# parte en regiones:
+#
+#   - Cada región es un fragmento con su propio snapshot (un `GrafoCSR` en su
+#     carpeta): las aristas que salen o llegan a sus nodos. Una calle que
+#     cruza de una región a otra queda en los dos fragmentos, así que sus
+#     extremos (los nodos frontera) aparecen en ambos.
+#   - El grafo de superposición une los nodos frontera: dentro de cada
+#     fragmento, una arista de cada nodo frontera a cada otro con el tiempo
+#     de la ruta más rápida entre ellos. Se calcula una vez, al construir.
+#   - `RedRegional` carga los fragmentos solo cuando una consulta los necesita
+#     y descarta los menos usados cuando se pasa del presupuesto de memoria.
+#
+# Una ruta entre regiones es: origen -> frontera de su región (búsqueda en el
+# fragmento de origen), frontera -> frontera (Dijkstra sobre la superposición)
+# y frontera -> destino (búsqueda en reversa en el fragmento de destino). Toda
+# ruta de la red completa pasa de una región a otra por nodos frontera, así
+# que el resultado es el mismo que en la red completa. Para devolver la lista
+# de nodos, cada tramo de la superposición se expande con una búsqueda dentro
+# de su fragmento.
+
+import collections
+import heapq
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+from grafo_compacto import ARREGLOS, GrafoCSR
+from indice_espacial import DISTANCIA_MAXIMA_AJUSTE_M, IndiceEspacial, PuntoFueraDeArea
+from motor_rutas import MotorDijkstra
+
+DIRECTORIO_REGIONES = os.path.join('datos', 'regiones')
+ARCHIVO_MANIFIESTO = 'regiones.json'
+ARCHIVO_SUPERPOSICION = 'superposicion.npz'
+PRESUPUESTO_REGIONES_MB = 256
+# Se incrementa cuando cambia el contenido o la estructura de la carpeta.
+FORMATO_REGIONES = 1
+
+
+# --- Asignación de nodos a regiones ---
+
+def regiones_por_rejilla(grafo, columnas, filas):
+    """
+    Región de cada nodo según una rejilla de `columnas` x `filas` sobre la red.
+
+    Returns:
+        tuple: (región de cada nodo como np.ndarray, nombres de las regiones).
+    """
+    x, y = np.asarray(grafo.x), np.asarray(grafo.y)
+    columna = np.minimum(((x - x.min()) / (np.ptp(x) or 1) * columnas).astype(np.int64), columnas - 1)
+    fila = np.minimum(((y - y.min()) / (np.ptp(y) or 1) * filas).astype(np.int64), filas - 1)
+    return fila * columnas + columna, [f'r{f}_{c}' for f in range(filas) for c in range(columnas)]
+
+
+def regiones_por_lugar(grafo, lugares):
+    """
+    Región de cada nodo según el polígono de cada lugar (geocodificado con OSMnx).
+
+    Un nodo fuera de todos los polígonos queda en la región más cercana.
+
+    Returns:
+        tuple: (región de cada nodo como np.ndarray, nombres de las regiones).
+    """
+    import osmnx as ox
+    import shapely
+
+    puntos = shapely.points(np.asarray(grafo.x), np.asarray(grafo.y))
+    distancias = np.vstack([shapely.distance(ox.geocode_to_gdf(lugar).geometry.iloc[0], puntos)
+                            for lugar in lugares])
+    return np.argmin(distancias, axis=0), [lugar.split(',')[0] for lugar in lugares]
+
+
+# --- Construcción ---
+
+def fragmentar(grafo, region_nodo):
+    """
+    Un subgrafo por región con las aristas que salen o llegan a sus nodos.
+
+    Returns:
+        dict: Región -> GrafoCSR (solo las regiones con aristas).
+    """
+    region_nodo = np.asarray(region_nodo)
+    region_origen = region_nodo[np.asarray(grafo.origenes)]
+    region_destino = region_nodo[np.asarray(grafo.destinos)]
+    fragmentos = {}
+    for region in np.unique(region_nodo).tolist():
+        aristas = np.flatnonzero((region_origen == region) | (region_destino == region))
+        if len(aristas):
+            fragmentos[region] = grafo.subgrafo(aristas)
+    return fragmentos
+
+
+def construir_superposicion(fragmentos, progreso=None):
+    """
+    Grafo de superposición de los nodos frontera (los que están en más de un fragmento).
+
+    Args:
+        fragmentos (dict): Región -> GrafoCSR, de `fragmentar`.
+        progreso (callable, opcional): Recibe (regiones hechas, total).
+
+    Returns:
+        dict: Arreglos 'ids_frontera' (ID de OSM de cada nodo de la
+              superposición), 'offsets', 'destinos', 'pesos' y 'regiones'
+              (fragmento en el que se calculó cada arista), en formato CSR.
+    """
+    ids, cuentas = np.unique(np.concatenate([g.ids_nodos for g in fragmentos.values()]), return_counts=True)
+    ids_frontera = ids[cuentas > 1]
+    indice_frontera = {nodo: i for i, nodo in enumerate(ids_frontera.tolist())}
+
+    # (u, v) -> (peso, región): con dos fragmentos para el mismo par se queda el menor.
+    aristas = {}
+    for hechas, (region, grafo) in enumerate(fragmentos.items(), 1):
+        locales = [i for i, nodo in enumerate(grafo.ids_nodos.tolist()) if nodo in indice_frontera]
+        globales = [indice_frontera[int(grafo.ids_nodos[i])] for i in locales]
+        motor = MotorDijkstra(grafo)
+        for u, local in zip(globales, locales):
+            tiempos, _ = motor.uno_a_muchos(local, locales)
+            for v, tiempo in zip(globales, tiempos):
+                if u != v and tiempo < aristas.get((u, v), (math.inf,))[0]:
+                    aristas[(u, v)] = (tiempo, region)
+        if progreso:
+            progreso(hechas, len(fragmentos))
+
+    pares = sorted(aristas)
+    origenes = np.array([u for u, _ in pares], dtype=np.int64)
+    offsets = np.zeros(len(ids_frontera) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origenes, minlength=len(ids_frontera)), out=offsets[1:])
+    return {
+        'ids_frontera': ids_frontera.astype(np.int64),
+        'offsets': offsets,
+        'destinos': np.array([v for _, v in pares], dtype=np.int64),
+        'pesos': np.array([aristas[par][0] for par in pares], dtype=np.float64),
+        'regiones': np.array([aristas[par][1] for par in pares], dtype=np.int64),
+    }
+
+
+def guardar_regiones(directorio, fragmentos, nombres, superposicion, meta=None):
+    """
+    Escribe los fragmentos (un snapshot por región), la superposición y el manifiesto.
+
+    Como `red_vial.construir_snapshot`, se escribe en una carpeta temporal
+    que después se renombra, así que nadie ve un conjunto a medio escribir.
+    """
+    temporal = f'{directorio}.tmp-{os.getpid()}'
+    shutil.rmtree(temporal, ignore_errors=True)
+    regiones = []
+    for region, grafo in fragmentos.items():
+        grafo.guardar(os.path.join(temporal, nombres[region]))
+        regiones.append({
+            'region': int(region),
+            'nombre': nombres[region],
+            'nodos': grafo.num_nodos,
+            'aristas': grafo.num_aristas,
+            'limites': [float(grafo.x.min()), float(grafo.y.min()), float(grafo.x.max()), float(grafo.y.max())],
+            'bytes': int(sum(getattr(grafo, arreglo).nbytes for arreglo in ARREGLOS)),
+        })
+    np.savez(os.path.join(temporal, ARCHIVO_SUPERPOSICION), **superposicion)
+    with open(os.path.join(temporal, ARCHIVO_MANIFIESTO), 'w', encoding='utf-8') as archivo:
+        json.dump({'formato': FORMATO_REGIONES, 'regiones': regiones,
+                   'nodos_frontera': int(len(superposicion['ids_frontera'])),
+                   'aristas_superposicion': int(len(superposicion['destinos'])),
+                   'creado': time.strftime('%Y-%m-%d %H:%M:%S'), **(meta or {})},
+                  archivo, ensure_ascii=False, indent=2)
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.rename(temporal, directorio)
+
+
+# --- Consulta ---
+
+class _Region:
+    """Fragmento cargado: grafo, motor, nodos frontera y, si ya se pidió, su índice espacial."""
+
+    __slots__ = ('grafo', 'motor', 'frontera_local', 'frontera_global', 'indice_espacial', 'bytes')
+
+    def __init__(self, grafo, ids_frontera):
+        self.grafo = grafo
+        self.motor = MotorDijkstra(grafo)
+        # `ids_frontera` está ordenado (sale de np.unique).
+        ids = np.asarray(grafo.ids_nodos)
+        posiciones = np.minimum(np.searchsorted(ids_frontera, ids), len(ids_frontera) - 1)
+        locales = np.flatnonzero(ids_frontera[posiciones] == ids) if len(ids_frontera) else np.array([], dtype=np.int64)
+        self.frontera_local = locales.tolist()
+        self.frontera_global = posiciones[locales].tolist()
+        self.indice_espacial = None
+        # Arreglos, diccionario de IDs y las dos listas de búferes del motor (por hilo).
+        self.bytes = (sum(getattr(grafo, arreglo).nbytes for arreglo in ARREGLOS)
+                      + sys.getsizeof(grafo.indice) + 8 * 2 * grafo.num_nodos)
+
+
+class RedRegional:
+    """
+    Red vial partida en regiones que se cargan bajo demanda.
+
+    Args:
+        directorio (str): Carpeta escrita por `guardar_regiones`.
+        presupuesto_mb (float): Memoria estimada (arreglos del grafo, índice de
+            IDs e índice espacial) que pueden ocupar las regiones cargadas. La
+            región que se acaba de pedir nunca se descarta, aunque no quepa.
+        mmap (bool): Mapear los arreglos en lugar de leerlos; la memoria la
+            administra entonces el sistema operativo y el presupuesto solo
+            limita cuántos fragmentos quedan abiertos.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_REGIONES, presupuesto_mb=PRESUPUESTO_REGIONES_MB, mmap=False):
+        self.directorio = directorio
+        self.presupuesto_bytes = presupuesto_mb * 2**20
+        self.mmap = mmap
+        with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding='utf-8') as archivo:
+            self.manifiesto = json.load(archivo)
+        self.regiones = {r['region']: r for r in self.manifiesto['regiones']}
+        with np.load(os.path.join(directorio, ARCHIVO_SUPERPOSICION)) as datos:
+            superposicion = {nombre: datos[nombre] for nombre in datos.files}
+        self._ids_frontera = superposicion['ids_frontera']
+        self._offsets = memoryview(superposicion['offsets'])
+        self._destinos = memoryview(superposicion['destinos'])
+        self._pesos = memoryview(superposicion['pesos'])
+        self._regiones_arista = memoryview(superposicion['regiones'])
+        self._origenes = memoryview(np.repeat(np.arange(len(self._ids_frontera)), np.diff(superposicion['offsets'])))
+
+        self._cargadas = collections.OrderedDict()
+        self._candado = threading.Lock()
+        self.contadores = {'cargas': 0, 'aciertos': 0, 'desalojos': 0, 'segundos_carga': 0.0}
+
+    def region(self, region):
+        """Devuelve la región cargada (la carga si hace falta y descarta las menos usadas)."""
+        with self._candado:
+            cargada = self._cargadas.get(region)
+            if cargada is not None:
+                self._cargadas.move_to_end(region)
+                self.contadores['aciertos'] += 1
+                return cargada
+
+        # La lectura se hace fuera del candado; si dos hilos cargan la misma
+        # región a la vez, se queda la primera.
+        inicio = time.perf_counter()
+        grafo = GrafoCSR.cargar(os.path.join(self.directorio, self.regiones[region]['nombre']), mmap=self.mmap)
+        nueva = _Region(grafo, self._ids_frontera)
+        with self._candado:
+            cargada = self._cargadas.setdefault(region, nueva)
+            if cargada is nueva:
+                self.contadores['cargas'] += 1
+                self.contadores['segundos_carga'] += time.perf_counter() - inicio
+                self._ajustar_presupuesto(region)
+            return cargada
+
+    def _ajustar_presupuesto(self, conservar):
+        """Descarta regiones, de la menos usada a la más usada, hasta caber en el presupuesto."""
+        for region in list(self._cargadas):
+            if self.bytes_cargados() <= self.presupuesto_bytes:
+                break
+            if region != conservar:
+                del self._cargadas[region]
+                self.contadores['desalojos'] += 1
+
+    def bytes_cargados(self):
+        return sum(r.bytes for r in self._cargadas.values())
+
+    def ajustar(self, lat, lon, distancia_maxima_m=DISTANCIA_MAXIMA_AJUSTE_M):
+        """
+        Nodo más cercano a un punto, entre las regiones cuyos límites lo contienen.
+
+        Returns:
+            tuple: (región, índice del nodo en el fragmento de esa región).
+
+        Raises:
+            PuntoFueraDeArea: Si ningún nodo está a menos de `distancia_maxima_m`.
+        """
+        margen = distancia_maxima_m / 111_000
+        mejor = (math.inf, None, None)
+        for region, datos in self.regiones.items():
+            xmin, ymin, xmax, ymax = datos['limites']
+            if not (xmin - margen <= lon <= xmax + margen and ymin - margen <= lat <= ymax + margen):
+                continue
+            cargada = self.region(region)
+            if cargada.indice_espacial is None:
+                cargada.indice_espacial = IndiceEspacial(cargada.grafo)
+                with self._candado:
+                    cargada.bytes += sum(v.nbytes for v in vars(cargada.indice_espacial).values()
+                                         if isinstance(v, np.ndarray))
+            nodos, distancias = cargada.indice_espacial.nodos_mas_cercanos([lat], [lon])
+            if distancias[0] < mejor[0]:
+                mejor = (float(distancias[0]), region, int(nodos[0]))
+        if mejor[0] > distancia_maxima_m:
+            raise PuntoFueraDeArea([0], f"El punto está a más de {distancia_maxima_m:.0f} m de la red de todas las regiones.")
+        return mejor[1], mejor[2]
+
+    def _superposicion(self, semillas, objetivos, cota):
+        """
+        Dijkstra sobre la superposición desde varias semillas.
+
+        Args:
+            semillas (dict): Nodo de la superposición -> tiempo desde el origen.
+            objetivos (dict): Nodo de la superposición -> tiempo hasta el destino.
+            cota (float): Tiempo de una ruta ya conocida (sin pasar por la superposición).
+
+        Returns:
+            tuple: (mejor tiempo total, nodos de la superposición recorridos, aristas
+                   de la superposición recorridas); listas vacías si no mejora la cota.
+        """
+        offsets, destinos, pesos = self._offsets, self._destinos, self._pesos
+        distancias, previas = dict(semillas), {}
+        monticulo = [(t, nodo) for nodo, t in semillas.items()]
+        heapq.heapify(monticulo)
+        mejor, llegada = cota, None
+        while monticulo:
+            distancia, nodo = heapq.heappop(monticulo)
+            if distancia >= mejor:
+                break
+            if distancia > distancias[nodo]:
+                continue
+            if nodo in objetivos and distancia + objetivos[nodo] < mejor:
+                mejor, llegada = distancia + objetivos[nodo], nodo
+            for arista in range(offsets[nodo], offsets[nodo + 1]):
+                vecino = destinos[arista]
+                nueva_distancia = distancia + pesos[arista]
+                if nueva_distancia < distancias.get(vecino, math.inf):
+                    distancias[vecino] = nueva_distancia
+                    previas[vecino] = arista
+                    heapq.heappush(monticulo, (nueva_distancia, vecino))
+        if llegada is None:
+            return mejor, [], []
+        nodos, aristas = [llegada], []
+        while nodos[-1] in previas:
+            arista = previas[nodos[-1]]
+            aristas.append(arista)
+            nodos.append(self._origenes[arista])
+        return mejor, nodos[::-1], aristas[::-1]
+
+    def ruta_mas_corta(self, origen, destino):
+        """
+        Ruta más rápida entre dos nodos de (posiblemente) distintas regiones.
+
+        Args:
+            origen, destino (tuple): (región, índice del nodo en su fragmento),
+                como los devuelve `ajustar`.
+
+        Returns:
+            dict: 'ruta' (IDs de OSM), 'tiempo_seg', 'distancia_km' y
+                  'regiones' (nombres de los fragmentos recorridos), o None si
+                  no hay ruta.
+        """
+        region_o, s = origen
+        region_d, t = destino
+        fragmento_o, fragmento_d = self.region(region_o), self.region(region_d)
+
+        # Origen -> frontera de su región (y al destino, si está en la misma).
+        objetivos_o = fragmento_o.frontera_local + ([t] if region_o == region_d else [])
+        tiempos_o, _ = fragmento_o.motor.uno_a_muchos(s, objetivos_o)
+        directo = tiempos_o[-1] if region_o == region_d else math.inf
+        semillas = {g: tiempo for g, tiempo in zip(fragmento_o.frontera_global, tiempos_o) if tiempo < math.inf}
+        # Frontera de la región de destino -> destino.
+        tiempos_d = fragmento_d.motor.desde_muchos(fragmento_d.frontera_local, t)
+        objetivos = {g: tiempo for g, tiempo in zip(fragmento_d.frontera_global, tiempos_d) if tiempo < math.inf}
+
+        costo, nodos_frontera, aristas = self._superposicion(semillas, objetivos, directo)
+        if costo == math.inf:
+            return None
+
+        # Tramos (región, desde, hasta) en IDs de OSM; cada uno se expande en su fragmento.
+        ids_o, ids_d = fragmento_o.grafo.ids_nodos, fragmento_d.grafo.ids_nodos
+        if not nodos_frontera:
+            tramos = [(region_o, int(ids_o[s]), int(ids_d[t]))]
+        else:
+            ids_frontera = [int(self._ids_frontera[g]) for g in nodos_frontera]
+            tramos = ([(region_o, int(ids_o[s]), ids_frontera[0])]
+                      + [(self._regiones_arista[a], u, v) for a, u, v in zip(aristas, ids_frontera, ids_frontera[1:])]
+                      + [(region_d, ids_frontera[-1], int(ids_d[t]))])
+        ruta, metros, regiones = [int(ids_o[s])], 0.0, []
+        for region, u, v in tramos:
+            if u == v:
+                continue
+            fragmento = self.region(region)
+            nodos, _ = fragmento.motor.ruta_mas_corta(u, v)
+            grafo = fragmento.grafo
+            metros += float(grafo.longitudes[grafo.aristas_de_ruta([grafo.indice[n] for n in nodos])].sum())
+            ruta.extend(nodos[1:])
+            if not regiones or regiones[-1] != self.regiones[region]['nombre']:
+                regiones.append(self.regiones[region]['nombre'])
+        return {"ruta": ruta, "tiempo_seg": float(costo), "distancia_km": metros / 1000,
+                "regiones": regiones or [self.regiones[region_o]['nombre']]}
+
+    def estadisticas(self):
+        """Regiones cargadas, memoria estimada y contadores de cargas y desalojos."""
+        with self._candado:
+            return dict(self.contadores, cargadas=[self.regiones[r]['nombre'] for r in self._cargadas],
+                        mb_cargados=round(self.bytes_cargados() / 2**20, 2),
+                        presupuesto_mb=self.presupuesto_bytes / 2**20, regiones=len(self.regiones),
+                        nodos_frontera=len(self._ids_frontera))
+
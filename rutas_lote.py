@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+RUTAS POR LOTES DESDE UN CSV
+Descripción:
+Lee pares de coordenadas de un CSV (archivo o entrada estándar) y escribe en
+la salida estándar, fila por fila y a medida que se calculan, el tiempo y la
+distancia de la ruta más rápida de cada par. Solo usa el núcleo de rutas
+(nucleo_rutas.py): no importa Flask, OSMnx ni las bibliotecas de dibujo, y
+nunca descarga el mapa (necesita un snapshot ya construido).
+
+El CSV de entrada tiene las columnas origen_lat, origen_lon, destino_lat y
+destino_lon. Si la primera fila no es numérica se toma como encabezado y las
+columnas se buscan por nombre; si no, se usan las cuatro primeras en ese
+orden. La salida tiene las columnas fila, estado (ok, sin_ruta,
+fuera_de_area o invalida), tiempo_seg, distancia_km y nodos; con --ruta se
+agregan los IDs de OSM de la ruta, separados por espacios. Con --ajuste
+arista cada punto se proyecta sobre la calle más cercana y solo se cuenta la
+parte de esa calle que se recorre (la ruta lista los nodos de ambos extremos
+de la primera y la última calle). Con --regiones se usa la red partida en
+regiones de construir_regiones.py (solo el perfil predeterminado y el ajuste
+a nodo): cada región se carga la primera vez que una ruta la toca, y se
+descartan las menos usadas al pasar de --presupuesto-mb. Los tiempos de
+carga y de la primera ruta se reportan en la salida de error.
+
+Uso:
+    python rutas_lote.py pares.csv [--perfil normal] [--ruta] > rutas.csv
+    cat pares.csv | python rutas_lote.py -
+    python rutas_lote.py pares.csv --regiones datos/regiones --presupuesto-mb 256
+"""
+
+import time
+
+INICIO = time.perf_counter()
+
+import argparse  # noqa: E402
+import csv  # noqa: E402
+import sys  # noqa: E402
+
+from nucleo_rutas import NucleoRegional, NucleoRutas, PuntoFueraDeArea  # noqa: E402
+from perfiles_velocidad import PERFIL_POR_DEFECTO, PERFILES  # noqa: E402
+from regiones import PRESUPUESTO_REGIONES_MB  # noqa: E402
+
+COLUMNAS_ENTRADA = ('origen_lat', 'origen_lon', 'destino_lat', 'destino_lon')
+COLUMNAS_SALIDA = ('fila', 'estado', 'tiempo_seg', 'distancia_km', 'nodos')
+
+
+def leer_pares(filas):
+    """
+    Genera (número de fila, coordenadas o None) a partir de las filas de un CSV.
+
+    Las coordenadas son una tupla de cuatro floats en el orden de
+    `COLUMNAS_ENTRADA`; None indica una fila que no se pudo leer.
+    """
+    posiciones = list(range(len(COLUMNAS_ENTRADA)))
+    numero = 0
+    primera = True
+    for fila in filas:
+        if not fila:
+            continue
+        if primera:
+            primera = False
+            try:
+                float(fila[0])
+            except ValueError:
+                # Encabezado: las columnas se buscan por nombre (si faltan, se usan las primeras).
+                nombres = [nombre.strip().lower() for nombre in fila]
+                if all(columna in nombres for columna in COLUMNAS_ENTRADA):
+                    posiciones = [nombres.index(columna) for columna in COLUMNAS_ENTRADA]
+                continue
+        numero += 1
+        try:
+            yield numero, tuple(float(fila[p]) for p in posiciones)
+        except (ValueError, IndexError):
+            yield numero, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('entrada', help="CSV de pares de coordenadas ('-' para la entrada estándar).")
+    parser.add_argument('--perfil', default=PERFIL_POR_DEFECTO, choices=list(PERFILES), help='Perfil de velocidad.')
+    parser.add_argument('--snapshot', help='Carpeta del snapshot (por defecto, la de la configuración actual).')
+    parser.add_argument('--ajuste', default='nodo', choices=('nodo', 'arista'),
+                        help='Ajustar cada punto al nodo más cercano, o a la calle más cercana '
+                             'contando solo la parte recorrida de ella.')
+    parser.add_argument('--ruta', action='store_true', help='Agregar los IDs de OSM de cada ruta.')
+    parser.add_argument('--regiones', metavar='CARPETA',
+                        help='Usar la red por regiones de construir_regiones.py en lugar del snapshot.')
+    parser.add_argument('--presupuesto-mb', type=float, default=PRESUPUESTO_REGIONES_MB,
+                        help='Memoria para las regiones cargadas (con --regiones).')
+    args = parser.parse_args()
+    if args.regiones and args.ajuste != 'nodo':
+        parser.error("--regiones solo admite --ajuste nodo.")
+
+    importacion = time.perf_counter()
+    if args.regiones:
+        try:
+            nucleo = NucleoRegional(args.regiones, args.perfil, args.presupuesto_mb)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        nucleo = NucleoRutas.desde_snapshot(args.snapshot, args.perfil)
+    carga = time.perf_counter()
+
+    salida = csv.writer(sys.stdout, lineterminator='\n')
+    salida.writerow(COLUMNAS_SALIDA + (('ruta',) if args.ruta else ()))
+    entrada = sys.stdin if args.entrada == '-' else open(args.entrada, newline='', encoding='utf-8')
+    primera = None
+    total = 0
+    with entrada:
+        for numero, coordenadas in leer_pares(csv.reader(entrada)):
+            resultado = None
+            if coordenadas is None:
+                estado = 'invalida'
+            else:
+                try:
+                    resultado = nucleo.ruta(*coordenadas, a_arista=(args.ajuste == 'arista'))
+                    estado = 'ok' if resultado else 'sin_ruta'
+                except PuntoFueraDeArea:
+                    estado = 'fuera_de_area'
+            fila = [numero, estado, '', '', '']
+            if resultado:
+                fila[2:] = [round(resultado['tiempo_seg'], 1), round(resultado['distancia_km'], 3), len(resultado['nodos'])]
+            if args.ruta:
+                fila.append(' '.join(map(str, resultado['nodos'])) if resultado else '')
+            salida.writerow(fila)
+            # Cada fila se entrega en cuanto está lista, también cuando la salida es una tubería.
+            sys.stdout.flush()
+            total += 1
+            if primera is None:
+                primera = time.perf_counter()
+
+    fin = time.perf_counter()
+    resumen = (f"Importación {(importacion - INICIO) * 1000:.0f} ms, carga del grafo {(carga - importacion) * 1000:.0f} ms")
+    if primera is not None:
+        resumen += (f", primera ruta a los {(primera - INICIO) * 1000:.0f} ms; "
+                    f"{total} filas en {fin - carga:.2f} s ({total / max(fin - carga, 1e-9):.0f} por segundo)")
+    print(resumen + ".", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+# ==============================================================================
+# CÁLCULO DE RUTAS FUERA DEL HILO DE LA PETICIÓN
+# ==============================================================================
+# Las búsquedas son código de Python puro: con varios hilos en un mismo
+# proceso se turnan el GIL y una consulta lenta frena a las demás. Aquí se
+# reparten entre un número fijo de procesos, cada uno con su propia copia de
+# los motores sobre el snapshot mapeado en memoria (las páginas del grafo se
+# comparten entre procesos). Además:
+#
+#   - Plazo: cada petición espera su resultado como máximo `plazo_seg`.
+#   - Contrapresión: si ya hay `maximo_pendientes` cálculos en curso, la
+#     petición se rechaza de inmediato (ColaLlena) en lugar de formarse.
+#   - Coalescencia: peticiones idénticas que llegan mientras la primera se
+#     calcula esperan ese mismo resultado en lugar de repetir la búsqueda.
+#
+# Con `procesos=0` el cálculo se hace en el hilo de la petición (modo de
+# desarrollo, `python app.py`), con la misma coalescencia y contrapresión. Ese
+# cálculo no se puede interrumpir, así que el plazo se comprueba al terminar:
+# si se pasó, la petición cuenta como vencida y recibe el mismo error (el
+# resultado ya quedó publicado, por ejemplo en la caché, para un reintento).
+
+import concurrent.futures
+import os
+import threading
+import time
+
+from grafo_compacto import fracciones_recorridas
+from indicaciones import generar_indicaciones
+from isocronas import calcular_isocronas
+from jerarquia_contraccion import JerarquiaContraccion, MotorCH
+from metricas import CRONOMETRO_NULO, Cronometro
+from motor_rutas import MotorAStarBidireccional, MotorDijkstra
+from red_vial import cargar_perfiles, cargar_red
+from trafico import RedEnVivo
+
+RUTA_JERARQUIA = os.path.join('datos', 'jerarquia_ch.npz')
+MAXIMO_PENDIENTES = 32
+PLAZO_RUTA_SEG = 10
+
+
+class ColaLlena(Exception):
+    """Hay demasiados cálculos de ruta en curso para aceptar otro."""
+
+
+def crear_motores(grafo, jerarquia=None):
+    """Motores de rutas de un perfil; 'ch' solo si hay jerarquía para sus pesos."""
+    motores = {
+        'dijkstra': MotorDijkstra(grafo),
+        'astar_bidireccional': MotorAStarBidireccional(grafo),
+    }
+    if jerarquia is not None:
+        motores['ch'] = MotorCH(grafo, jerarquia)
+    return motores
+
+
+def cargar_jerarquias(grafos, ruta_archivo=RUTA_JERARQUIA):
+    """
+    Jerarquía de contracción de cada perfil, si la hay.
+
+    Args:
+        grafos (dict): Perfil -> GrafoCSR.
+        ruta_archivo (str): Archivo escrito por construir_jerarquia.py.
+
+    Returns:
+        dict: Perfil -> JerarquiaContraccion, solo para los perfiles cuyos
+              pesos coinciden con los de la jerarquía (vacío si no existe).
+    """
+    if not os.path.exists(ruta_archivo):
+        return {}
+    jerarquia = JerarquiaContraccion.cargar(ruta_archivo)
+    return {perfil: jerarquia for perfil, grafo in grafos.items() if grafo.huella() == jerarquia.huella}
+
+
+def _describir_ruta(grafo, nodos, costo, aristas_ruta, extremos=None):
+    """
+    Totales, indicaciones y aristas de una ruta (IDs de OSM y sus índices de arista).
+
+    Si la ruta va entre puntos a media calle, `extremos` son las fracciones
+    de la primera y la última arista que recorre (se guardan en 'extremos').
+    """
+    fracciones = fracciones_recorridas(len(aristas_ruta), extremos)
+    descripcion = {
+        "ruta": [int(n) for n in nodos],
+        "tiempo_seg": float(costo),
+        "distancia_km": float(grafo.longitudes[aristas_ruta] @ fracciones) / 1000 if aristas_ruta else 0.0,
+        # Una indicación por maniobra (tramo de la misma calle), con los rumbos precalculados.
+        "segmentos": generar_indicaciones(grafo, aristas_ruta, fracciones),
+        "aristas": aristas_ruta,
+    }
+    if extremos is not None:
+        descripcion["extremos"] = list(extremos)
+    return descripcion
+
+
+def calcular_ruta(motor, origen_nodo, destino_nodo, medir=False, alternativas=0):
+    """
+    Calcula la ruta y sus indicaciones (sin la imagen).
+
+    Args:
+        origen_nodo, destino_nodo: IDs de OSM, o pares (índice de arista,
+            fracción) de puntos a media calle; con estos se usa
+            `motor.ruta_entre_puntos` (el motor debe ser de Dijkstra) y el
+            resultado trae además 'extremos' (ver `_describir_ruta`).
+        medir (bool): Si es True, el resultado trae además 'medicion': segundos
+            de cada etapa ('busqueda', 'aristas', 'indicaciones') y los
+            contadores de la búsqueda.
+        alternativas (int): Rutas alternativas que se piden además de la
+            óptima; si hay, se usa `motor.rutas_alternativas` (el motor debe
+            ser de Dijkstra).
+
+    Returns:
+        dict: 'ruta' (IDs de OSM), 'tiempo_seg', 'distancia_km', 'segmentos',
+              'nodos_asentados' y 'aristas' (índices, para dibujarla), o None
+              si no hay ruta entre los nodos. Si se pidieron alternativas,
+              además 'alternativas' (puede traer menos de las pedidas): por
+              cada una, esos mismos datos más 'estiramiento' (tiempo relativo
+              a la óptima) y 'solapamiento' (fracción de su tiempo compartida
+              con la óptima).
+
+    Raises:
+        ValueError: Si se piden alternativas a un motor que no es de Dijkstra.
+    """
+    # Tipo exacto: el A* bidireccional hereda el método, pero quien lo pidió no espera búsquedas de Dijkstra.
+    if alternativas and type(motor) is not MotorDijkstra:
+        raise ValueError("Las rutas alternativas solo se calculan con el motor de Dijkstra.")
+    grafo = motor.grafo
+    cronometro = Cronometro() if medir else CRONOMETRO_NULO
+    extremos = None
+    if alternativas:
+        rutas = motor.rutas_alternativas(origen_nodo, destino_nodo, alternativas + 1)
+    elif isinstance(origen_nodo, tuple):
+        ruta_optima_nodos, tiempo_total_seg, extremos = motor.ruta_entre_puntos(origen_nodo, destino_nodo)
+        rutas = [] if ruta_optima_nodos is None else [(ruta_optima_nodos, tiempo_total_seg)]
+    else:
+        ruta_optima_nodos, tiempo_total_seg = motor.ruta_mas_corta(origen_nodo, destino_nodo)
+        rutas = [] if ruta_optima_nodos is None else [(ruta_optima_nodos, tiempo_total_seg)]
+    estadisticas = motor.ultimas_estadisticas
+    cronometro.marcar('busqueda')
+    if not rutas:
+        return None
+
+    # Todo lo que sigue lee los arreglos compartidos del grafo compacto (con
+    # los pesos del perfil elegido).
+    aristas_rutas = [grafo.aristas_de_ruta([grafo.indice[n] for n in nodos]) for nodos, _ in rutas]
+    cronometro.marcar('aristas')
+    resultado, *otras = [_describir_ruta(grafo, nodos, costo, aristas, extremos if i == 0 else None)
+                         for i, ((nodos, costo), aristas) in enumerate(zip(rutas, aristas_rutas))]
+    resultado["nodos_asentados"] = estadisticas.get('nodos_asentados')
+    if alternativas:
+        optima = set(resultado['aristas'])
+        for otra in otras:
+            compartidas = [a for a in otra['aristas'] if a in optima]
+            otra["estiramiento"] = round(otra['tiempo_seg'] / resultado['tiempo_seg'], 3)
+            otra["solapamiento"] = round(float(grafo.pesos[compartidas].sum()) / otra['tiempo_seg'], 3)
+        resultado["alternativas"] = otras
+    if cronometro:
+        cronometro.marcar('indicaciones')
+        resultado['medicion'] = {'etapas': cronometro.etapas, **estadisticas}
+    return resultado
+
+
+# --- Procesos de cálculo ---
+# Cada proceso arma su propia RedEnVivo sobre el snapshot y la pone al día con
+# las anulaciones de tráfico que trae cada trabajo.
+_red_worker = None
+
+
+def _inicializar_worker(ruta_jerarquia):
+    global _red_worker
+    grafos = cargar_perfiles(cargar_red())
+    _red_worker = RedEnVivo(grafos, crear_motores, cargar_jerarquias(grafos, ruta_jerarquia))
+
+
+def _calcular_en_worker(perfil, algoritmo, origen_nodo, destino_nodo, generacion, anulaciones, medir,
+                        alternativas):
+    _red_worker.sincronizar(generacion, anulaciones)
+    return calcular_ruta(_red_worker.estado(perfil).motores[algoritmo], origen_nodo, destino_nodo, medir,
+                         alternativas)
+
+
+def _isocrona_en_worker(perfil, origen, umbrales_seg, formato, generacion, anulaciones):
+    _red_worker.sincronizar(generacion, anulaciones)
+    return calcular_isocronas(_red_worker.estado(perfil).motores['dijkstra'], origen, umbrales_seg, formato)
+
+
+class ServicioRutas:
+    """
+    Calcula rutas con un número acotado de cálculos simultáneos.
+
+    Args:
+        procesos (int): Procesos de cálculo; 0 para calcular en el hilo de la petición.
+        maximo_pendientes (int): Cálculos en curso (en cola o ejecutándose) a
+            partir de los cuales se rechazan peticiones nuevas.
+        plazo_seg (float): Tiempo máximo que cada petición espera su resultado.
+        ruta_jerarquia (str): Jerarquía de contracción que cargan los procesos.
+    """
+
+    def __init__(self, procesos=0, maximo_pendientes=MAXIMO_PENDIENTES, plazo_seg=PLAZO_RUTA_SEG,
+                 ruta_jerarquia=RUTA_JERARQUIA):
+        self.procesos = procesos
+        self.maximo_pendientes = maximo_pendientes
+        self.plazo_seg = plazo_seg
+        self._pool = None
+        if procesos:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=procesos, initializer=_inicializar_worker, initargs=(ruta_jerarquia,))
+        # Clave -> [futuro del resultado final, peticiones esperándolo, cálculo en el pool].
+        self._en_curso = {}
+        # Reentrante: cancelar un cálculo ejecuta su callback en el mismo hilo.
+        self._candado = threading.RLock()
+        self.contadores = {'calculadas': 0, 'coalescidas': 0, 'rechazadas': 0, 'vencidas': 0}
+
+    def calcular(self, clave, estado, perfil, algoritmo, origen_nodo, destino_nodo, completar, medir=False,
+                 alternativas=0):
+        """
+        Devuelve el resultado de una ruta, compartiendo el cálculo con peticiones idénticas.
+
+        Args:
+            clave: Identifica peticiones idénticas (mismos nodos, pesos y versión).
+            estado (EstadoPerfil): Estado del perfil con el que se pidió la ruta.
+            perfil (str): Perfil de velocidad.
+            algoritmo (str): Motor de `estado.motores`.
+            origen_nodo, destino_nodo: IDs de OSM o puntos a media calle (ver `calcular_ruta`).
+            completar (callable): Recibe el resultado de `calcular_ruta` (o None)
+                y devuelve el resultado final; se llama una sola vez por cálculo,
+                en el proceso principal (por ejemplo, para encolar la imagen).
+            medir (bool): Pide a `calcular_ruta` los tiempos por etapa (solo
+                cuenta para la petición que inicia el cálculo).
+            alternativas (int): Rutas alternativas además de la óptima (ver `calcular_ruta`).
+
+        Raises:
+            ColaLlena: Si ya hay `maximo_pendientes` cálculos en curso.
+            concurrent.futures.TimeoutError: Si el resultado no llega en `plazo_seg`.
+        """
+        return self._ejecutar(
+            clave, completar,
+            lambda: calcular_ruta(estado.motores[algoritmo], origen_nodo, destino_nodo, medir, alternativas),
+            _calcular_en_worker, perfil, algoritmo, origen_nodo, destino_nodo,
+            estado.generacion, estado.anulaciones, medir, alternativas)
+
+    def calcular_isocrona(self, clave, estado, perfil, origen, umbrales_seg, formato, completar):
+        """
+        Devuelve las isócronas de un nodo (ver `calcular_isocronas`), con el
+        mismo plazo, contrapresión y coalescencia que las rutas.
+
+        Args:
+            clave: Identifica peticiones idénticas; no debe coincidir con la de una ruta.
+            origen (int): Índice del nodo de origen en el grafo compacto.
+            umbrales_seg (list): Umbrales en segundos, en orden creciente.
+            formato (str): 'poligonos' o 'aristas'.
+            completar (callable): Como en `calcular`.
+
+        Raises:
+            ColaLlena: Si ya hay `maximo_pendientes` cálculos en curso.
+            concurrent.futures.TimeoutError: Si el resultado no llega en `plazo_seg`.
+        """
+        return self._ejecutar(
+            clave, completar,
+            lambda: calcular_isocronas(estado.motores['dijkstra'], origen, umbrales_seg, formato),
+            _isocrona_en_worker, perfil, origen, umbrales_seg, formato, estado.generacion, estado.anulaciones)
+
+    def _ejecutar(self, clave, completar, calculo_local, funcion_worker, *argumentos_worker):
+        """
+        Lanza (o se une a) el cálculo de `clave` y espera su resultado final.
+
+        Args:
+            calculo_local (callable): Cálculo en el hilo de la petición (sin pool).
+            funcion_worker (callable): Función de módulo que hace el cálculo en un
+                proceso del pool, con `argumentos_worker`.
+        """
+        propio = False
+        with self._candado:
+            entrada = self._en_curso.get(clave)
+            if entrada is not None:
+                entrada[1] += 1
+                self.contadores['coalescidas'] += 1
+            else:
+                if len(self._en_curso) >= self.maximo_pendientes:
+                    self.contadores['rechazadas'] += 1
+                    raise ColaLlena()
+                entrada = self._en_curso[clave] = [concurrent.futures.Future(), 1, None]
+                self.contadores['calculadas'] += 1
+                if self._pool is None:
+                    propio = True
+                else:
+                    entrada[2] = self._pool.submit(funcion_worker, *argumentos_worker)
+                    entrada[2].add_done_callback(lambda c: self._terminar(clave, entrada[0], c.result, completar))
+        futuro = entrada[0]
+
+        inicio = time.monotonic()
+        if propio:
+            self._terminar(clave, futuro, calculo_local, completar)
+        try:
+            restante = self.plazo_seg - (time.monotonic() - inicio)
+            if restante <= 0:
+                raise concurrent.futures.TimeoutError()
+            return futuro.result(timeout=restante)
+        except concurrent.futures.TimeoutError:
+            with self._candado:
+                self.contadores['vencidas'] += 1
+                entrada[1] -= 1
+                if entrada[1] == 0 and entrada[2] is not None:
+                    # Nadie más espera este cálculo: se descarta si aún no empezó.
+                    entrada[2].cancel()
+            raise
+
+    def _terminar(self, clave, futuro, obtener, completar):
+        """Publica el resultado final (o el error) de un cálculo y lo saca de los pendientes."""
+        try:
+            futuro.set_result(completar(obtener()))
+        except concurrent.futures.CancelledError:
+            futuro.cancel()
+        except Exception as e:
+            futuro.set_exception(e)
+        finally:
+            with self._candado:
+                if self._en_curso.get(clave, [None])[0] is futuro:
+                    del self._en_curso[clave]
+
+    def estadisticas(self):
+        """Contadores de cálculos, peticiones coalescidas, rechazadas y vencidas."""
+        with self._candado:
+            return dict(self.contadores, en_curso=len(self._en_curso), procesos=self.procesos,
+                        maximo_pendientes=self.maximo_pendientes, plazo_seg=self.plazo_seg)
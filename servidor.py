@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+SERVIDOR: MODO DE PRODUCCIÓN
+Descripción:
+Sirve app.py con waitress (servidor WSGI de producción, `pip install waitress`)
+sin el modo de depuración, con --hilos hilos para atender peticiones y el
+cálculo de /ruta repartido entre varios procesos (ver servicio.py). Cada
+petición espera su ruta a lo sumo --plazo segundos (después responde 504);
+si ya hay --pendientes cálculos en curso responde 503 de inmediato, y las
+peticiones idénticas simultáneas comparten un mismo cálculo. /matriz tiene su
+propio cupo y plazo (--matrices, --plazo-matriz). GET /metrics expone los
+tiempos por etapa en formato de Prometheus, salvo con --sin-metricas.
+
+Con --desarrollo se usa en su lugar el servidor de pruebas de Flask
+(Werkzeug), que no debe exponerse en producción.
+
+Uso:
+    python servidor.py --puerto 5000 --procesos 4 --pendientes 32 --plazo 10
+"""
+
+import argparse
+import os
+import sys
+
+import app
+import matriz
+import servicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escucha el servidor.')
+    parser.add_argument('--puerto', type=int, default=5000, help='Puerto del servidor.')
+    parser.add_argument('--hilos', type=int, default=servicio.MAXIMO_PENDIENTES + 8,
+                        help='Hilos de waitress que atienden peticiones (deben alcanzar para --pendientes).')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                        help='Procesos de cálculo de rutas (0 = en el hilo de la petición).')
+    parser.add_argument('--pendientes', type=int, default=servicio.MAXIMO_PENDIENTES,
+                        help='Cálculos en curso a partir de los cuales se responde 503.')
+    parser.add_argument('--plazo', type=float, default=servicio.PLAZO_RUTA_SEG,
+                        help='Segundos que una petición espera su ruta antes de responder 504.')
+    parser.add_argument('--matrices', type=int, default=matriz.MAXIMO_MATRICES,
+                        help='Matrices en curso a partir de las cuales /matriz responde 503.')
+    parser.add_argument('--plazo-matriz', type=float, default=matriz.PLAZO_MATRIZ_SEG,
+                        help='Segundos de cálculo de una matriz antes de responder 504.')
+    parser.add_argument('--sin-metricas', action='store_true',
+                        help='No medir tiempos por etapa (X-Perfilar: 1 sigue midiendo su petición).')
+    parser.add_argument('--desarrollo', action='store_true',
+                        help='Usar el servidor de pruebas de Flask en lugar de waitress.')
+    args = parser.parse_args()
+
+    if not args.desarrollo:
+        try:
+            import waitress
+        except ImportError:
+            sys.exit("Falta waitress (pip install waitress); usa --desarrollo para el servidor de pruebas de Flask.")
+
+    app.configurar_servicio(args.procesos, maximo_pendientes=args.pendientes, plazo_seg=args.plazo)
+    app.configurar_matriz(maximo_pendientes=args.matrices, plazo_seg=args.plazo_matriz)
+    app.configurar_metricas(not args.sin_metricas)
+    print(f"Calculando rutas en {args.procesos} procesos (máximo {args.pendientes} pendientes, "
+          f"plazo de {args.plazo:g} s).")
+    if args.desarrollo:
+        app.app.run(host=args.host, port=args.puerto, threaded=True, debug=False)
+    else:
+        waitress.serve(app.app, host=args.host, port=args.puerto, threads=args.hilos)
+
+
+if __name__ == '__main__':
+    main()
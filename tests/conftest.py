@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""Grafo pequeño de benchmarks/fixtures para las pruebas (sin red ni snapshot)."""
+
+import os
+import sys
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from fixture import cargar_fixture  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def grafo():
+    """GrafoCSR del fixture de la suite de benchmarks (pesos del perfil 'normal')."""
+    return cargar_fixture()[0]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la red por regiones (regiones.py y `NucleoRegional`) sobre el grafo del fixture."""
+
+import random
+
+import pytest
+
+from motor_rutas import MotorDijkstra
+from nucleo_rutas import NucleoRegional
+from regiones import construir_superposicion, fragmentar, guardar_regiones, regiones_por_rejilla
+
+
+@pytest.fixture(scope='module')
+def directorio_regiones(grafo, tmp_path_factory):
+    region_nodo, nombres = regiones_por_rejilla(grafo, 2, 2)
+    fragmentos = fragmentar(grafo, region_nodo)
+    directorio = str(tmp_path_factory.mktemp('regiones') / 'regiones')
+    guardar_regiones(directorio, fragmentos, nombres, construir_superposicion(fragmentos))
+    return directorio
+
+
+def test_rutas_por_regiones_iguales_a_la_red_completa(grafo, directorio_regiones):
+    motor = MotorDijkstra(grafo)
+    # Presupuesto de una región: obliga a cargar y descartar regiones entre consultas.
+    nucleo = NucleoRegional(directorio_regiones, presupuesto_mb=0)
+    rnd = random.Random(7)
+    for _ in range(30):
+        o, d = rnd.randrange(grafo.num_nodos), rnd.randrange(grafo.num_nodos)
+        _, esperado = motor.ruta_mas_corta(int(grafo.ids_nodos[o]), int(grafo.ids_nodos[d]))
+        resultado = nucleo.ruta(float(grafo.y[o]), float(grafo.x[o]), float(grafo.y[d]), float(grafo.x[d]))
+        assert resultado['tiempo_seg'] == pytest.approx(esperado)
+        assert resultado['nodos'][0] == int(grafo.ids_nodos[o])
+        assert resultado['nodos'][-1] == int(grafo.ids_nodos[d])
+    assert nucleo.red.estadisticas()['desalojos'] > 0
+
+
+def test_regiones_rechazan_otro_perfil_y_ajuste_a_calle(grafo, directorio_regiones):
+    with pytest.raises(ValueError, match='perfil'):
+        NucleoRegional(directorio_regiones, perfil='nocturno')
+    nucleo = NucleoRegional(directorio_regiones)
+    with pytest.raises(ValueError):
+        nucleo.ruta(float(grafo.y[0]), float(grafo.x[0]), float(grafo.y[1]), float(grafo.x[1]), a_arista=True)
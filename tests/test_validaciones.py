@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de las validaciones de /isocrona y /ruta?alternativas= sobre el grafo del fixture."""
+
+import math
+import warnings
+
+import numpy as np
+import pytest
+
+from isocronas import MAXIMO_MINUTOS, MAXIMO_UMBRALES, calcular_isocronas, leer_minutos
+from motor_rutas import MotorAStarBidireccional, MotorDijkstra
+from servicio import calcular_ruta
+
+
+# ==============================================================================
+# UMBRALES DE LAS ISÓCRONAS ('minutos')
+# ==============================================================================
+
+def test_minutos_validos_se_ordenan_sin_repetidos():
+    assert leer_minutos([15, 5, 10, 5]) == [5.0, 10.0, 15.0]
+    assert leer_minutos(['2.5', MAXIMO_MINUTOS]) == [2.5, float(MAXIMO_MINUTOS)]
+
+
+@pytest.mark.parametrize('minutos', [
+    [math.nan], [5, math.nan], ['nan'], [math.inf], [-math.inf, 5], ['inf'],
+])
+def test_minutos_no_finitos_se_rechazan(minutos):
+    with pytest.raises(ValueError, match="'minutos'"):
+        leer_minutos(minutos)
+
+
+@pytest.mark.parametrize('minutos', [
+    [], [0], [-5], [MAXIMO_MINUTOS + 1], list(range(1, MAXIMO_UMBRALES + 2)), ['cinco'], [None],
+])
+def test_minutos_fuera_de_rango_se_rechazan(minutos):
+    with pytest.raises(ValueError, match="'minutos'"):
+        leer_minutos(minutos)
+
+
+# ==============================================================================
+# ISÓCRONAS CON ARISTAS DE PESO 0
+# ==============================================================================
+
+def test_isocronas_con_aristas_de_peso_cero(grafo):
+    origen = grafo.num_nodos // 2
+    # Todas las aristas que salen del origen y de sus vecinos pesan 0.
+    pesos = np.array(grafo.pesos, dtype=np.float64)
+    salientes = np.arange(grafo.offsets[origen], grafo.offsets[origen + 1])
+    vecinos = np.asarray(grafo.destinos)[salientes]
+    pesos[salientes] = 0.0
+    for vecino in vecinos:
+        pesos[grafo.offsets[vecino]:grafo.offsets[vecino + 1]] = 0.0
+    motor = MotorDijkstra(grafo.con_pesos(pesos))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        resultado = calcular_isocronas(motor, origen, [60, 300], formato='poligonos')
+
+    areas = [f['properties']['area_km2'] for f in resultado['features']]
+    assert all(math.isfinite(area) and area > 0 for area in areas)
+    assert areas[0] <= areas[1]
+    # Los vecinos (a tiempo 0) cuentan desde el primer umbral.
+    assert resultado['features'][0]['properties']['nodos'] >= 1 + len(set(vecinos.tolist()))
+
+
+# ==============================================================================
+# RUTAS ALTERNATIVAS SOLO CON DIJKSTRA
+# ==============================================================================
+
+def _extremos(grafo):
+    ids = grafo.ids_nodos
+    return int(ids[0]), int(ids[grafo.num_nodos - 1])
+
+
+def test_alternativas_con_dijkstra(grafo):
+    origen, destino = _extremos(grafo)
+    resultado = calcular_ruta(MotorDijkstra(grafo), origen, destino, alternativas=2)
+    assert resultado is not None
+    assert 'alternativas' in resultado
+
+
+def test_alternativas_con_otro_motor_se_rechazan(grafo):
+    origen, destino = _extremos(grafo)
+    motor = MotorAStarBidireccional(grafo)
+    with pytest.raises(ValueError, match='Dijkstra'):
+        calcular_ruta(motor, origen, destino, alternativas=2)
+    # Sin alternativas, el mismo motor sí calcula la ruta.
+    assert calcular_ruta(motor, origen, destino) is not None
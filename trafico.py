@@ -0,0 +1,299 @@
+# ==============================================================================
+# TRÁFICO EN VIVO: CIERRES Y VELOCIDADES OBSERVADAS SIN REINICIAR EL SERVIDOR
+# ==============================================================================
+# Los pesos base de cada perfil salen del snapshot y no cambian. Encima de
+# ellos se mantiene un conjunto de "anulaciones" por arista (calle cerrada o
+# velocidad observada). Cada lote de cambios:
+#
+#   1. Calcula, para cada perfil, un arreglo de pesos nuevo (copia de los
+#      pesos base con las anulaciones aplicadas de una vez con NumPy).
+#   2. Arma motores nuevos sobre ese arreglo; la jerarquía de contracción se
+#      personaliza con los pesos nuevos en lugar de reconstruirse.
+#   3. Calcula la versión del perfil: la huella de sus pesos base más un
+#      resumen de las anulaciones vigentes. La versión va en la clave de la
+#      caché de rutas, así que una ruta guardada solo se sirve con exactamente
+#      los mismos pesos, también desde la caché en disco que comparten otros
+#      procesos (que pueden tener otras anulaciones, o ninguna tras reiniciar).
+#   4. Borra de la caché, para liberar espacio, las rutas del perfil que el
+#      cambio pudo alterar: si los pesos solo subieron, las que pasan por las
+#      aristas modificadas; si alguno bajó, todas las del perfil.
+#   5. Sustituye de golpe el estado del perfil (grafo, motores, versión). Las
+#      consultas en curso terminan con el estado anterior; las nuevas ven el
+#      nuevo. Nunca se modifica un arreglo que otra consulta esté leyendo.
+#
+# Las anulaciones viven en la memoria del proceso del servidor. Los procesos
+# de cálculo de servicio.py se ponen al día solos (cada trabajo lleva la
+# generación y las anulaciones vigentes); con varios servidores independientes
+# hay que enviar el mismo lote a cada uno.
+
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+from perfiles_velocidad import tiempos_viaje
+
+
+def huella_anulaciones(anulaciones):
+    """
+    Resumen SHA-1 (12 caracteres) de un conjunto de anulaciones.
+
+    Solo depende del contenido: dos procesos con las mismas anulaciones
+    obtienen la misma versión y comparten la caché de rutas en disco.
+    """
+    resumen = hashlib.sha1()
+    for arista, velocidad in sorted(anulaciones.items()):
+        resumen.update(f'{arista}:{velocidad!r};'.encode('ascii'))
+    return resumen.hexdigest()[:12]
+
+
+class EstadoPerfil:
+    """
+    Grafo, motores y versión vigentes de un perfil. No se modifica: cada
+    actualización crea uno nuevo.
+
+    Atributos:
+        grafo (GrafoCSR): Grafo con los pesos vigentes.
+        motores (dict): Algoritmo -> motor de rutas sobre `grafo`.
+        version (str): Versión de los pesos que se usa en la clave de la caché.
+        generacion (int): Número de lotes de cambios aplicados hasta este estado.
+        anulaciones (dict): Arista -> velocidad en km/h (0 = cerrada) de este
+            estado. No se modifica después de publicarse.
+    """
+
+    __slots__ = ('grafo', 'motores', 'version', 'generacion', 'anulaciones')
+
+    def __init__(self, grafo, motores, version, generacion, anulaciones):
+        self.grafo = grafo
+        self.motores = motores
+        self.version = version
+        self.generacion = generacion
+        self.anulaciones = anulaciones
+
+
+class RedEnVivo:
+    """
+    Pesos actualizables en caliente para todos los perfiles de velocidad.
+
+    Args:
+        grafos_base (dict): Perfil -> GrafoCSR con los pesos del snapshot.
+        crear_motores (callable): Recibe (grafo, jerarquía o None) y devuelve
+            el diccionario algoritmo -> motor.
+        jerarquias (dict, opcional): Perfil -> JerarquiaContraccion de sus pesos base.
+        cache (CacheRutas, opcional): Caché de rutas que se invalida con cada cambio.
+    """
+
+    def __init__(self, grafos_base, crear_motores, jerarquias=None, cache=None):
+        self._base = dict(grafos_base)
+        self._crear_motores = crear_motores
+        self._jerarquias = dict(jerarquias or {})
+        self._cache = cache
+        self._versiones_base = {perfil: grafo.huella() for perfil, grafo in self._base.items()}
+        # Arista -> velocidad en km/h (0 = cerrada).
+        self._anulaciones = {}
+        self._generacion = 0
+        self._candado = threading.Lock()
+        self._estados = {
+            perfil: EstadoPerfil(grafo, crear_motores(grafo, self._jerarquias.get(perfil)),
+                                 self._versiones_base[perfil], 0, self._anulaciones)
+            for perfil, grafo in self._base.items()
+        }
+
+    @property
+    def perfiles(self):
+        return list(self._estados)
+
+    def estado(self, perfil):
+        """Estado vigente de `perfil` (KeyError si no existe)."""
+        return self._estados[perfil]
+
+    def anulaciones(self):
+        """Lista de anulaciones vigentes, con los IDs de OSM de cada arista."""
+        grafo = next(iter(self._base.values()))
+        with self._candado:
+            copia = dict(self._anulaciones)
+        return [{
+            "u": int(grafo.ids_nodos[grafo.origenes[arista]]),
+            "v": int(grafo.ids_nodos[grafo.destinos[arista]]),
+            "calle": grafo.nombres[grafo.nombres_id[arista]],
+            "cerrada": velocidad == 0,
+            "velocidad_kmh": None if velocidad == 0 else velocidad,
+        } for arista, velocidad in sorted(copia.items())]
+
+    def _resolver_aristas(self, cambio):
+        """Índices de arista a los que se refiere un cambio (por par de nodos o por calle)."""
+        grafo = next(iter(self._base.values()))
+        if 'calle' in cambio:
+            try:
+                nombre_id = grafo.nombres.index(cambio['calle'])
+            except ValueError:
+                raise ValueError(f"No existe la calle '{cambio['calle']}'.")
+            return np.flatnonzero(np.asarray(grafo.nombres_id) == nombre_id)
+        try:
+            u, v = grafo.indice[int(cambio['u'])], grafo.indice[int(cambio['v'])]
+        except KeyError:
+            raise ValueError(f"Cada cambio necesita 'calle' o los nodos de OSM 'u' y 'v' existentes: {cambio}")
+        pares = [(u, v), (v, u)] if cambio.get('ambos_sentidos') else [(u, v)]
+        aristas = [arista for a, b in pares
+                   for arista in range(grafo.offsets[a], grafo.offsets[a + 1]) if grafo.destinos[arista] == b]
+        if not aristas:
+            raise ValueError(f"No hay una calle de {cambio['u']} a {cambio['v']}.")
+        return np.array(aristas, dtype=np.int64)
+
+    def _pesos(self, perfil, anulaciones):
+        """Pesos base del perfil con las anulaciones aplicadas."""
+        base = self._base[perfil]
+        pesos = np.array(base.pesos, dtype=np.float64, copy=True)
+        if anulaciones:
+            aristas = np.fromiter(anulaciones.keys(), dtype=np.int64, count=len(anulaciones))
+            velocidades = np.fromiter(anulaciones.values(), dtype=np.float64, count=len(anulaciones))
+            pesos[aristas] = tiempos_viaje(np.asarray(base.longitudes)[aristas], velocidades)
+        return pesos
+
+    def aplicar(self, cambios):
+        """
+        Aplica un lote de cambios a todos los perfiles de una sola vez.
+
+        Args:
+            cambios (list): Diccionarios con la arista ({"u", "v"} con
+                "ambos_sentidos" opcional, o {"calle"}) y la acción:
+                {"cerrada": true}, {"velocidad_kmh": x} o {"restaurar": true}.
+
+        Returns:
+            dict: Resumen con la generación, las aristas afectadas y, por
+                  perfil, la versión, el estado de la jerarquía y las rutas
+                  invalidadas en la caché.
+
+        Raises:
+            ValueError: Si algún cambio está mal formado; entonces no se aplica ninguno.
+        """
+        inicio = time.perf_counter()
+        with self._candado:
+            anulaciones = dict(self._anulaciones)
+            tocadas = []
+            for cambio in cambios:
+                aristas = self._resolver_aristas(cambio)
+                if cambio.get('restaurar'):
+                    for arista in aristas.tolist():
+                        anulaciones.pop(arista, None)
+                elif cambio.get('cerrada'):
+                    anulaciones.update(dict.fromkeys(aristas.tolist(), 0.0))
+                elif 'velocidad_kmh' in cambio:
+                    velocidad = float(cambio['velocidad_kmh'])
+                    if not velocidad > 0:
+                        raise ValueError("'velocidad_kmh' debe ser positiva; para cerrar una calle usa 'cerrada'.")
+                    anulaciones.update(dict.fromkeys(aristas.tolist(), velocidad))
+                else:
+                    raise ValueError(f"Cada cambio necesita 'cerrada', 'velocidad_kmh' o 'restaurar': {cambio}")
+                tocadas.append(aristas)
+            tocadas = np.unique(np.concatenate(tocadas)) if tocadas else np.zeros(0, dtype=np.int64)
+
+            self._generacion += 1
+            resumen = {"generacion": self._generacion, "aristas_afectadas": int(len(tocadas)),
+                       "perfiles": self._reconstruir(anulaciones, tocadas)}
+        resumen["ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        return resumen
+
+    def sincronizar(self, generacion, anulaciones):
+        """
+        Adopta las anulaciones de otra `RedEnVivo` (la del proceso principal).
+
+        La usan los procesos que calculan rutas en paralelo: cada trabajo trae
+        la generación y las anulaciones con las que se pidió, y el proceso solo
+        reconstruye sus motores si no las tiene ya (esos procesos no tienen caché).
+        """
+        with self._candado:
+            if generacion == self._generacion:
+                return
+            tocadas = np.array(sorted(set(self._anulaciones) | set(anulaciones)), dtype=np.int64)
+            self._generacion = generacion
+            self._reconstruir(dict(anulaciones), tocadas)
+
+    def _reconstruir(self, anulaciones, tocadas):
+        """
+        Arma y publica el estado de cada perfil con `anulaciones` (con el candado tomado).
+
+        Returns:
+            dict: Resumen por perfil, con las rutas invalidadas en la caché.
+        """
+        resumen, nuevos = {}, {}
+        for perfil, estado in self._estados.items():
+            inicio_perfil = time.perf_counter()
+            pesos = self._pesos(perfil, anulaciones)
+            anteriores = np.asarray(estado.grafo.pesos)[tocadas]
+            bajaron = bool(np.any(pesos[tocadas] < anteriores))
+            subieron = pesos[tocadas] > anteriores
+
+            grafo, jerarquia, estado_ch = self._base[perfil], self._jerarquias.get(perfil), 'sin jerarquía'
+            if anulaciones:
+                grafo = grafo.con_pesos(pesos)
+            if jerarquia is not None:
+                if not anulaciones:
+                    estado_ch = 'base'
+                elif jerarquia.personalizable:
+                    inicio_ch = time.perf_counter()
+                    jerarquia = jerarquia.personalizar(grafo)
+                    estado_ch = f'personalizada en {(time.perf_counter() - inicio_ch) * 1000:.1f} ms'
+                else:
+                    jerarquia, estado_ch = None, 'desactivada (no es personalizable)'
+
+            version = self._versiones_base[perfil]
+            if anulaciones:
+                version = f'{version}~{huella_anulaciones(anulaciones)}'
+            nuevos[perfil] = EstadoPerfil(grafo, self._crear_motores(grafo, jerarquia), version,
+                                          self._generacion, anulaciones)
+            resumen[perfil] = {
+                "version": version,
+                "jerarquia": estado_ch,
+                "ms": round((time.perf_counter() - inicio_perfil) * 1000, 2),
+                "_bajaron": bajaron,
+                "_subieron": tocadas[subieron],
+            }
+
+        # La caché se invalida antes de publicar: hasta entonces las consultas
+        # siguen con el estado anterior, para el que lo guardado es válido, y
+        # `si_vigente` impide guardar una ruta vieja entre ambos pasos.
+        grafo_base = next(iter(self._base.values()))
+        for perfil, datos in resumen.items():
+            datos["rutas_invalidadas"] = self._invalidar(perfil, datos.pop("_bajaron"), datos.pop("_subieron"),
+                                                         grafo_base)
+
+        # Cambio atómico: cada perfil pasa a su estado nuevo con una sola asignación.
+        self._estados.update(nuevos)
+        self._anulaciones = anulaciones
+        return resumen
+
+    def si_vigente(self, perfil, estado, accion):
+        """
+        Ejecuta `accion()` solo si `estado` sigue siendo el estado vigente de `perfil`.
+
+        Se hace con el candado tomado, así que ningún cambio se publica entre
+        la comprobación y la acción (por ejemplo, guardar en la caché una ruta
+        calculada con `estado`).
+
+        Returns:
+            bool: True si se ejecutó.
+        """
+        with self._candado:
+            if self._estados.get(perfil) is not estado:
+                return False
+            accion()
+            return True
+
+    def _invalidar(self, perfil, bajaron, subieron, grafo):
+        """Borra de la caché las rutas del perfil que el cambio pudo alterar."""
+        if self._cache is None or (not bajaron and len(subieron) == 0):
+            return 0
+        if bajaron:
+            return self._cache.invalidar(lambda clave, _: clave[2] == perfil)
+        ids = grafo.ids_nodos
+        pares = set(zip(ids[grafo.origenes[subieron]].tolist(), ids[grafo.destinos[subieron]].tolist()))
+
+        def usa_aristas(clave, valor):
+            if clave[2] != perfil:
+                return False
+            rutas = [valor['ruta']] + [alternativa['ruta'] for alternativa in valor.get('alternativas', ())]
+            return any(par in pares for ruta in rutas for par in zip(ruta[:-1], ruta[1:]))
+
+        return self._cache.invalidar(usa_aristas)